@@ -0,0 +1,176 @@
+"""
+SessionKiller - Audit History
+Indexed SQLite record of every observed session and decision, written behind.
+"""
+
+import asyncio
+import atexit
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+# Event types recorded by the monitor
+EVENT_TYPES = ('new', 'trusted', 'killed', 'logout_failed', 'disappeared', 'ip_changed')
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS events ('
+    ' id INTEGER PRIMARY KEY,'
+    ' ts REAL NOT NULL,'
+    ' account TEXT NOT NULL,'
+    ' event TEXT NOT NULL,'
+    ' hash INTEGER,'
+    ' ip TEXT,'
+    ' country TEXT,'
+    ' device TEXT,'
+    ' app TEXT,'
+    ' detail TEXT'
+    ')',
+    'CREATE INDEX IF NOT EXISTS events_account ON events (account, id)',
+    'CREATE INDEX IF NOT EXISTS events_hash ON events (account, hash, id)',
+    'CREATE INDEX IF NOT EXISTS events_ip ON events (account, ip, id)',
+    'CREATE INDEX IF NOT EXISTS events_ts ON events (account, ts)',
+)
+
+
+class AuditEvent(NamedTuple):
+    """One row of the audit history."""
+    ts: float
+    account: str
+    event: str
+    hash: Optional[int]
+    ip: Optional[str]
+    country: Optional[str]
+    device: Optional[str]
+    app: Optional[str]
+    detail: Optional[str]
+
+
+class AuditLog:
+    """Append-only event history with a background batch writer.
+
+    ``record()`` only puts the event on an in-memory queue; a writer thread
+    inserts queued events in batches, so the monitor loop never waits on disk.
+    Queries run on their own thread with a separate read connection.
+    """
+
+    def __init__(self, path: str = 'audit.db', batch_size: int = 200,
+                 flush_interval: float = 0.5, max_pending: int = 100000):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.pending: queue.Queue = queue.Queue(maxsize=max_pending)
+        self.dropped = 0
+        self.written = 0
+
+        connection = self.connect()
+        for statement in SCHEMA:
+            connection.execute(statement)
+        connection.commit()
+        connection.close()
+
+        self.reader = ThreadPoolExecutor(max_workers=1, thread_name_prefix='audit-reader')
+        self.read_connection: Optional[sqlite3.Connection] = None
+        self.stopping = threading.Event()
+        self.writer = threading.Thread(target=self.write_loop, name='audit-writer', daemon=True)
+        self.writer.start()
+        atexit.register(self.close)
+
+    def connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, check_same_thread=False)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        connection.execute('PRAGMA busy_timeout=5000')
+        return connection
+
+    def record(self, account: str, event: str, session: Any = None, detail: Optional[str] = None):
+        """Queue an event; never blocks. ``session`` is a SessionRecord or None."""
+        row = AuditEvent(
+            time.time(), account, event,
+            getattr(session, 'hash', None),
+            getattr(session, 'ip', None),
+            getattr(session, 'country', None),
+            getattr(session, 'device_model', None),
+            getattr(session, 'app_name', None),
+            detail,
+        )
+        try:
+            self.pending.put_nowait(row)
+        except queue.Full:
+            self.dropped += 1
+
+    def write_loop(self):
+        """Writer thread: drain the queue in batches until closed."""
+        connection = self.connect()
+        while not (self.stopping.is_set() and self.pending.empty()):
+            try:
+                batch = [self.pending.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                continue
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.pending.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                with connection:
+                    connection.executemany(
+                        'INSERT INTO events (ts, account, event, hash, ip, country, device, app, detail)'
+                        ' VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                        batch,
+                    )
+                self.written += len(batch)
+            except Exception as e:
+                logger.error(f"Error writing audit events: {e}")
+        connection.close()
+
+    def _query(self, account: str, session_hash: Optional[int], ip: Optional[str],
+               limit: int, offset: int) -> List[AuditEvent]:
+        if self.read_connection is None:
+            self.read_connection = self.connect()
+        sql = 'SELECT ts, account, event, hash, ip, country, device, app, detail FROM events WHERE account = ?'
+        params: List[Any] = [account]
+        if session_hash is not None:
+            sql += ' AND hash = ?'
+            params.append(session_hash)
+        if ip is not None:
+            sql += ' AND ip = ?'
+            params.append(ip)
+        sql += ' ORDER BY id DESC LIMIT ? OFFSET ?'
+        params.extend([limit, offset])
+        return [AuditEvent(*row) for row in self.read_connection.execute(sql, params)]
+
+    async def query(self, account: str, session_hash: Optional[int] = None, ip: Optional[str] = None,
+                    page: int = 1, page_size: int = 20) -> List[AuditEvent]:
+        """Newest-first events for an account, optionally filtered by hash or IP."""
+        loop = asyncio.get_running_loop()
+        offset = max(0, page - 1) * page_size
+        return await loop.run_in_executor(
+            self.reader, self._query, account, session_hash, ip, page_size, offset
+        )
+
+    def close(self):
+        """Flush queued events and stop the writer."""
+        if self.stopping.is_set():
+            return
+        self.stopping.set()
+        self.writer.join(timeout=10)
+        self.reader.shutdown(wait=True)
+
+
+# One audit log (writer thread) per database file per process
+_logs: Dict[str, AuditLog] = {}
+
+
+def open_audit_log(path: str) -> AuditLog:
+    """Return the process-wide audit log for ``path``, opening it on first use."""
+    key = os.path.abspath(path)
+    if key not in _logs:
+        _logs[key] = AuditLog(path)
+    return _logs[key]
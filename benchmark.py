@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+SessionKiller - Benchmark
+Runs many monitors against fake Telegram clients and reports detection latency,
+kill latency, RPCs per hour, CPU and memory per account.
+
+    python benchmark.py --accounts 1 100 1000 --duration 60
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+from typing import Any, Dict, List
+
+from fake_client import FakeTelegramClient
+from log_setup import setup_logging, shutdown_logging
+from main import DEFAULT_SETTINGS, SessionMonitorBot
+from scheduler import PollCoordinator
+
+
+def rss_bytes() -> int:
+    """Resident memory of this process."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Nearest-rank percentile; 0 for an empty list."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(q * len(ordered)) - 1))]
+
+
+def summarise(values: List[float]) -> Dict[str, float]:
+    """p50/p95/max in milliseconds."""
+    return {
+        'p50_ms': round(percentile(values, 0.5) * 1000, 1),
+        'p95_ms': round(percentile(values, 0.95) * 1000, 1),
+        'max_ms': round(max(values, default=0.0) * 1000, 1),
+    }
+
+
+async def run_scenario(accounts: int, args: argparse.Namespace, workdir: str) -> Dict[str, Any]:
+    """Monitor ``accounts`` fake accounts for ``args.duration`` seconds under login storms."""
+    settings = {
+        **DEFAULT_SETTINGS,
+        'detection_mode': args.mode,
+        'trust_store': os.path.join(workdir, 'trusted_devices.db'),
+        'audit_db': os.path.join(workdir, 'audit.db'),
+        'trust_rules_file': os.path.join(workdir, 'trust_rules.json'),
+        **args.settings,
+    }
+    coordinator = PollCoordinator(float(settings['poll_spacing']))
+
+    memory_before = rss_bytes()
+    bots: List[SessionMonitorBot] = []
+    for index in range(accounts):
+        name = f"bench{index}"
+        client = FakeTelegramClient(
+            latency=args.latency,
+            flood_wait_rate=args.flood_wait_rate,
+            push_updates=args.mode == 'push',
+        )
+        bots.append(SessionMonitorBot(
+            api_id=0, api_hash='', phone='', name=name, coordinator=coordinator, client=client,
+            settings={
+                **settings,
+                'snapshot_file': os.path.join(workdir, f"known_sessions_{name}.json"),
+                'trusted_devices_file': os.path.join(workdir, f"trusted_devices_{name}.json"),
+            },
+        ))
+
+    for index, bot in enumerate(bots):
+        await bot.connect()
+        bot.monitoring = True
+        bot.initial_stagger = coordinator.stagger(index, accounts, bot.scheduler.effective_interval)
+    tasks = [asyncio.create_task(bot.monitor_sessions()) for bot in bots]
+    memory_after = rss_bytes()
+
+    # Let every monitor take its initial snapshot before the storms start
+    while any(not bot.known_sessions for bot in bots):
+        await asyncio.sleep(0.05)
+
+    started = time.monotonic()
+    cpu_started = time.process_time()
+    calls_before = sum(sum(bot.client.calls.values()) for bot in bots)
+
+    # Storms land in the first 80% of the run so their kills complete in time
+    targets = max(1, int(accounts * args.storm_fraction))
+    for _ in range(args.storms):
+        await asyncio.sleep(args.duration * 0.8 / args.storms)
+        await asyncio.gather(*(
+            bot.client.login_storm(args.storm_size) for bot in random.sample(bots, targets)
+        ))
+    await asyncio.sleep(max(0.0, args.duration - (time.monotonic() - started)))
+
+    elapsed = time.monotonic() - started
+    cpu = time.process_time() - cpu_started
+    calls = sum(sum(bot.client.calls.values()) for bot in bots) - calls_before
+
+    for bot in bots:
+        bot.monitoring = False
+        bot.scan_event.set()
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    for bot in bots:
+        await bot.notifier.stop()
+    # Shared by every bot of the scenario; the work directory goes away next
+    bots[0].audit.close()
+    bots[0].trust_store.close()
+
+    detection: List[float] = []
+    kill: List[float] = []
+    intruders = 0
+    for bot in bots:
+        bot_detection, bot_kill = bot.client.latencies()
+        detection.extend(bot_detection)
+        kill.extend(bot_kill)
+        intruders += len(bot.client.created_at)
+
+    return {
+        'accounts': accounts,
+        'mode': args.mode,
+        'duration_s': round(elapsed, 1),
+        'intruders': intruders,
+        'killed': len(kill),
+        'detection': summarise(detection),
+        'kill': summarise(kill),
+        'rpcs_per_hour_per_account': round(calls / elapsed * 3600 / accounts, 1),
+        'cpu_percent_per_account': round(cpu / elapsed * 100 / accounts, 4),
+        'memory_kb_per_account': round((memory_after - memory_before) / 1024 / accounts, 1),
+    }
+
+
+def format_result(result: Dict[str, Any]) -> str:
+    """One human-readable block per scenario."""
+    detection, kill = result['detection'], result['kill']
+    return (
+        f"{result['accounts']} account(s), {result['mode']} mode, {result['duration_s']}s\n"
+        f"  killed          {result['killed']}/{result['intruders']}\n"
+        f"  detection       p50 {detection['p50_ms']}ms  p95 {detection['p95_ms']}ms  max {detection['max_ms']}ms\n"
+        f"  kill            p50 {kill['p50_ms']}ms  p95 {kill['p95_ms']}ms  max {kill['max_ms']}ms\n"
+        f"  RPCs/hour       {result['rpcs_per_hour_per_account']} per account\n"
+        f"  CPU             {result['cpu_percent_per_account']}% per account\n"
+        f"  memory          {result['memory_kb_per_account']} KB per account"
+    )
+
+
+def parse_settings(pairs: List[str]) -> Dict[str, Any]:
+    """``key=value`` overrides; values are parsed as JSON when possible."""
+    settings = {}
+    for pair in pairs:
+        key, _, value = pair.partition('=')
+        try:
+            settings[key] = json.loads(value)
+        except json.JSONDecodeError:
+            settings[key] = value
+    return settings
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark SessionKiller against fake Telegram clients")
+    parser.add_argument('--accounts', type=int, nargs='+', default=[1, 100, 1000])
+    parser.add_argument('--duration', type=float, default=30.0, help="seconds per scenario")
+    parser.add_argument('--mode', choices=['push', 'poll'], default='push')
+    parser.add_argument('--latency', type=float, default=0.05, help="simulated request latency in seconds")
+    parser.add_argument('--flood-wait-rate', type=float, default=0.0, help="chance of a FloodWait per request")
+    parser.add_argument('--storms', type=int, default=3, help="login storms per scenario")
+    parser.add_argument('--storm-size', type=int, default=5, help="intruder sessions per storm and account")
+    parser.add_argument('--storm-fraction', type=float, default=0.1, help="share of accounts hit by each storm")
+    parser.add_argument('--set', dest='settings', action='append', default=[], metavar='KEY=VALUE',
+                        help="override a bot setting, e.g. --set scan_interval=1")
+    parser.add_argument('--json', help="also write the results to this file")
+    parser.add_argument('--log-level', default='ERROR')
+    args = parser.parse_args()
+    args.settings = parse_settings(args.settings)
+
+    setup_logging({'log_file': '', 'log_level': args.log_level})
+
+    results = []
+    for accounts in args.accounts:
+        with tempfile.TemporaryDirectory(prefix='sessionkiller-bench-') as workdir:
+            result = await run_scenario(accounts, args, workdir)
+        results.append(result)
+        print(format_result(result), flush=True)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    finally:
+        shutdown_logging()
@@ -0,0 +1,217 @@
+"""
+SessionKiller - Connection Manager
+Keeps an account's Telegram connection healthy: probes, fast reconnects and start-up warm-up.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Errors that mean the connection, not the request, is broken. asyncio.TimeoutError
+# is its own class before Python 3.11.
+CONNECTION_ERRORS = (ConnectionError, OSError, asyncio.TimeoutError)
+
+
+def describe(error: BaseException) -> str:
+    """Readable text for errors whose message is empty (timeouts, mostly)."""
+    return str(error) or type(error).__name__
+
+
+def is_connection_error(error: BaseException) -> bool:
+    return isinstance(error, CONNECTION_ERRORS)
+
+
+class ConnectionManager:
+    """Owns the connection of one client and brings it back when it breaks.
+
+    ``run()`` watches for three signs of trouble: Telethon reporting the
+    client disconnected (it gave up on its own reconnects), a health probe
+    failing or timing out after ``probe_interval`` seconds without a
+    successful request, and a caller reporting a connection error with
+    ``report_failure()``. A reported error is confirmed with an immediate
+    probe; a broken connection is then torn down and reconnected at once,
+    retrying with exponential backoff until it is back.
+
+    ``ready`` is set while the connection is believed healthy, so scans can
+    wait for it instead of failing in a loop. ``probe`` gets the timeout and
+    should send the cheapest authenticated request; any answer from Telegram,
+    even an error, proves the connection works.
+    """
+
+    def __init__(self, client: Any, probe: Callable[[float], Awaitable[Any]],
+                 probe_interval: float = 30.0, probe_timeout: float = 10.0,
+                 backoff_max: float = 30.0, backoff_base: float = 0.5,
+                 on_reconnected: Optional[Callable[[float], None]] = None, log: Any = None):
+        self.client = client
+        self.probe = probe
+        self.probe_interval = probe_interval
+        self.probe_timeout = probe_timeout
+        self.backoff_max = backoff_max
+        self.backoff_base = backoff_base
+        self.on_reconnected = on_reconnected
+        self.log = log or logger
+
+        self.ready = asyncio.Event()
+        self.failure_reported = asyncio.Event()
+        self.running = False
+        self.closed = False
+        self.last_success = time.monotonic()
+        self.down_since: Optional[float] = None
+
+        self.reconnects = 0
+        self.reconnect_attempts = 0
+        self.probe_failures = 0
+        self.last_recovery: Optional[float] = None    # seconds the last outage lasted
+        self.last_error: Optional[str] = None
+
+    @property
+    def connected(self) -> bool:
+        return self.ready.is_set() and self.client.is_connected()
+
+    async def connect(self):
+        """First connection; failures are left to the caller."""
+        self.closed = False
+        await self.client.connect()
+        self.record_success()
+        self.ready.set()
+
+    async def warm_up(self, steps: Callable[[], Awaitable[Any]]):
+        """Run ``steps`` (resolving peers and the like) before monitoring starts.
+
+        A failed warm-up is only logged: everything it prepares is also
+        resolved lazily on first use.
+        """
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(steps(), self.probe_timeout)
+        except Exception as e:
+            self.log.warning(f"Warm-up failed, continuing without it: {describe(e)}")
+            return
+        self.record_success()
+        self.log.info(f"Warmed up in {(time.monotonic() - started) * 1000:.1f}ms")
+
+    def record_success(self):
+        """A request went through; the next probe is due ``probe_interval`` from now."""
+        self.last_success = time.monotonic()
+
+    def report_failure(self, error: BaseException):
+        """A request failed with a connection error; check now instead of at the next probe."""
+        self.last_error = describe(error)
+        if not self.running:
+            return
+        if self.down_since is None:
+            self.down_since = time.monotonic()
+        self.ready.clear()
+        self.failure_reported.set()
+
+    async def disconnect(self):
+        """Disconnect on purpose; ``run()`` returns instead of reconnecting."""
+        self.closed = True
+        self.ready.clear()
+        if self.client.is_connected():
+            await self.client.disconnect()
+
+    async def run(self):
+        """Keep the connection up until ``disconnect()`` is called."""
+        self.running = True
+        try:
+            while not self.closed:
+                reason = await self.watch()
+                if self.closed:
+                    break
+                await self.reconnect(reason)
+        finally:
+            self.running = False
+
+    async def watch(self) -> str:
+        """Wait until the connection looks broken; returns why."""
+        while True:
+            disconnected = self.client.disconnected
+            reported = asyncio.ensure_future(self.failure_reported.wait())
+            timeout = max(0.0, self.last_success + self.probe_interval - time.monotonic())
+            try:
+                await asyncio.wait({disconnected, reported}, timeout=timeout,
+                                   return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                reported.cancel()
+
+            if self.closed:
+                return "closed"
+            if disconnected.done():
+                error = None if disconnected.cancelled() else disconnected.exception()
+                return f"disconnected: {describe(error)}" if error else "disconnected"
+            if self.failure_reported.is_set():
+                self.failure_reported.clear()
+                reported_error = self.last_error
+                if not await self.probe_ok():
+                    return f"{reported_error}, probe failed: {self.last_error}"
+                self.down_since = None
+                self.ready.set()
+            elif time.monotonic() - self.last_success >= self.probe_interval:
+                if not await self.probe_ok():
+                    return f"health probe failed: {self.last_error}"
+
+    async def probe_ok(self) -> bool:
+        """Send one probe; False only if the connection itself failed."""
+        try:
+            await self.probe(self.probe_timeout)
+        except CONNECTION_ERRORS as e:
+            self.probe_failures += 1
+            self.last_error = describe(e)
+            return False
+        except Exception as e:
+            # Telegram answered, if only with an error: the connection works
+            self.log.debug(f"Health probe answered with an error: {describe(e)}")
+        self.record_success()
+        return True
+
+    async def reconnect(self, reason: str):
+        """Tear the connection down and bring it back, retrying with backoff."""
+        self.ready.clear()
+        if self.down_since is None:
+            self.down_since = time.monotonic()
+        self.log.warning(f"Connection lost ({reason}), reconnecting")
+
+        attempts = 0
+        while not self.closed:
+            attempts += 1
+            self.reconnect_attempts += 1
+            try:
+                if self.client.is_connected():
+                    await self.client.disconnect()
+                await asyncio.wait_for(self.client.connect(), self.probe_timeout)
+                if await self.probe_ok():
+                    break
+            except Exception as e:
+                self.last_error = describe(e)
+            delay = min(self.backoff_max, self.backoff_base * 2 ** min(attempts - 1, 16))
+            self.log.warning(f"Reconnect attempt {attempts} failed ({self.last_error}), retrying in {delay:g}s")
+            await asyncio.sleep(delay)
+        if self.closed:
+            return
+
+        recovered = time.monotonic() - self.down_since
+        self.down_since = None
+        self.reconnects += 1
+        self.last_recovery = recovered
+        self.failure_reported.clear()
+        self.ready.set()
+        self.log.info(f"Reconnected after {recovered:.2f}s ({attempts} attempt{'s' if attempts != 1 else ''})")
+        if self.on_reconnected:
+            self.on_reconnected(recovered)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Connection state and counters for /status and the control API."""
+        down_for = time.monotonic() - self.down_since if self.down_since is not None else None
+        return {
+            'connected': self.connected,
+            'down_for': round(down_for, 2) if down_for is not None else None,
+            'reconnects': self.reconnects,
+            'reconnect_attempts': self.reconnect_attempts,
+            'probe_failures': self.probe_failures,
+            'last_recovery': round(self.last_recovery, 3) if self.last_recovery is not None else None,
+            'last_error': self.last_error,
+        }
@@ -0,0 +1,421 @@
+#!/usr/bin/env python3
+"""
+SessionKiller - Control Socket
+Query and steer the running bot over a local UNIX socket, without any Telegram traffic.
+
+Requests and responses are single lines of JSON:
+
+    {"cmd": "trust", "account": "work", "hashes": [123, 456]}
+    {"ok": true, "result": {"added": 2}}
+
+With several worker processes the coordinator's socket answers ``accounts``
+and ``shards`` itself and forwards every other command to the owning worker.
+
+    python control.py status
+    python control.py --account work trust 123 456
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import socket
+import stat
+import sys
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from metrics import HISTOGRAMS
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SOCKET = 'sessionkiller.sock'
+
+# Bulk trust changes can carry thousands of hashes on one line
+MAX_LINE = 4 * 1024 * 1024
+
+
+class ControlError(Exception):
+    """A request the control server refuses; reported back to the client."""
+
+
+def session_dict(bot: Any, record: Any) -> Dict[str, Any]:
+    """A session record as JSON, with the bot's current verdict on it."""
+    trusted = record.current or bot.evaluate_trust(record).action == 'trust'
+    return {**record._asdict(), 'trusted': trusted}
+
+
+class ControlServer:
+    """Serves line-delimited JSON commands for the accounts of a MultiAccountRunner.
+
+    Every command works on the bot's in-memory state and stores. The only ones
+    that reach Telegram are ``sessions`` with ``refresh`` and whatever a
+    resumed monitor does next.
+    """
+
+    def __init__(self, runner: Any, path: str):
+        self.runner = runner
+        self.path = path
+        self.server: Optional[asyncio.AbstractServer] = None
+        self.commands: Dict[str, Callable[..., Awaitable[Any]]] = {
+            'ping': self.ping,
+            'accounts': self.accounts,
+            'status': self.status,
+            'sessions': self.sessions,
+            'snapshot': self.snapshot,
+            'trusted': self.trusted,
+            'trust': self.trust,
+            'untrust': self.untrust,
+            'reload_rules': self.reload_rules,
+            'history': self.history,
+            'perf': self.perf,
+            'stop': self.stop,
+            'resume': self.resume,
+        }
+
+    async def start(self):
+        """Bind the socket, replacing a stale one left by a previous run."""
+        if os.path.exists(self.path):
+            if not stat.S_ISSOCK(os.stat(self.path).st_mode):
+                raise RuntimeError(f"{self.path} exists and is not a socket")
+            os.unlink(self.path)
+        # Anyone who can connect can untrust devices, so only the bot's own user may.
+        # Binding under a 0177 umask creates the socket 0600, with no window in between.
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            umask = os.umask(0o177)
+            try:
+                sock.bind(self.path)
+            finally:
+                os.umask(umask)
+            os.chmod(self.path, 0o600)
+            self.server = await asyncio.start_unix_server(self.handle_client, sock=sock, limit=MAX_LINE)
+        except BaseException:
+            sock.close()
+            raise
+        logger.info(f"Control socket listening on {self.path}")
+
+    def close(self):
+        if self.server is not None:
+            self.server.close()
+            self.server = None
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+
+    async def handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Answer requests, one per line, until the client hangs up."""
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    writer.write(self.encode({'ok': False, 'error': f"request longer than {MAX_LINE} bytes"}))
+                    break
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                writer.write(self.encode(await self.dispatch(line)))
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    def encode(response: Dict[str, Any]) -> bytes:
+        return (json.dumps(response, default=str) + "\n").encode()
+
+    async def dispatch(self, line: bytes) -> Dict[str, Any]:
+        """Run one request and wrap its result or error."""
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ControlError("request must be a JSON object")
+        except (ValueError, ControlError) as e:
+            return {'ok': False, 'error': f"invalid request: {e}"}
+
+        response: Dict[str, Any] = {'id': request['id']} if 'id' in request else {}
+        command = self.commands.get(request.get('cmd'))
+        try:
+            if command is None:
+                raise ControlError(f"unknown command {request.get('cmd')!r}; "
+                                   f"available: {', '.join(self.commands)}")
+            response.update(ok=True, result=await command(request))
+        except ControlError as e:
+            response.update(ok=False, error=str(e))
+        except Exception as e:
+            logger.error(f"Control command {request.get('cmd')} failed: {e}")
+            response.update(ok=False, error=str(e))
+        return response
+
+    # Request helpers
+
+    def bot(self, request: Dict[str, Any]) -> Any:
+        """The account a request targets; optional when only one is monitored."""
+        bots = self.runner.bots
+        name = request.get('account')
+        if name is None:
+            if len(bots) == 1:
+                return next(iter(bots.values()))
+            raise ControlError(f"several accounts are monitored, pass one of: {', '.join(bots)}")
+        if name not in bots:
+            raise ControlError(f"unknown account {name!r}")
+        return bots[name]
+
+    @staticmethod
+    def hashes(request: Dict[str, Any]) -> List[int]:
+        hashes = request.get('hashes')
+        if not isinstance(hashes, list) or not hashes:
+            raise ControlError("'hashes' must be a non-empty list of session hashes")
+        try:
+            return [int(h) for h in hashes]
+        except (TypeError, ValueError):
+            raise ControlError("session hashes must be integers")
+
+    # Commands
+
+    async def ping(self, request: Dict[str, Any]) -> Any:
+        return {'pong': True, 'time': time.time()}
+
+    async def accounts(self, request: Dict[str, Any]) -> Any:
+        return self.runner.status()
+
+    async def status(self, request: Dict[str, Any]) -> Any:
+        bot = self.bot(request)
+        status = bot.status()
+        status.update(
+            detection=bot.detection_mode,
+            trust_rules=bot.trust_policy.rule_count,
+            login_signals=bot.push_signals,
+            rpcs_saved=bot.scheduler.rpcs_saved,
+            notify_pending=bot.notifier.depth,
+            notify_dropped=bot.notifier.dropped,
+            last_failure=bot.supervisor.last_failure,
+            session_cache_age=None if not bot.session_cache_at else round(bot.session_cache_age, 1),
+        )
+        return status
+
+    async def sessions(self, request: Dict[str, Any]) -> Any:
+        """The monitor's latest session list; ``refresh`` fetches a fresh one from Telegram."""
+        bot = self.bot(request)
+        if request.get('refresh'):
+            sessions, age = await bot.cached_sessions(force=True)
+        else:
+            sessions, age = bot.session_view, bot.session_cache_age
+        result = [session_dict(bot, record) for record in sessions.values()]
+        if request.get('untrusted'):
+            result = [session for session in result if not session['trusted']]
+        return {'age': None if age == float('inf') else round(age, 1), 'sessions': result}
+
+    async def snapshot(self, request: Dict[str, Any]) -> Any:
+        """The known-sessions set the monitor diffs against, as persisted to the snapshot file."""
+        bot = self.bot(request)
+        return {
+            'account': bot.name,
+            'snapshot_file': bot.snapshot_file,
+            'sessions': [session_dict(bot, record) for record in bot.known_sessions.values()],
+        }
+
+    async def trusted(self, request: Dict[str, Any]) -> Any:
+        return sorted(self.bot(request).trusted_devices)
+
+    async def trust(self, request: Dict[str, Any]) -> Any:
+        hashes = self.hashes(request)
+        added = await self.bot(request).trust_devices(hashes)
+        return {'trusted': len(hashes), 'added': added}
+
+    async def untrust(self, request: Dict[str, Any]) -> Any:
+        bot = self.bot(request)
+        hashes = self.hashes(request)
+        removed = 0
+        for session_hash in hashes:
+            if session_hash in bot.trusted_devices:
+                removed += 1
+            await bot.untrust_device(session_hash)
+        return {'removed': removed}
+
+    async def reload_rules(self, request: Dict[str, Any]) -> Any:
+        bot = self.bot(request)
+        if not await bot.trust_policy.refresh():
+            raise ControlError("could not reload trust rules, keeping the previous ones")
+        return {'rules': bot.trust_policy.rule_count}
+
+    async def history(self, request: Dict[str, Any]) -> Any:
+        bot = self.bot(request)
+        session_hash = request.get('hash')
+        events = await bot.audit.query(
+            bot.name,
+            int(session_hash) if session_hash is not None else None,
+            request.get('ip'),
+            int(request.get('page', 1)),
+            int(request.get('page_size', bot.settings['history_page_size'])),
+        )
+        return [event._asdict() for event in events]
+
+    async def perf(self, request: Dict[str, Any]) -> Any:
+        metrics = self.bot(request).metrics
+        histograms = {}
+        for name in HISTOGRAMS:
+            histogram = metrics.histograms[name]
+            histograms[name] = {
+                'count': histogram.count,
+                'p50': round(histogram.quantile(0.5), 6),
+                'p95': round(histogram.quantile(0.95), 6),
+                'max': round(histogram.max, 6),
+            }
+        return {'histograms': histograms, 'counters': dict(metrics.counters), 'rpc': metrics.rpc_totals()}
+
+    async def stop(self, request: Dict[str, Any]) -> Any:
+        bot = self.bot(request)
+        was_monitoring = bot.monitoring
+        await bot.stop_monitoring()
+        return {'monitoring': False, 'changed': was_monitoring}
+
+    async def resume(self, request: Dict[str, Any]) -> Any:
+        bot = self.bot(request)
+        if not bot.client.is_connected():
+            raise ControlError("account is not connected")
+        return {'monitoring': True, 'changed': bot.start_monitoring()}
+
+
+class ShardControlServer(ControlServer):
+    """Serves the control API from the coordinator when accounts are sharded.
+
+    ``accounts`` and ``shards`` are answered from the workers' latest status
+    reports. Every other account command is forwarded to the control socket of
+    the worker that owns the account (``<path>.shardN``).
+    """
+
+    def __init__(self, coordinator: Any, path: str):
+        super().__init__(coordinator, path)
+        self.commands = {name: self.forward for name in self.commands}
+        self.commands.update(ping=self.ping, accounts=self.accounts, shards=self.shards)
+
+    async def accounts(self, request: Dict[str, Any]) -> Any:
+        return self.runner.status()['accounts']
+
+    async def shards(self, request: Dict[str, Any]) -> Any:
+        return self.runner.status()
+
+    async def forward(self, request: Dict[str, Any]) -> Any:
+        """Relay a request to the owning worker and unwrap its answer."""
+        name = request.get('account')
+        if name is None:
+            if len(self.runner.accounts) != 1:
+                raise ControlError(f"several accounts are monitored, pass one of: {', '.join(self.runner.accounts)}")
+            name = next(iter(self.runner.accounts))
+        worker = self.runner.owner(name)
+        if worker is None:
+            raise ControlError(f"unknown account {name!r}")
+
+        path = f"{self.path}.shard{worker.slot}"
+        try:
+            reader, writer = await asyncio.open_unix_connection(path, limit=MAX_LINE)
+        except OSError as e:
+            raise ControlError(f"shard {worker.slot} is not reachable: {e}")
+        try:
+            writer.write(self.encode({**request, 'account': name}))
+            await writer.drain()
+            line = await reader.readline()
+        finally:
+            writer.close()
+        if not line:
+            raise ControlError(f"shard {worker.slot} closed the connection without answering")
+        response = json.loads(line)
+        if not response.get('ok'):
+            raise ControlError(response.get('error'))
+        return response['result']
+
+
+async def start_control_server(runner: Any, path: str) -> ControlServer:
+    """Serve the control API for ``runner`` on a UNIX socket at ``path``."""
+    server = ControlServer(runner, path)
+    await server.start()
+    return server
+
+
+# Client
+
+def request(path: str, message: Dict[str, Any], timeout: float = 30.0) -> Dict[str, Any]:
+    """Send one request to a running bot and return its response."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(path)
+        sock.sendall((json.dumps(message) + "\n").encode())
+        data = b''
+        while not data.endswith(b"\n"):
+            chunk = sock.recv(65536)
+            if not chunk:
+                break
+            data += chunk
+    if not data:
+        raise ConnectionError("the bot closed the connection without answering")
+    return json.loads(data)
+
+
+def read_hashes(values: List[str], hash_file: Optional[str]) -> List[int]:
+    """Hashes from the command line and/or a file (whitespace or comma separated, '-' for stdin)."""
+    text = " ".join(values)
+    if hash_file:
+        with (sys.stdin if hash_file == '-' else open(hash_file, 'r')) as f:
+            text += " " + f.read()
+    return [int(h) for h in text.replace(',', ' ').split()]
+
+
+def default_socket(config_file: str) -> str:
+    """The control socket configured in config.json, or the default path."""
+    try:
+        with open(config_file, 'r') as f:
+            return json.load(f).get('settings', {}).get('control_socket') or DEFAULT_SOCKET
+    except (OSError, ValueError):
+        return DEFAULT_SOCKET
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query and steer a running SessionKiller over its control socket")
+    parser.add_argument('command', choices=[
+        'ping', 'accounts', 'status', 'sessions', 'snapshot', 'trusted', 'trust', 'untrust',
+        'reload_rules', 'history', 'perf', 'stop', 'resume', 'shards',
+    ])
+    parser.add_argument('hashes', nargs='*', help="session hashes for trust/untrust")
+    parser.add_argument('--socket', help="control socket path (default: control_socket from config.json)")
+    parser.add_argument('--config', default='config.json')
+    parser.add_argument('--account', help="account to address; required when several are monitored")
+    parser.add_argument('--file', help="trust/untrust: read hashes from this file ('-' for stdin)")
+    parser.add_argument('--refresh', action='store_true', help="sessions: fetch a fresh list from Telegram")
+    parser.add_argument('--untrusted', action='store_true', help="sessions: only untrusted sessions")
+    parser.add_argument('--hash', type=int, help="history: only this session")
+    parser.add_argument('--ip', help="history: only this IP")
+    parser.add_argument('--page', type=int, default=1, help="history: page number")
+    parser.add_argument('--timeout', type=float, default=30.0)
+    args = parser.parse_args()
+
+    message: Dict[str, Any] = {'cmd': args.command}
+    if args.account:
+        message['account'] = args.account
+    if args.command in ('trust', 'untrust'):
+        message['hashes'] = read_hashes(args.hashes, args.file)
+    elif args.command == 'sessions':
+        message.update(refresh=args.refresh, untrusted=args.untrusted)
+    elif args.command == 'history':
+        message.update(hash=args.hash, ip=args.ip, page=args.page)
+
+    path = args.socket or default_socket(args.config)
+    try:
+        response = request(path, message, args.timeout)
+    except (OSError, ValueError) as e:
+        print(f"❌ Could not reach the bot on {path}: {e}", file=sys.stderr)
+        sys.exit(2)
+
+    if not response.get('ok'):
+        print(f"❌ {response.get('error')}", file=sys.stderr)
+        sys.exit(1)
+    print(json.dumps(response['result'], indent=2, default=str))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+"""
+SessionKiller - Fake Telegram Client
+In-process stand-in for the parts of TelegramClient the bot uses, for benchmarks
+and offline runs. No network, no credentials.
+"""
+
+import asyncio
+import itertools
+import random
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from telethon import events
+from telethon.errors import FloodWaitError
+from telethon.tl import types
+from telethon.tl.functions.account import GetAuthorizationsRequest, ResetAuthorizationRequest
+from telethon.tl.functions.auth import ResetAuthorizationsRequest
+from telethon.tl.functions.updates import GetStateRequest
+
+UpdateNewAuthorization = getattr(types, 'UpdateNewAuthorization', None)
+
+# Hash of the session the bot itself runs on
+CURRENT_SESSION_HASH = 0
+
+# User id returned by get_me()
+CURRENT_USER_ID = 100000
+
+_hashes = itertools.count(1_000_000)
+
+
+def make_authorization(session_hash: int, device_model: str = 'Pixel 8', ip: str = '203.0.113.10',
+                       country: str = 'Germany', current: bool = False, **fields: Any) -> Any:
+    """Build a ``types.Authorization`` with plausible defaults."""
+    now = datetime.now()
+    values = {
+        'hash': session_hash,
+        'device_model': device_model,
+        'platform': 'Android',
+        'system_version': '14',
+        'api_id': 6,
+        'app_name': 'Telegram Android',
+        'app_version': '10.14.5',
+        'date_created': now,
+        'date_active': now,
+        'ip': ip,
+        'country': country,
+        'region': '',
+        'current': current,
+    }
+    values.update(fields)
+    return types.Authorization(**values)
+
+
+class FakeTelegramClient:
+    """Serves GetAuthorizations, ResetAuthorization(s), GetState, send_message and login.
+
+    ``latency`` (seconds, with +/- ``latency_jitter`` fraction) is applied to
+    every request. FloodWaits can be injected for the next N requests of a
+    type or at random with ``flood_wait_rate``, and network outages with
+    ``drop_connection()``. Every session remembers when
+    it was created, first listed and killed, so detection and kill latency can
+    be measured from the server's side.
+    """
+
+    def __init__(self, latency: float = 0.05, latency_jitter: float = 0.2,
+                 flood_wait_rate: float = 0.0, flood_wait_seconds: int = 5,
+                 authorized: bool = True, push_updates: bool = True):
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.flood_wait_rate = flood_wait_rate
+        self.flood_wait_seconds = flood_wait_seconds
+        self.authorized = authorized
+        self.push_updates = push_updates
+
+        self.sessions: Dict[int, Any] = {
+            CURRENT_SESSION_HASH: make_authorization(CURRENT_SESSION_HASH, 'Bot host', current=True),
+        }
+        self.created_at: Dict[int, float] = {}
+        self.listed_at: Dict[int, float] = {}
+        self.killed_at: Dict[int, float] = {}
+
+        self.handlers: List[Tuple[Any, Callable]] = []
+        self.sent: List[str] = []
+        self.calls: Dict[str, int] = {}
+        self.flood_waits = 0
+        self.scheduled_flood_waits: Dict[str, List[int]] = {}
+        self.connected = False
+        self._disconnected: Optional[asyncio.Future] = None
+        self.outage_until = 0.0
+        self.stalled = False
+
+    # Connection and login
+
+    async def connect(self):
+        if time.monotonic() < self.outage_until:
+            await self.simulate_latency()
+            raise ConnectionError("Connection to Telegram failed")
+        self.connected = True
+        self.stalled = False
+        # Like Telethon, every connection gets its own disconnected future
+        if self._disconnected is not None and self._disconnected.done():
+            self._disconnected = None
+
+    def is_connected(self) -> bool:
+        return self.connected
+
+    async def disconnect(self):
+        self.connected = False
+        if self._disconnected is not None and not self._disconnected.done():
+            self._disconnected.set_result(None)
+
+    @property
+    def disconnected(self) -> asyncio.Future:
+        if self._disconnected is None:
+            self._disconnected = asyncio.get_running_loop().create_future()
+        return self._disconnected
+
+    def drop_connection(self, duration: float = 0.0, silent: bool = False):
+        """Simulate a network outage; connect() fails for ``duration`` seconds.
+
+        By default the client disconnects, as Telethon does once its own
+        reconnects give up. ``silent`` models a half-open socket instead: the
+        client still looks connected but requests hang until disconnect().
+        """
+        self.outage_until = time.monotonic() + duration
+        if silent:
+            self.stalled = True
+            return
+        self.connected = False
+        if self._disconnected is not None and not self._disconnected.done():
+            self._disconnected.set_result(None)
+
+    async def check_connection(self):
+        if self.stalled:
+            await asyncio.shield(self.disconnected)
+        if not self.connected:
+            raise ConnectionError("Cannot send requests while disconnected")
+
+    async def is_user_authorized(self) -> bool:
+        return self.authorized
+
+    async def get_me(self, input_peer: bool = False) -> Any:
+        self.calls['GetMe'] = self.calls.get('GetMe', 0) + 1
+        await self.check_connection()
+        await self.simulate_latency()
+        return types.User(id=CURRENT_USER_ID, is_self=True, first_name='Fake', username='fake_user')
+
+    async def get_input_entity(self, peer: Any) -> Any:
+        if peer in ('me', 'self'):
+            return types.InputPeerSelf()
+        raise ValueError(f"FakeTelegramClient cannot resolve {peer!r}")
+
+    async def send_code_request(self, phone: str):
+        await self.simulate_latency()
+
+    async def sign_in(self, phone: str, code: str):
+        await self.simulate_latency()
+        self.authorized = True
+
+    # Event handlers
+
+    def on(self, event: Any) -> Callable:
+        def decorator(func: Callable) -> Callable:
+            self.add_event_handler(func, event)
+            return func
+        return decorator
+
+    def add_event_handler(self, func: Callable, event: Any = None):
+        self.handlers.append((event, func))
+
+    async def emit_raw(self, update: Any):
+        """Deliver a raw update to matching ``events.Raw`` handlers."""
+        for event, func in self.handlers:
+            if isinstance(event, events.Raw) and (event.types is None or isinstance(update, event.types)):
+                await func(update)
+
+    # Requests
+
+    async def simulate_latency(self):
+        jitter = 1 + random.uniform(-self.latency_jitter, self.latency_jitter)
+        await asyncio.sleep(max(0.0, self.latency * jitter))
+
+    def inject_flood_wait(self, request_name: str, seconds: Optional[int] = None, count: int = 1):
+        """Make the next ``count`` requests of this type fail with FloodWait."""
+        queued = self.scheduled_flood_waits.setdefault(request_name, [])
+        queued.extend([seconds or self.flood_wait_seconds] * count)
+
+    def maybe_flood_wait(self, request_name: str):
+        queued = self.scheduled_flood_waits.get(request_name)
+        if queued:
+            seconds = queued.pop(0)
+        elif self.flood_wait_rate and random.random() < self.flood_wait_rate:
+            seconds = self.flood_wait_seconds
+        else:
+            return
+        self.flood_waits += 1
+        raise FloodWaitError(request=None, capture=seconds)
+
+    async def __call__(self, request: Any, ordered: bool = False) -> Any:
+        name = type(request).__name__
+        self.calls[name] = self.calls.get(name, 0) + 1
+        await self.check_connection()
+        await self.simulate_latency()
+        self.maybe_flood_wait(name)
+
+        if isinstance(request, GetStateRequest):
+            return types.updates.State(pts=1, qts=0, date=datetime.now(), seq=1, unread_count=0)
+
+        if isinstance(request, GetAuthorizationsRequest):
+            now = time.monotonic()
+            for session_hash in self.sessions:
+                self.listed_at.setdefault(session_hash, now)
+            return types.account.Authorizations(
+                authorization_ttl_days=180, authorizations=list(self.sessions.values())
+            )
+        if isinstance(request, ResetAuthorizationRequest):
+            if self.sessions.pop(request.hash, None) is not None:
+                self.killed_at[request.hash] = time.monotonic()
+            return True
+        if isinstance(request, ResetAuthorizationsRequest):
+            now = time.monotonic()
+            for session_hash in [h for h in self.sessions if h != CURRENT_SESSION_HASH]:
+                del self.sessions[session_hash]
+                self.killed_at[session_hash] = now
+            return True
+        raise NotImplementedError(f"FakeTelegramClient does not handle {name}")
+
+    async def send_message(self, entity: Any, message: str, **kwargs):
+        self.calls['SendMessage'] = self.calls.get('SendMessage', 0) + 1
+        await self.check_connection()
+        await self.simulate_latency()
+        self.maybe_flood_wait('SendMessage')
+        self.sent.append(message)
+
+    # Scripted logins
+
+    async def add_session(self, **fields: Any) -> int:
+        """Log a new device in; pushes UpdateNewAuthorization like Telegram does."""
+        session_hash = fields.pop('hash', None) or next(_hashes)
+        self.sessions[session_hash] = make_authorization(session_hash, **fields)
+        self.created_at[session_hash] = time.monotonic()
+        if self.push_updates and UpdateNewAuthorization is not None:
+            await self.emit_raw(UpdateNewAuthorization(hash=session_hash))
+        return session_hash
+
+    async def login_storm(self, count: int, spacing: float = 0.0, **fields: Any) -> List[int]:
+        """Log ``count`` intruder sessions in, ``spacing`` seconds apart."""
+        hashes = []
+        for index in range(count):
+            session = {'device_model': 'Unknown', 'ip': f"198.51.100.{index % 250 + 1}",
+                       'country': 'Unknown', **fields}
+            hashes.append(await self.add_session(**session))
+            if spacing:
+                await asyncio.sleep(spacing)
+        return hashes
+
+    def latencies(self) -> Tuple[List[float], List[float]]:
+        """(detection, kill) latencies in seconds for every scripted session."""
+        detection, kill = [], []
+        for session_hash, created in self.created_at.items():
+            if session_hash in self.listed_at:
+                detection.append(max(0.0, self.listed_at[session_hash] - created))
+            if session_hash in self.killed_at:
+                kill.append(self.killed_at[session_hash] - created)
+        return detection, kill
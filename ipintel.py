@@ -0,0 +1,301 @@
+"""
+SessionKiller - IP Intelligence
+Offline ASN/geo and datacenter/VPN/Tor lookups for session IPs, and the risk score built on them.
+"""
+
+import asyncio
+import bisect
+import csv
+import ipaddress
+import logging
+import os
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Points added to a session's risk score (capped at 100); overridable with ip_risk_weights
+DEFAULT_RISK_WEIGHTS: Dict[str, int] = {
+    'tor': 60,
+    'vpn': 40,
+    'proxy': 40,
+    'datacenter': 30,
+    'new_country': 20,
+    'new_asn': 10,
+}
+
+
+class IpInfo(NamedTuple):
+    """What the local databases know about an address."""
+    asn: Optional[int] = None
+    org: Optional[str] = None
+    country: Optional[str] = None
+    category: Optional[str] = None    # 'tor', 'vpn', 'datacenter', ... from the range lists
+
+
+UNKNOWN = IpInfo()
+
+
+class RiskAssessment(NamedTuple):
+    """Risk score of a session (0-100) and what contributed to it."""
+    score: int
+    reasons: Tuple[str, ...]
+    info: IpInfo
+
+    def describe(self) -> str:
+        return f"{self.score}/100" + (f" ({', '.join(self.reasons)})" if self.reasons else "")
+
+
+NO_RISK = RiskAssessment(0, (), UNKNOWN)
+
+
+def parse_range(text: str) -> Tuple[int, int, int]:
+    """(IP version, first, last address) of a CIDR, an ``a-b`` range or a single address."""
+    text = text.strip()
+    if '-' in text:
+        first, last = (ipaddress.ip_address(part.strip()) for part in text.split('-', 1))
+        if first.version != last.version or int(last) < int(first):
+            raise ValueError(f"bad range {text}")
+        return first.version, int(first), int(last)
+    network = ipaddress.ip_network(text, strict=False)
+    return network.version, int(network.network_address), int(network.broadcast_address)
+
+
+class IntervalIndex:
+    """Address ranges flattened into sorted, disjoint segments for bisect lookups.
+
+    Ranges may nest (a Tor exit inside a hosting provider's block); the
+    innermost one wins. A range that only partly overlaps an earlier one is
+    cut off where the earlier one ends.
+    """
+
+    def __init__(self, ranges: Iterable[Tuple[int, int, Any]]):
+        self.starts: List[int] = []
+        self.ends: List[int] = []
+        self.values: List[Any] = []
+
+        # Outer ranges sort before the ranges nested in them
+        stack: List[Tuple[int, Any]] = []
+        position = 0
+        for start, end, value in sorted(ranges, key=lambda r: (r[0], -r[1])):
+            while stack and stack[-1][0] < start:
+                top_end, top_value = stack.pop()
+                self.emit(position, top_end, top_value)
+                position = max(position, top_end + 1)
+            if stack:
+                self.emit(position, start - 1, stack[-1][1])
+                end = min(end, stack[-1][0])
+            position = start
+            stack.append((end, value))
+        while stack:
+            top_end, top_value = stack.pop()
+            self.emit(position, top_end, top_value)
+            position = max(position, top_end + 1)
+
+    def emit(self, start: int, end: int, value: Any):
+        if start > end:
+            return
+        if self.values and self.values[-1] == value and self.ends[-1] + 1 == start:
+            self.ends[-1] = end
+            return
+        self.starts.append(start)
+        self.ends.append(end)
+        self.values.append(value)
+
+    def lookup(self, address: int) -> Any:
+        index = bisect.bisect_right(self.starts, address) - 1
+        if index >= 0 and address <= self.ends[index]:
+            return self.values[index]
+        return None
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+
+class IpIntel:
+    """ASN/geo database plus categorised range lists, behind an LRU cache.
+
+    ``geo_file`` is a MaxMind-style ``.mmdb`` (needs the optional
+    ``maxminddb`` package) or a CSV with a ``network`` column (or ``start`` and
+    ``end``) and any of ``asn``, ``org`` and ``country``. ``ranges_files`` maps
+    a category to a file with one CIDR, ``a-b`` range or address per line.
+
+    Files are parsed by ``load()``, off the event loop; until then every
+    lookup returns UNKNOWN. Lookups are in-memory bisects.
+    """
+
+    def __init__(self, geo_file: str = '', ranges_files: Optional[Dict[str, str]] = None,
+                 cache_size: int = 4096):
+        self.geo_file = geo_file
+        self.ranges_files = dict(ranges_files or {})
+        self.cache_size = cache_size
+        self.cache: 'OrderedDict[str, IpInfo]' = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+        self.geo: Dict[int, IntervalIndex] = {}
+        self.ranges: Dict[int, IntervalIndex] = {}
+        self.mmdb: Any = None
+        self.loaded: Optional[asyncio.Future] = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.geo_file or self.ranges_files)
+
+    async def ensure_loaded(self):
+        """Load the databases once, on a worker thread; concurrent callers share the load."""
+        if self.loaded is None:
+            loop = asyncio.get_running_loop()
+            self.loaded = asyncio.ensure_future(loop.run_in_executor(None, self.load))
+        await asyncio.shield(self.loaded)
+
+    def load(self):
+        """Parse every configured file; a file that fails to load is skipped."""
+        ranges: Dict[int, List[Tuple[int, int, str]]] = {4: [], 6: []}
+        for category, path in self.ranges_files.items():
+            try:
+                count = self.read_ranges(path, category, ranges)
+                logger.info(f"Loaded {count} {category} ranges from {path}")
+            except Exception as e:
+                logger.error(f"Error loading IP ranges from {path}: {e}")
+        ranges_index = {version: IntervalIndex(entries) for version, entries in ranges.items()}
+
+        geo_index: Dict[int, IntervalIndex] = {}
+        mmdb = None
+        if self.geo_file:
+            try:
+                if self.geo_file.endswith('.mmdb'):
+                    # Optional dependency, only needed for MaxMind databases
+                    import maxminddb
+                    mmdb = maxminddb.open_database(self.geo_file)
+                    logger.info(f"Opened IP database {self.geo_file}")
+                else:
+                    geo_index = self.read_geo_csv(self.geo_file)
+                    logger.info(f"Loaded {sum(map(len, geo_index.values()))} IP networks from {self.geo_file}")
+            except ImportError:
+                logger.error(f"Reading {self.geo_file} needs the maxminddb package: pip install maxminddb")
+            except Exception as e:
+                logger.error(f"Error loading IP database {self.geo_file}: {e}")
+
+        self.ranges, self.geo, self.mmdb = ranges_index, geo_index, mmdb
+        self.cache.clear()
+
+    @staticmethod
+    def read_ranges(path: str, category: str, ranges: Dict[int, List[Tuple[int, int, str]]]) -> int:
+        count = 0
+        with open(path, 'r') as f:
+            for number, line in enumerate(f, 1):
+                line = line.split('#', 1)[0].strip()
+                if not line:
+                    continue
+                # An optional second column overrides the file's category
+                fields = [field.strip() for field in line.replace('\t', ',').split(',')]
+                try:
+                    version, start, end = parse_range(fields[0])
+                except ValueError:
+                    logger.warning(f"{path}:{number}: not an address range: {fields[0]}")
+                    continue
+                ranges[version].append((start, end, fields[1] if len(fields) > 1 and fields[1] else category))
+                count += 1
+        return count
+
+    @staticmethod
+    def read_geo_csv(path: str) -> Dict[int, IntervalIndex]:
+        entries: Dict[int, List[Tuple[int, int, IpInfo]]] = {4: [], 6: []}
+        with open(path, 'r', newline='') as f:
+            for row in csv.DictReader(f):
+                try:
+                    if row.get('network'):
+                        version, start, end = parse_range(row['network'])
+                    else:
+                        version, start, end = parse_range(f"{row['start']}-{row['end']}")
+                    asn = (row.get('asn') or '').upper().lstrip('AS')
+                    info = IpInfo(int(asn) if asn.isdigit() and int(asn) else None,
+                                  row.get('org') or None, row.get('country') or None)
+                except (KeyError, ValueError):
+                    continue
+                entries[version].append((start, end, info))
+        return {version: IntervalIndex(items) for version, items in entries.items()}
+
+    def lookup(self, ip: Optional[str]) -> IpInfo:
+        """Everything known about ``ip``; UNKNOWN for unparsable or unlisted addresses."""
+        if not ip:
+            return UNKNOWN
+        info = self.cache.get(ip)
+        if info is not None:
+            self.hits += 1
+            self.cache.move_to_end(ip)
+            return info
+        self.misses += 1
+
+        info = self.resolve(ip)
+        self.cache[ip] = info
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return info
+
+    def resolve(self, ip: str) -> IpInfo:
+        try:
+            address = ipaddress.ip_address(ip)
+        except ValueError:
+            return UNKNOWN
+        value = int(address)
+        ranges = self.ranges.get(address.version)
+        category = ranges.lookup(value) if ranges else None
+
+        geo = self.geo.get(address.version)
+        info = geo.lookup(value) if geo else None
+        if self.mmdb is not None:
+            info = self.from_mmdb(self.mmdb.get(ip))
+        if info is None:
+            return IpInfo(category=category) if category else UNKNOWN
+        return info._replace(category=category)
+
+    @staticmethod
+    def from_mmdb(record: Optional[Dict[str, Any]]) -> Optional[IpInfo]:
+        """Pick the useful fields out of a GeoLite2/GeoIP2 ASN, Country or City record."""
+        if not record:
+            return None
+        country = (record.get('country') or record.get('registered_country') or {}).get('iso_code')
+        return IpInfo(record.get('autonomous_system_number'), record.get('autonomous_system_organization'),
+                      country)
+
+    def assess(self, ip: Optional[str], country: Optional[str], seen_countries: Set[str],
+               seen_asns: Set[int], weights: Optional[Dict[str, int]] = None) -> RiskAssessment:
+        """Score a session from its network and how it compares to the account's other sessions.
+
+        ``country`` is the one Telegram reports; the seen sets come from the
+        sessions the account already had, and novelty only counts when there
+        are some.
+        """
+        weights = {**DEFAULT_RISK_WEIGHTS, **(weights or {})}
+        info = self.lookup(ip)
+        score = 0
+        reasons = []
+        if info.category:
+            score += weights.get(info.category, weights['datacenter'])
+            reasons.append(info.category)
+        if country and seen_countries and country not in seen_countries:
+            score += weights['new_country']
+            reasons.append(f"new country {country}")
+        if info.asn and seen_asns and info.asn not in seen_asns:
+            score += weights['new_asn']
+            reasons.append(f"new network AS{info.asn}")
+        return RiskAssessment(min(100, score), tuple(reasons), info)
+
+    def stats(self) -> Dict[str, int]:
+        return {'cached': len(self.cache), 'hits': self.hits, 'misses': self.misses}
+
+
+# One set of databases per process, shared by every account that configures the same files
+_intel: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], IpIntel] = {}
+
+
+def open_ip_intel(geo_file: str = '', ranges_files: Optional[Dict[str, str]] = None,
+                  cache_size: int = 4096) -> IpIntel:
+    """Return the process-wide IpIntel for these files, creating it on first use."""
+    key = (os.path.abspath(geo_file) if geo_file else '',
+           tuple(sorted((category, os.path.abspath(path)) for category, path in (ranges_files or {}).items())))
+    if key not in _intel:
+        _intel[key] = IpIntel(geo_file, ranges_files, cache_size)
+    return _intel[key]
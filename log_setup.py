@@ -0,0 +1,163 @@
+"""
+SessionKiller - Logging Pipeline
+Queue-based, non-blocking logging with rotation, JSON lines and deduplication.
+"""
+
+import json
+import logging
+import logging.handlers
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# Extra fields attached by the bot that the JSON formatter lifts to the top level
+CONTEXT_FIELDS = ('account', 'session_hash', 'latency_ms')
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class SizedTimedRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """Rotates when the file exceeds ``max_bytes`` and also on a time schedule.
+
+    ``when`` is 'midnight', 'hourly', 'daily' or a number of seconds. Backups
+    use the usual ``bot.log.1`` ... ``bot.log.N`` names for both triggers.
+    """
+
+    def __init__(self, filename: str, max_bytes: int = 0, when: Any = 'midnight',
+                 backup_count: int = 7, encoding: Optional[str] = None):
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count, encoding=encoding)
+        self.when = when
+        self.rollover_at = self.compute_rollover(time.time())
+
+    def compute_rollover(self, now: float) -> float:
+        """Timestamp of the next time-based rotation."""
+        if self.when == 'midnight':
+            today = datetime.fromtimestamp(now).replace(hour=0, minute=0, second=0, microsecond=0)
+            return today.timestamp() + 86400
+        intervals = {'hourly': 3600, 'daily': 86400}
+        return now + float(intervals.get(self.when, self.when))
+
+    def shouldRollover(self, record: logging.LogRecord) -> int:
+        if time.time() >= self.rollover_at:
+            return 1
+        return super().shouldRollover(record)
+
+    def doRollover(self):
+        super().doRollover()
+        self.rollover_at = self.compute_rollover(time.time())
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, with account/session/latency fields when present."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            'ts': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for field in CONTEXT_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class DedupFilter(logging.Filter):
+    """Drops repeats of an identical warning/error within ``window`` seconds.
+
+    The first occurrence passes through; once the window expires the next
+    occurrence is annotated with how many copies were suppressed.
+    """
+
+    def __init__(self, window: float = 60.0):
+        super().__init__()
+        self.window = window
+        self.lock = threading.Lock()
+        self.seen: Dict[Tuple[str, int, str], Tuple[float, int]] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.window <= 0 or record.levelno < logging.WARNING:
+            return True
+        key = (record.name, record.levelno, record.getMessage())
+        now = time.monotonic()
+        with self.lock:
+            first_seen, suppressed = self.seen.get(key, (0.0, 0))
+            if now - first_seen < self.window:
+                self.seen[key] = (first_seen, suppressed + 1)
+                return False
+            self.seen[key] = (now, 0)
+            if len(self.seen) > 1000:
+                # Forget keys whose window has long passed
+                self.seen = {k: v for k, v in self.seen.items() if now - v[0] < self.window}
+        if suppressed:
+            record.msg = f"{record.getMessage()} (repeated {suppressed} more times)"
+            record.args = ()
+        return True
+
+
+def setup_logging(settings: Dict[str, Any]):
+    """Route all logging through a queue drained by a dedicated writer thread.
+
+    Log calls only enqueue the record; formatting, rotation and disk writes
+    happen on the listener thread. Calling this again replaces the pipeline and
+    closes the previous one's files.
+    """
+    global _listener
+    if settings.get('log_format') == 'json':
+        formatter: logging.Formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter(TEXT_FORMAT)
+
+    handlers = []
+    if settings.get('log_file'):
+        file_handler = SizedTimedRotatingFileHandler(
+            settings['log_file'],
+            max_bytes=int(settings.get('log_max_bytes', 0)),
+            when=settings.get('log_rotate_when', 'midnight'),
+            backup_count=int(settings.get('log_backup_count', 7)),
+            encoding='utf-8',
+        )
+        file_handler.setFormatter(formatter)
+        handlers.append(file_handler)
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+    handlers.append(stream_handler)
+
+    log_queue: queue.Queue = queue.Queue(-1)
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.addFilter(DedupFilter(float(settings.get('log_dedup_window', 60.0))))
+
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(settings.get('log_level', 'INFO'))
+
+    # The old pipeline writes out what it still holds, then lets go of its files
+    previous, _listener = _listener, listener
+    _close_listener(previous)
+
+
+def _close_listener(listener: Optional[logging.handlers.QueueListener]):
+    if listener is not None:
+        listener.stop()
+        for handler in listener.handlers:
+            handler.close()
+
+
+def shutdown_logging():
+    """Flush and stop the writer thread, closing the log file."""
+    global _listener
+    _close_listener(_listener)
+    _listener = None
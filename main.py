@@ -8,87 +8,572 @@ import asyncio
 import json
 import logging
 import os
+import re
+import time
 from datetime import datetime
-from typing import Set, Dict, Any
+from types import MappingProxyType
+from typing import Set, Dict, Any, Callable, List, Mapping, Optional, Tuple
 
 from telethon import TelegramClient, events
+from telethon.tl import types
 from telethon.tl.functions.account import GetAuthorizationsRequest, ResetAuthorizationRequest
-from telethon.tl.types import Authorization
+from telethon.tl.functions.auth import ResetAuthorizationsRequest
+from telethon.tl.functions.updates import GetStateRequest
+
+from audit import AuditEvent, open_audit_log
+from connection import ConnectionManager, describe, is_connection_error
+from control import start_control_server
+from ipintel import NO_RISK, RiskAssessment, open_ip_intel
+from log_setup import setup_logging, shutdown_logging
+from metrics import HISTOGRAMS, close_metrics, open_metrics, register_metrics, start_metrics_server
+from notifier import MAX_MESSAGE_LENGTH, NotificationQueue, split_message
+from ratelimit import RpcBudget
+from reloader import AccountChanges, ConfigReloader, TrustReloader, diff_accounts, same_login
+from replay import close_recorders, open_recorder
+from scheduler import PollCoordinator, ScanScheduler, create_scheduler
+from sessions import SessionDiff, SessionRecord, diff_sessions
+from supervisor import MonitorSupervisor
+from trust_rules import Decision, TrustPolicy
+from trust_store import open_store
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('bot.log'),
-        logging.StreamHandler()
-    ]
-)
 logger = logging.getLogger(__name__)
 
+# Telegram's official service account, which posts "New login" notices
+TELEGRAM_SERVICE_USER_ID = 777000
+
+# Not every Telethon layer ships updateNewAuthorization
+UpdateNewAuthorization = getattr(types, 'UpdateNewAuthorization', None)
+
+# Where notifications are sent (Saved Messages)
+NOTIFY_PEER = 'me'
+
+# Optional tuning knobs, overridable via the "settings" section of config.json
+DEFAULT_SETTINGS: Dict[str, Any] = {
+    'detection_mode': 'push',    # 'push' reacts to login signals, 'poll' scans on a fixed timer
+    'scan_interval': 0.5,        # seconds between scans in poll mode (burst cadence when adaptive)
+    'fallback_interval': 30.0,   # safety-net scan interval in push mode
+    'push_recheck_delay': 1.0,   # follow-up scan after a signal that found nothing new
+    'scheduler': 'adaptive',     # 'adaptive' or 'fixed'
+    'idle_interval': 5.0,        # adaptive poll mode: cadence once things are quiet
+    'burst_duration': 60.0,      # adaptive: seconds of fast scanning after activity
+    'backoff_max': 60.0,         # adaptive: cap on exponential error backoff
+    'jitter': 0.1,               # adaptive: +/- fraction of randomness per interval
+    'logout_concurrency': 8,     # max ResetAuthorization calls in flight at once
+    'mass_intrusion_threshold': 5,   # untrusted sessions in one scan that trigger a bulk reset (0 = off)
+    'mass_intrusion_dry_run': False, # report what a bulk reset would kill, but log out one by one
+    'notify_coalesce_window': 1.0,   # seconds to gather notifications into one digest
+    'notify_queue_size': 500,        # pending notifications kept before new ones are dropped
+    'snapshot_file': 'known_sessions.json',  # known sessions persisted across restarts
+    'notify_ip_changes': True,       # notify when a known session shows up from a new IP
+    'trust_store': 'trusted_devices.db',    # SQLite store shared by all accounts
+    'trusted_devices_file': 'trusted_devices.json',  # legacy JSON list, migrated into the store
+    'poll_spacing': 0.05,            # multi-account: minimum gap between any two accounts' polls
+    'account_retry_max': 300.0,      # multi-account: cap on restart backoff for a failing account
+    'interactive_login': True,       # prompt for a login code; worker processes cannot
+    'workers': 1,                    # >1 shards accounts across that many worker processes
+    'shard_status_interval': 5.0,    # seconds between worker status reports
+    'rpc_limits': {},                # per-lane [rate, burst] overrides: logout, probe, command, poll, notify
+    'rpc_global_rate': 20.0,         # requests per second across all lanes
+    'rpc_global_burst': 30.0,
+    'trust_rules_file': 'trust_rules.json',  # declarative trust/deny rules, reloaded on change
+    'audit_db': 'audit.db',          # indexed history of every session event, shared by all accounts
+    'history_page_size': 20,
+    'log_file': 'bot.log',
+    'log_format': 'text',            # 'text' or 'json' (JSON lines with account/session/latency fields)
+    'log_level': 'INFO',
+    'log_max_bytes': 10 * 1024 * 1024,   # rotate when the file grows past this size...
+    'log_rotate_when': 'midnight',       # ...or on this schedule: 'midnight', 'hourly', 'daily' or seconds
+    'log_backup_count': 7,
+    'log_dedup_window': 60.0,        # seconds to suppress repeats of an identical warning/error
+    'metrics_port': 0,               # serve Prometheus /metrics on this port (0 = off)
+    'metrics_host': '127.0.0.1',
+    'record_file': '',               # stream session snapshots here for replay.py ('.gz' compresses)
+    'watchdog_stall_timeout': 120.0, # restart the monitor task if it makes no progress for this long
+    'session_cache_max_age': 60.0,   # /sessions reuses the monitor's last scan if it is younger than this
+    'sessions_page_size': 10,
+    'control_socket': '',            # serve the local control API (control.py) on this UNIX socket
+    'hot_reload': True,              # apply edits to config.json and the trust files without a restart
+    'reload_poll_interval': 2.0,     # how often to check for edits where inotify is unavailable
+    'ip_geo_db': '',                 # offline ASN/geo database: .mmdb (needs maxminddb) or CSV
+    'ip_ranges_files': {},           # {category: file} of CIDR lists, e.g. {"tor": "tor_exits.txt"}
+    'ip_cache_size': 4096,           # IP lookups kept in the LRU cache
+    'ip_risk_weights': {},           # overrides of ipintel.DEFAULT_RISK_WEIGHTS
+    'ip_risk_kill_threshold': 60,    # log out rule-trusted sessions scoring at least this (0 = never)
+    'keepalive_interval': 30.0,      # probe the connection after this long without a successful request
+    'probe_timeout': 10.0,           # a probe (or reconnect attempt) taking longer counts as failed
+    'reconnect_backoff_max': 30.0,   # cap on the delay between reconnect attempts
+}
+
+# Settings a running bot picks up when config.json changes; the rest need a restart
+HOT_SETTINGS = frozenset({
+    'detection_mode', 'scan_interval', 'fallback_interval', 'push_recheck_delay', 'scheduler',
+    'idle_interval', 'burst_duration', 'backoff_max', 'jitter', 'logout_concurrency',
+    'mass_intrusion_threshold', 'mass_intrusion_dry_run', 'notify_coalesce_window',
+    'notify_ip_changes', 'trust_rules_file', 'history_page_size', 'watchdog_stall_timeout',
+    'session_cache_max_age', 'sessions_page_size', 'ip_risk_weights', 'ip_risk_kill_threshold',
+    'keepalive_interval', 'probe_timeout', 'reconnect_backoff_max',
+})
+
+class AccountLogAdapter(logging.LoggerAdapter):
+    """Prefixes log lines with the account name when several accounts share a process."""
+    
+    def process(self, msg, kwargs):
+        kwargs.setdefault('extra', {}).update(self.extra)
+        if self.extra['account'] == 'default':
+            return msg, kwargs
+        return f"[{self.extra['account']}] {msg}", kwargs
+
 class SessionMonitorBot:
-    def __init__(self, api_id: int, api_hash: str, phone: str):
+    def __init__(self, api_id: int, api_hash: str, phone: str,
+                 settings: Optional[Dict[str, Any]] = None, name: str = 'default',
+                 session_name: str = 'session_monitor',
+                 coordinator: Optional[PollCoordinator] = None,
+                 client: Optional[Any] = None):
         self.api_id = api_id
         self.api_hash = api_hash
         self.phone = phone
-        self.client = TelegramClient('session_monitor', api_id, api_hash)
+        self.name = name
+        self.settings: Dict[str, Any] = {**DEFAULT_SETTINGS, **(settings or {})}
+        # A stand-in such as fake_client.FakeTelegramClient can be passed for offline runs
+        self.client = client if client is not None else TelegramClient(session_name, api_id, api_hash)
+        self.log = AccountLogAdapter(logger, {'account': name})
+        
+        # Shared with other accounts in the same process to spread polling
+        self.coordinator = coordinator
+        self.initial_stagger = 0.0
+        self.handlers_registered = False
         
-        # File to store trusted device hashes
-        self.trusted_devices_file = 'trusted_devices.json'
+        # Trusted device hashes live in a shared store; the set is the in-memory view
+        self.trusted_devices_file = self.settings['trusted_devices_file']
+        self.trust_store = open_store(self.settings['trust_store'])
         self.trusted_devices: Set[int] = self.load_trusted_devices()
+        self.trust_policy = TrustPolicy(self.settings['trust_rules_file'])
         
-        # Known sessions to track changes
-        self.known_sessions: Dict[int, Authorization] = {}
+        # Every session event is recorded here, written behind by a background thread
+        self.audit = open_audit_log(self.settings['audit_db'])
+        
+        # Offline IP databases, shared by accounts using the same files; loaded in connect()
+        self.ip_intel = open_ip_intel(
+            self.settings['ip_geo_db'],
+            self.settings['ip_ranges_files'],
+            int(self.settings['ip_cache_size']),
+        )
+        
+        # Known sessions to track changes, persisted so restarts leave no blind window
+        self.known_sessions: Dict[int, SessionRecord] = {}
+        # Latest session list as Telegram returned it, from whichever request fetched it last
+        self._session_cache: Dict[int, SessionRecord] = {}
+        self.session_cache_at = 0.0
+        self.snapshot_file = self.settings['snapshot_file']
+        self.snapshot_lock = asyncio.Lock()
         
         # Monitor settings
         self.monitoring = False
-        self.scan_interval = 0.5  # seconds
+        self.idle = False
+        self.last_scan_at: Optional[float] = None
+        self.detection_mode = self.settings['detection_mode']
+        self.scan_interval = float(self.settings['scan_interval'])
+        self.fallback_interval = float(self.settings['fallback_interval'])
+        self.scheduler: ScanScheduler = create_scheduler(self.settings)
+        
+        # Set by login signals to wake the monitor loop for a targeted scan
+        self.scan_event = asyncio.Event()
+        self.pending_rechecks = 0
+        self.push_signals = 0
+        
+        # Every outbound request goes through the RPC budget
+        self.budget = RpcBudget(
+            self.settings['rpc_limits'],
+            global_rate=float(self.settings['rpc_global_rate']),
+            global_burst=float(self.settings['rpc_global_burst']),
+        )
+        
+        # Latency histograms and counters, exported on /metrics and /perf
+        self.metrics = open_metrics(name, self.budget.snapshot)
+        
+        # Probes the connection and reconnects when it breaks; scans wait while it is down
+        self.connection = ConnectionManager(
+            self.client,
+            self.probe_connection,
+            probe_interval=float(self.settings['keepalive_interval']),
+            probe_timeout=float(self.settings['probe_timeout']),
+            backoff_max=float(self.settings['reconnect_backoff_max']),
+            on_reconnected=self.record_reconnect,
+            log=self.log,
+        )
+        self.me: Any = None
+        self.notify_peer: Any = NOTIFY_PEER
+        # When each not-yet-killed untrusted session was first seen
+        self.first_seen: Dict[int, float] = {}
+        
+        # Optional recording of every polled snapshot, for offline replay
+        self.recorder = open_recorder(self.settings['record_file']) if self.settings['record_file'] else None
+        
+        # Bounds parallel logouts
+        self.logout_semaphore = asyncio.Semaphore(int(self.settings['logout_concurrency']))
+        
+        # Notifications are queued and sent as digests, off the detection path
+        self.notifier = NotificationQueue(
+            self.send_notification,
+            coalesce_window=float(self.settings['notify_coalesce_window']),
+            max_queue=int(self.settings['notify_queue_size']),
+            on_delivered=self.record_notification_latency,
+        )
+        # Owns the one monitor task of this account and restarts it if it dies or stalls
+        self.supervisor = MonitorSupervisor(
+            self.monitor_sessions,
+            is_idle=lambda: self.idle,
+            stall_timeout=float(self.settings['watchdog_stall_timeout']),
+            log=self.log,
+        )
+        self.mass_intrusion_threshold = int(self.settings['mass_intrusion_threshold'])
+        self.mass_intrusion_dry_run = bool(self.settings['mass_intrusion_dry_run'])
+        self.ip_risk_kill_threshold = int(self.settings['ip_risk_kill_threshold'])
         
     def load_trusted_devices(self) -> Set[int]:
-        """Load trusted device hashes from file."""
+        """Load trusted device hashes from the store, migrating a legacy JSON file first."""
         try:
-            if os.path.exists(self.trusted_devices_file):
-                with open(self.trusted_devices_file, 'r') as f:
-                    data = json.load(f)
-                    return set(data.get('trusted_devices', []))
+            self.trust_store.migrate_json(self.name, self.trusted_devices_file)
         except Exception as e:
-            logger.error(f"Error loading trusted devices: {e}")
+            self.log.error(f"Error migrating trusted devices: {e}")
+        try:
+            return self.trust_store.load(self.name)
+        except Exception as e:
+            self.log.error(f"Error loading trusted devices: {e}")
         return set()
     
-    def save_trusted_devices(self):
-        """Save trusted device hashes to file."""
+    async def trust_devices(self, session_hashes: List[int]) -> int:
+        """Trust hashes in memory and persist them; returns how many were new."""
+        self.trusted_devices.update(session_hashes)
+        try:
+            return await self.trust_store.import_hashes(self.name, session_hashes)
+        except Exception as e:
+            self.log.error(f"Error saving trusted devices: {e}")
+            return 0
+    
+    async def reload_trusted_devices(self) -> Optional[bool]:
+        """Re-read the trusted set from the store; whether it changed, or None on error."""
         try:
-            with open(self.trusted_devices_file, 'w') as f:
-                json.dump({'trusted_devices': list(self.trusted_devices)}, f, indent=2)
+            trusted = await self.trust_store.refresh(self.name, self.trusted_devices_file)
         except Exception as e:
-            logger.error(f"Error saving trusted devices: {e}")
+            self.log.error(f"Error reloading trusted devices: {e}")
+            return None
+        changed = trusted != self.trusted_devices
+        # Swapped in whole, so a scan never sees a half-updated set
+        self.trusted_devices = trusted
+        return changed
+    
+    async def untrust_device(self, session_hash: int):
+        """Stop trusting a hash in memory and in the store."""
+        self.trusted_devices.discard(session_hash)
+        try:
+            await self.trust_store.remove(self.name, session_hash)
+        except Exception as e:
+            self.log.error(f"Error saving trusted devices: {e}")
+    
+    def prepare_settings(self, settings: Dict[str, Any]) -> Callable[[], None]:
+        """Validate new settings and return a function that switches to them.
+        
+        Only HOT_SETTINGS change; everything else keeps its running value. All
+        the new objects are built here, so a bad value raises before anything
+        changed and applying them cannot fail half way.
+        """
+        new = {**DEFAULT_SETTINGS, **settings}
+        merged = dict(self.settings)
+        merged.update((key, new[key]) for key in HOT_SETTINGS)
+        
+        scheduler = create_scheduler(merged)
+        scheduler.carry_over(self.scheduler)
+        trust_policy = self.trust_policy
+        if merged['trust_rules_file'] != self.settings['trust_rules_file']:
+            trust_policy = TrustPolicy(merged['trust_rules_file'])
+        logout_semaphore = self.logout_semaphore
+        if int(merged['logout_concurrency']) != int(self.settings['logout_concurrency']):
+            logout_semaphore = asyncio.Semaphore(int(merged['logout_concurrency']))
+        scan_interval = float(merged['scan_interval'])
+        fallback_interval = float(merged['fallback_interval'])
+        coalesce_window = float(merged['notify_coalesce_window'])
+        stall_timeout = float(merged['watchdog_stall_timeout'])
+        mass_intrusion_threshold = int(merged['mass_intrusion_threshold'])
+        ip_risk_kill_threshold = int(merged['ip_risk_kill_threshold'])
+        keepalive_interval = float(merged['keepalive_interval'])
+        probe_timeout = float(merged['probe_timeout'])
+        reconnect_backoff_max = float(merged['reconnect_backoff_max'])
+        if any(not isinstance(weight, int) for weight in dict(merged['ip_risk_weights']).values()):
+            raise ValueError("ip_risk_weights must map factors to whole numbers")
+        
+        def apply():
+            # The new cadence takes effect from the monitor's next wait
+            self.settings = merged
+            self.detection_mode = merged['detection_mode']
+            self.scan_interval = scan_interval
+            self.fallback_interval = fallback_interval
+            self.scheduler = scheduler
+            self.trust_policy = trust_policy
+            self.logout_semaphore = logout_semaphore
+            self.notifier.coalesce_window = coalesce_window
+            self.supervisor.stall_timeout = stall_timeout
+            self.mass_intrusion_threshold = mass_intrusion_threshold
+            self.mass_intrusion_dry_run = bool(merged['mass_intrusion_dry_run'])
+            self.ip_risk_kill_threshold = ip_risk_kill_threshold
+            self.connection.probe_interval = keepalive_interval
+            self.connection.probe_timeout = probe_timeout
+            self.connection.backoff_max = reconnect_backoff_max
+        return apply
     
-    async def get_current_sessions(self) -> Dict[int, Authorization]:
-        """Get all current active sessions."""
+    @property
+    def snapshot_owner(self) -> str:
+        """The login a snapshot belongs to: the phone number's digits."""
+        return re.sub(r'\D', '', str(self.phone))
+    
+    def load_snapshot(self) -> Optional[Dict[int, SessionRecord]]:
+        """Load the persisted known sessions, or None if there is no snapshot of this login."""
         try:
-            result = await self.client(GetAuthorizationsRequest())
-            sessions = {}
-            # Access authorizations with proper type handling
-            auths = getattr(result, 'authorizations', [])
-            for auth in auths:
-                sessions[auth.hash] = auth
-            return sessions
+            if os.path.exists(self.snapshot_file):
+                with open(self.snapshot_file, 'r') as f:
+                    data = json.load(f)
+                # Another login's sessions would all look new and be logged out
+                if data.get('phone') != self.snapshot_owner:
+                    self.log.warning(f"Ignoring session snapshot {self.snapshot_file}: it belongs to another login")
+                    return None
+                records = (SessionRecord.from_snapshot(e) for e in data.get('sessions', []))
+                return {record.hash: record for record in records}
         except Exception as e:
-            logger.error(f"Error getting sessions: {e}")
-            return {}
+            self.log.error(f"Error loading session snapshot: {e}")
+        return None
+    
+    def write_snapshot(self, records: List[SessionRecord]):
+        """Atomically write the known sessions to disk."""
+        tmp_file = f"{self.snapshot_file}.tmp"
+        with open(tmp_file, 'w') as f:
+            json.dump({'saved_at': int(time.time()), 'phone': self.snapshot_owner, 'sessions': records}, f)
+        os.replace(tmp_file, self.snapshot_file)
+    
+    def discard_snapshot(self):
+        """Delete the persisted known sessions, once they no longer match the account's login."""
+        try:
+            os.remove(self.snapshot_file)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            self.log.error(f"Error deleting session snapshot: {e}")
+    
+    async def save_snapshot(self):
+        """Persist the current known set without blocking the event loop."""
+        async with self.snapshot_lock:
+            records = list(self.known_sessions.values())
+            try:
+                loop = asyncio.get_running_loop()
+                await loop.run_in_executor(None, self.write_snapshot, records)
+            except Exception as e:
+                self.log.error(f"Error saving session snapshot: {e}")
+    
+    async def rpc(self, lane: str, request: Any) -> Any:
+        """Invoke a raw Telegram request through the RPC budget."""
+        return await self.budget.call(lane, self.client, request)
+    
+    async def respond(self, event, message: str):
+        """Reply to a command through the RPC budget."""
+        return await self.budget.call('command', event.respond, message)
+    
+    async def timed_request(self, histogram: str, request: Any) -> Any:
+        """Send a request, observing its round-trip time (without budget waits)."""
+        with self.metrics.timer(histogram):
+            result = await self.client(request)
+        self.connection.record_success()
+        return result
+    
+    async def fetch_sessions(self, lane: str = 'poll') -> Dict[int, SessionRecord]:
+        """Get all current active sessions, raising on failure."""
+        try:
+            result = await self.budget.call(lane, self.timed_request, 'poll_rtt_seconds', GetAuthorizationsRequest())
+        except Exception as e:
+            if self.recorder:
+                self.recorder.record_error(self.name, e)
+            raise
+        sessions = {}
+        # Access authorizations with proper type handling
+        auths = getattr(result, 'authorizations', [])
+        for auth in auths:
+            sessions[auth.hash] = SessionRecord.from_authorization(auth)
+        if self.recorder:
+            self.recorder.record(self.name, sessions)
+        self._session_cache = dict(sessions)
+        self.session_cache_at = time.monotonic()
+        return sessions
+    
+    @property
+    def session_view(self) -> Mapping[int, SessionRecord]:
+        """Read-only view of the most recently fetched session list."""
+        return MappingProxyType(self._session_cache)
+    
+    @property
+    def session_cache_age(self) -> float:
+        """Seconds since the session list was last fetched (infinite if never)."""
+        if not self.session_cache_at:
+            return float('inf')
+        return time.monotonic() - self.session_cache_at
+    
+    async def cached_sessions(self, force: bool = False) -> Tuple[Mapping[int, SessionRecord], float]:
+        """The session view and its age, refreshed only when stale or forced.
+        
+        A refresh that reveals a session the monitor has not vetted yet wakes
+        the monitor loop, so commands never bypass the kill path.
+        """
+        if force or self.session_cache_age > float(self.settings['session_cache_max_age']):
+            try:
+                sessions = await self.fetch_sessions('command')
+            except Exception as e:
+                if force or not self.session_cache_at:
+                    raise
+                self.log.warning(f"Could not refresh sessions, serving the cached list: {e}")
+            else:
+                if self.monitoring and sessions.keys() - self.known_sessions.keys():
+                    self.request_scan("new session seen by a command")
+        return self.session_view, self.session_cache_age
+    
+    async def probe_connection(self, timeout: float):
+        """Health probe: the cheapest authenticated request, timed out on its own (not budget waits).
+        
+        Probes have their own lane, so a FloodWait on polling never holds one up.
+        While the probe lane itself is blocked the probe is skipped rather than
+        queued: Telegram just answered, so the connection worked.
+        """
+        if self.budget.blocked_for('probe'):
+            return
+        await self.budget.call('probe', lambda: asyncio.wait_for(self.client(GetStateRequest()), timeout))
+    
+    async def warm_up(self):
+        """Resolve our own user and the notification peer before the first scan and alert need them."""
+        self.me = await self.budget.call('command', self.client.get_me)
+        self.notify_peer = await self.client.get_input_entity(NOTIFY_PEER)
+    
+    def record_reconnect(self, seconds: float):
+        """Connection manager callback after a reconnect: catch up on what was missed."""
+        self.metrics.observe('reconnect_seconds', seconds)
+        self.metrics.inc('reconnects_total')
+        # Logins during the outage sent no signal we could see
+        self.scheduler.trigger_burst('reconnected')
+        self.scan_event.set()
+    
+    async def wait_for_connection(self):
+        """Hold scans while the connection is down, so an outage is not a string of failed scans."""
+        if self.connection.ready.is_set():
+            return
+        self.log.info("Waiting for the connection before scanning")
+        # Nothing is in flight, so /stop may cancel the task here
+        self.idle = True
+        try:
+            while not self.connection.ready.is_set():
+                self.supervisor.heartbeat(self.connection.probe_interval)
+                try:
+                    await asyncio.wait_for(self.connection.ready.wait(), self.connection.probe_interval)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            self.idle = False
     
     async def logout_session(self, session_hash: int) -> bool:
         """Log out a specific session."""
         try:
-            await self.client(ResetAuthorizationRequest(hash=session_hash))
-            logger.info(f"Successfully logged out session: {session_hash}")
+            await self.budget.call('logout', self.timed_request, 'logout_seconds',
+                                   ResetAuthorizationRequest(hash=session_hash))
+            self.log.info(f"Successfully logged out session: {session_hash}")
             return True
         except Exception as e:
-            logger.error(f"Error logging out session {session_hash}: {e}")
+            self.log.error(f"Error logging out session {session_hash}: {e}")
+            self.metrics.inc('logout_failures_total')
             return False
     
-    def format_session_info(self, auth: Authorization) -> str:
-        """Format session information for display."""
+    def evaluate_trust(self, auth: SessionRecord) -> Decision:
+        """Decide whether a new session may stay.
+        
+        An explicitly trusted hash always wins, then deny rules, then trust rules;
+        anything left unmatched is untrusted.
+        """
+        if auth.hash in self.trusted_devices:
+            return Decision('trust', 'trusted hash')
+        return self.trust_policy.evaluate(auth)
+    
+    def assess_risk(self, auth: SessionRecord) -> RiskAssessment:
+        """Score a new session's IP against the offline databases and the account's other sessions."""
+        if not self.ip_intel.enabled:
+            return NO_RISK
+        seen_countries = {s.country for h, s in self.known_sessions.items() if h != auth.hash and s.country}
+        seen_asns = set()
+        for session_hash, session in self.known_sessions.items():
+            if session_hash != auth.hash:
+                asn = self.ip_intel.lookup(session.ip).asn
+                if asn:
+                    seen_asns.add(asn)
+        return self.ip_intel.assess(auth.ip, auth.country, seen_countries, seen_asns,
+                                    self.settings['ip_risk_weights'])
+    
+    async def logout_sessions(self, session_hashes: List[int]) -> Dict[int, bool]:
+        """Log out several sessions at once with bounded concurrency."""
+        async def bounded_logout(session_hash: int) -> bool:
+            async with self.logout_semaphore:
+                return await self.logout_session(session_hash)
+        
+        results = await asyncio.gather(*(bounded_logout(h) for h in session_hashes))
+        return dict(zip(session_hashes, results))
+    
+    async def bulk_logout(self, untrusted: List[int],
+                          current_sessions: Dict[int, SessionRecord]) -> bool:
+        """Terminate every other session with a single ResetAuthorizations call.
+        
+        Telegram offers no way to re-admit a session after a bulk reset, so the
+        bulk path is refused whenever a trusted or previously known session would
+        be lost along with the intruders. Returns False when the caller should fall
+        back to per-session logouts.
+        """
+        targets = set(untrusted)
+        collateral = [
+            auth for session_hash, auth in current_sessions.items()
+            if session_hash not in targets and not auth.current
+        ]
+        
+        report = "\n".join(
+            f"• {current_sessions[h].device_model or 'Unknown'} - "
+            f"{current_sessions[h].ip or 'Unknown'} ({h})"
+            for h in untrusted
+        )
+        
+        if collateral:
+            self.log.warning(
+                f"Mass intrusion of {len(untrusted)} sessions, bulk reset refused: "
+                f"{len(collateral)} trusted/known sessions would be lost"
+            )
+            self.notify_in_background(
+                f"🧨 MASS INTRUSION: {len(untrusted)} untrusted sessions detected.\n"
+                f"Bulk reset refused because it would also end {len(collateral)} trusted/known "
+                f"session(s); logging out one by one instead.\n\n{report}"
+            )
+            return False
+        
+        if self.mass_intrusion_dry_run:
+            self.log.warning(f"Mass intrusion dry run: bulk reset would kill {len(untrusted)} sessions")
+            self.notify_in_background(
+                f"🧪 MASS INTRUSION (dry run): a bulk reset would kill {len(untrusted)} sessions. "
+                f"Logging out one by one instead.\n\n{report}"
+            )
+            return False
+        
+        try:
+            await self.rpc('logout', ResetAuthorizationsRequest())
+        except Exception as e:
+            self.log.error(f"Bulk reset failed, falling back to per-session logout: {e}")
+            return False
+        
+        self.log.warning(f"Mass intrusion: bulk reset killed {len(untrusted)} sessions in one request")
+        self.notify_in_background(
+            f"🧨 MASS INTRUSION: {len(untrusted)} untrusted sessions killed with a single bulk reset.\n\n"
+            f"{report}"
+        )
+        return True
+    
+    def format_session_info(self, auth: SessionRecord, risk: Optional[RiskAssessment] = None) -> str:
+        """Format session information for display, with the IP risk assessment if there is one."""
         # Handle datetime objects properly with None checks
         if auth.date_created:
             date_created = auth.date_created if isinstance(auth.date_created, datetime) else datetime.fromtimestamp(auth.date_created)
@@ -110,171 +595,884 @@ class SessionMonitorBot:
             f"📅 Created: {date_created}\n"
             f"🕐 Active: {date_active}\n"
             f"🆔 Hash: {auth.hash}"
-        )
+        ) + (self.format_risk(risk) if risk else "")
     
-    async def monitor_sessions(self):
-        """Main monitoring loop."""
-        logger.info("Starting session monitoring...")
+    @staticmethod
+    def format_risk(risk: RiskAssessment) -> str:
+        info = risk.info
+        network = " ".join(filter(None, (f"AS{info.asn}" if info.asn else None, info.org)))
+        lines = ""
+        if network or info.category:
+            lines += f"\n🛰️ Network: {network or 'Unknown'}" + (f" [{info.category}]" if info.category else "")
+        if risk.score:
+            lines += f"\n⚠️ Risk: {risk.describe()}"
+        return lines
+    
+    def monitor_active(self, generation: Optional[int]) -> bool:
+        """Whether the monitor loop started as ``generation`` should keep scanning."""
+        return self.monitoring and (generation is None or self.supervisor.is_current(generation))
+    
+    async def monitor_sessions(self, generation: Optional[int] = None):
+        """Main monitoring loop; ``generation`` is given when the supervisor runs it."""
+        self.log.info("Starting session monitoring...")
         
-        # Initialize known sessions
-        self.known_sessions = await self.get_current_sessions()
-        logger.info(f"Initialized with {len(self.known_sessions)} known sessions")
+        # Initialize known sessions. With a persisted snapshot the first scan is
+        # a catch-up diff, so sessions created while we were down get vetted.
+        # Without one, the first successful scan becomes the baseline: a failed
+        # scan is never mistaken for an account without sessions.
+        needs_baseline = False
+        if not self.known_sessions:
+            snapshot = self.load_snapshot()
+            # An account always lists the bot's own session, so an empty snapshot
+            # can only be a failed scan saved by an older version
+            if snapshot:
+                self.known_sessions = snapshot
+                self.log.info(f"Loaded snapshot with {len(snapshot)} known sessions, running catch-up scan")
+            else:
+                needs_baseline = True
+        catch_up = True
         
-        while self.monitoring:
+        while self.monitor_active(generation):
             try:
-                current_sessions = await self.get_current_sessions()
+                if catch_up:
+                    catch_up = False
+                else:
+                    await self.wait_for_scan()
+                await self.wait_for_connection()
+                if not self.monitor_active(generation):
+                    break
+                self.supervisor.heartbeat()
                 
-                # Check for new sessions
-                for session_hash, auth in current_sessions.items():
-                    if session_hash not in self.known_sessions:
-                        # New session detected
-                        logger.info(f"New session detected: {session_hash}")
-                        
-                        # Check if it's a trusted device
-                        if session_hash in self.trusted_devices:
-                            logger.info(f"Session {session_hash} is trusted, allowing...")
-                            await self.send_notification(
-                                f"✅ Trusted device logged in:\n{self.format_session_info(auth)}"
-                            )
-                        else:
-                            # Untrusted device - log it out
-                            logger.warning(f"Untrusted session detected, logging out: {session_hash}")
-                            
-                            await self.send_notification(
-                                f"🚨 SECURITY ALERT: Untrusted device detected and logged out!\n"
-                                f"{self.format_session_info(auth)}\n\n"
-                                f"If this was you, use /trust {session_hash} to trust this device in the future."
-                            )
-                            
-                            success = await self.logout_session(session_hash)
-                            if success:
-                                logger.info(f"Successfully logged out untrusted session: {session_hash}")
-                            else:
-                                logger.error(f"Failed to log out untrusted session: {session_hash}")
+                if self.coordinator:
+                    await self.coordinator.acquire(self.name)
+                current_sessions = await self.fetch_sessions()
+                if needs_baseline:
+                    needs_baseline = False
+                    self.known_sessions = current_sessions
+                    await self.save_snapshot()
+                    self.log.info(f"Initialized with {len(self.known_sessions)} known sessions")
+                    self.last_scan_at = time.time()
+                    self.supervisor.scan_completed()
+                    continue
+                with self.metrics.timer('diff_seconds'):
+                    diff = diff_sessions(self.known_sessions, current_sessions)
+                self.scheduler.record_scan(len(diff.added))
+                self.metrics.inc('scans_total')
                 
-                # Update known sessions
-                self.known_sessions = current_sessions
+                # A login signal can arrive a moment before the session is listed
+                if self.pending_rechecks and not diff.added:
+                    self.pending_rechecks -= 1
+                else:
+                    self.pending_rechecks = 0
+                
+                if diff.added:
+                    killed, failed = await self.handle_new_sessions(diff.added, current_sessions)
+                    # Killed sessions are gone, so the next scan must not report them as ended;
+                    # failed logouts stay out of the known set so the next scan retries them
+                    for session_hash in killed | failed:
+                        current_sessions.pop(session_hash, None)
+                if diff.removed or diff.changed:
+                    self.handle_session_changes(diff)
                 
-                await asyncio.sleep(self.scan_interval)
+                # Update known sessions, persisting only when something changed
+                self.known_sessions = current_sessions
+                if diff:
+                    await self.save_snapshot()
+                self.last_scan_at = time.time()
+                self.supervisor.scan_completed()
                 
             except Exception as e:
-                logger.error(f"Error in monitoring loop: {e}")
-                await asyncio.sleep(1)  # Wait before retrying
+                self.log.error(f"Error in monitoring loop: {describe(e)}")
+                self.metrics.inc('scan_errors_total')
+                if is_connection_error(e) and self.connection.running:
+                    # Scans wait for the connection manager, then catch up at once
+                    self.connection.report_failure(e)
+                    catch_up = True
+                else:
+                    # The scheduler turns this into backoff or a FloodWait pause
+                    self.scheduler.record_error(e)
     
-    async def send_notification(self, message: str):
-        """Send notification to the user."""
+    async def handle_new_sessions(self, new_sessions: Dict[int, SessionRecord],
+                                  current_sessions: Dict[int, SessionRecord]) -> Tuple[Set[int], Set[int]]:
+        """Kill untrusted new sessions first, then report on everything.
+        
+        All logouts are issued together so the attacker's window does not grow
+        with the number of sessions; notifications go out in the background.
+        Above the mass-intrusion threshold a single bulk reset is tried first.
+        Returns the hashes that were logged out and those whose logout failed.
+        """
+        detected_at = time.monotonic()
+        # A session whose logout failed keeps its first sighting across retries
+        self.first_seen = {h: t for h, t in self.first_seen.items() if h in current_sessions}
+        untrusted = []
+        decision_rules: Dict[int, Optional[str]] = {}
+        risks: Dict[int, RiskAssessment] = {}
+        for session_hash, auth in new_sessions.items():
+            risk = risks[session_hash] = self.assess_risk(auth)
+            self.log.info(
+                f"New session detected: {session_hash}" + (f", risk {risk.describe()}" if risk.score else ""),
+                extra={'session_hash': session_hash},
+            )
+            self.audit.record(self.name, 'new', auth, f"risk {risk.describe()}" if risk.score else None)
+            decision = self.evaluate_trust(auth)
+            # A rule can vouch for a session but not for where it comes from;
+            # only an explicitly trusted hash outranks a high risk score
+            if (decision.action == 'trust' and session_hash not in self.trusted_devices
+                    and self.ip_risk_kill_threshold and risk.score >= self.ip_risk_kill_threshold):
+                decision = Decision('deny', f"risk {risk.describe()}")
+            if decision.action == 'trust':
+                self.log.info(f"Session {session_hash} is trusted ({decision.rule}), allowing...")
+                self.audit.record(self.name, 'trusted', auth, decision.rule)
+                self.notify_in_background(
+                    f"✅ Trusted device logged in ({decision.rule}):\n{self.format_session_info(auth, risk)}"
+                )
+            else:
+                reason = f" by rule {decision.rule}" if decision.rule else ""
+                self.log.warning(
+                    f"Untrusted session detected{reason}, logging out: {session_hash}",
+                    extra={'session_hash': session_hash},
+                )
+                untrusted.append(session_hash)
+                decision_rules[session_hash] = decision.rule
+                self.first_seen.setdefault(session_hash, detected_at)
+        
+        if not untrusted:
+            return set(), set()
+        
+        if self.mass_intrusion_threshold and len(untrusted) >= self.mass_intrusion_threshold:
+            if await self.bulk_logout(untrusted, current_sessions):
+                for session_hash in untrusted:
+                    self.audit.record(self.name, 'killed', new_sessions[session_hash], 'bulk reset')
+                    self.record_kill(session_hash)
+                return set(untrusted), set()
+        
+        results = await self.logout_sessions(untrusted)
+        
+        for session_hash, success in results.items():
+            auth = new_sessions[session_hash]
+            latency_ms = round((time.monotonic() - self.first_seen[session_hash]) * 1000, 1)
+            if success:
+                self.record_kill(session_hash)
+                self.log.info(
+                    f"Successfully logged out untrusted session: {session_hash}",
+                    extra={'session_hash': session_hash, 'latency_ms': latency_ms},
+                )
+                self.audit.record(self.name, 'killed', auth, decision_rules.get(session_hash))
+                self.notify_in_background(
+                    f"🚨 SECURITY ALERT: Untrusted device detected and logged out!\n"
+                    f"{self.format_session_info(auth, risks[session_hash])}\n\n"
+                    f"If this was you, use /trust {session_hash} to trust this device in the future."
+                )
+            else:
+                self.log.error(
+                    f"Failed to log out untrusted session: {session_hash}",
+                    extra={'session_hash': session_hash, 'latency_ms': latency_ms},
+                )
+                self.audit.record(self.name, 'logout_failed', auth)
+                self.scheduler.trigger_burst('failed logout')
+                self.notify_in_background(
+                    f"🚨 SECURITY ALERT: Untrusted device detected but logout FAILED!\n"
+                    f"{self.format_session_info(auth, risks[session_hash])}\n\n"
+                    f"The bot will keep retrying. Check your sessions in Telegram settings."
+                )
+        
+        killed = {h for h, success in results.items() if success}
+        return killed, set(results) - killed
+    
+    def record_kill(self, session_hash: int):
+        """Observe the detection-to-kill latency of a session that was just logged out."""
+        seen_at = self.first_seen.pop(session_hash, None)
+        if seen_at is not None:
+            self.metrics.observe('detection_to_kill_seconds', time.monotonic() - seen_at)
+        self.metrics.inc('sessions_killed_total')
+        self._session_cache.pop(session_hash, None)
+        if self.recorder:
+            self.recorder.record_kill(self.name, [session_hash])
+    
+    def record_notification_latency(self, seconds: float):
+        """Notifier callback for every delivered message."""
+        self.metrics.observe('notification_latency_seconds', seconds)
+        self.metrics.inc('notifications_sent_total')
+    
+    def format_perf(self) -> str:
+        """Summarise latency percentiles and counters for /perf."""
+        labels = {
+            'poll_rtt_seconds': '📡 Poll RTT',
+            'diff_seconds': '🧮 Diff',
+            'logout_seconds': '🔨 Logout RPC',
+            'detection_to_kill_seconds': '🎯 Detection → kill',
+            'notification_latency_seconds': '📬 Notification',
+            'reconnect_seconds': '🔌 Reconnect',
+        }
+        lines = [f"⚡ **Performance{' of ' + self.name if self.name != 'default' else ''}:**\n"]
+        for name in HISTOGRAMS:
+            histogram = self.metrics.histograms[name]
+            if not histogram.count:
+                lines.append(f"{labels[name]}: no data")
+                continue
+            lines.append(
+                f"{labels[name]}: p50 {histogram.quantile(0.5) * 1000:.1f}ms, "
+                f"p95 {histogram.quantile(0.95) * 1000:.1f}ms, "
+                f"max {histogram.max * 1000:.1f}ms (n={histogram.count})"
+            )
+        counters = self.metrics.counters
+        rpc = self.metrics.rpc_totals()
+        lines.append(
+            f"\n🔁 **Scans:** {counters['scans_total']} ({counters['scan_errors_total']} failed)\n"
+            f"🚨 **Killed:** {counters['sessions_killed_total']} "
+            f"({counters['logout_failures_total']} failed logouts)\n"
+            f"🚦 **RPCs:** {rpc['rpc_total']} ({rpc['rpc_errors_total']} errors, "
+            f"{rpc['rpc_flood_waits_total']} FloodWaits)"
+        )
+        if self.ip_intel.enabled:
+            ip_stats = self.ip_intel.stats()
+            lines.append(f"🛰️ **IP lookups:** {ip_stats['hits']} cached, {ip_stats['misses']} resolved")
+        return "\n".join(lines)
+    
+    def handle_session_changes(self, diff: SessionDiff):
+        """Report known sessions that ended or moved to a new IP."""
+        for session_hash, auth in diff.removed.items():
+            self.log.info(f"Session ended: {session_hash} ({auth.device_model or 'Unknown'})")
+            self.audit.record(self.name, 'disappeared', auth)
+        
+        for session_hash, (before, after) in diff.changed.items():
+            self.log.warning(
+                f"Session {session_hash} changed IP: {before.ip} ({before.country}) -> "
+                f"{after.ip} ({after.country})"
+            )
+            self.audit.record(self.name, 'ip_changed', after, f"from {before.ip} ({before.country})")
+            if self.settings['notify_ip_changes']:
+                self.notify_in_background(
+                    f"🌐 Known session changed IP:\n"
+                    f"{before.ip or 'Unknown'} ({before.country or 'Unknown'}) → "
+                    f"{after.ip or 'Unknown'} ({after.country or 'Unknown'})\n"
+                    f"{self.format_session_info(after)}"
+                )
+    
+    def format_connection(self) -> str:
+        """One-line connection state for /status."""
+        connection = self.connection.snapshot()
+        if connection['down_for'] is not None:
+            text = f"down for {connection['down_for']:.0f}s ({connection['last_error']})"
+        else:
+            text = "up" if connection['connected'] else "disconnected"
+        if connection['reconnects']:
+            text += (f", {connection['reconnects']} reconnects "
+                     f"(last recovered in {connection['last_recovery']:.1f}s)")
+        return text
+    
+    def format_history(self, events: List[AuditEvent]) -> str:
+        """Render audit events as one line each."""
+        icons = {
+            'new': '🆕', 'trusted': '✅', 'killed': '🚨',
+            'logout_failed': '⚠️', 'disappeared': '👋', 'ip_changed': '🌐',
+        }
+        lines = []
+        for e in events:
+            when = datetime.fromtimestamp(e.ts).strftime('%Y-%m-%d %H:%M:%S')
+            line = (
+                f"{when} {icons.get(e.event, '•')} {e.event} {e.hash} - "
+                f"{e.device or 'Unknown'}, {e.ip or '?'} ({e.country or '?'})"
+            )
+            if e.detail:
+                line += f" [{e.detail}]"
+            lines.append(line)
+        return "\n".join(lines)
+    
+    def format_sessions(self, matching: List[Tuple[SessionRecord, bool]], page: int, pages: int,
+                        page_size: int, age: float, args: List[str]) -> str:
+        """Render one page of /sessions output."""
+        first = (page - 1) * page_size
+        message = f"📱 **Active Sessions** ({len(matching)}, as of {age:.0f}s ago):\n\n"
+        for i, (auth, trusted) in enumerate(matching[first:first + page_size], first + 1):
+            icon = "📍" if auth.current else ("✅" if trusted else "❌")
+            message += f"{i}. {icon} **Session {auth.hash}**\n"
+            message += f"   📱 {auth.device_model} - {auth.app_name}\n"
+            message += f"   🌍 {auth.country} - {auth.ip}\n\n"
+        if pages > 1:
+            base = " ".join(arg for arg in args if not arg.startswith('#') and arg != 'refresh')
+            message += f"Page {page}/{pages}"
+            if page < pages:
+                message += f" - next: /sessions {base + ' ' if base else ''}#{page + 1}"
+        return message
+    
+    async def wait_for_scan(self):
+        """Wait until the next scan is due.
+        
+        The delay comes from the scheduler. In push mode a login signal cuts
+        the wait short, unless Telegram has asked us to back off with FloodWait.
+        """
+        timeout = self.scheduler.next_interval() + self.initial_stagger
+        self.initial_stagger = 0.0
+        self.supervisor.heartbeat(timeout)
+        # Nothing is in flight while we wait, so /stop may cancel the task here
+        self.idle = True
         try:
-            await self.client.send_message('me', message)
-        except Exception as e:
-            logger.error(f"Error sending notification: {e}")
+            if self.detection_mode != 'push' or self.scheduler.flood_wait_remaining():
+                await asyncio.sleep(timeout)
+                return
+            
+            if self.pending_rechecks:
+                timeout = min(timeout, float(self.settings['push_recheck_delay']))
+            try:
+                await asyncio.wait_for(self.scan_event.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            self.scan_event.clear()
+        finally:
+            self.idle = False
     
-    async def start(self):
-        """Start the bot."""
-        # Connect and start the client
-        await self.client.connect()
+    def request_scan(self, reason: str):
+        """Wake the monitor loop for an immediate session diff."""
+        self.push_signals += 1
+        self.pending_rechecks = 1
+        self.scheduler.trigger_burst(reason)
+        self.log.info(f"Login signal received ({reason}), scanning sessions")
+        self.scan_event.set()
+    
+    def notify_in_background(self, message: str):
+        """Queue a notification without holding up the caller."""
+        self.notifier.submit(message)
+    
+    async def send_notification(self, message: str):
+        """Send notification to the user; errors are left to the notifier's retry logic."""
+        await self.budget.call('notify', self.client.send_message, self.notify_peer, message)
+    
+    async def connect(self):
+        """Connect, log in and warm up the client, then register handlers."""
+        await self.connection.connect()
         if not await self.client.is_user_authorized():
+            if not self.settings['interactive_login']:
+                raise RuntimeError(f"Session for {self.phone} is not authorized; log in once interactively")
             await self.client.send_code_request(self.phone)
-            code = input('Enter the code you received: ')
+            code = input(f'Enter the code you received for {self.phone}: ')
             await self.client.sign_in(self.phone, code)
         
-        logger.info("Bot started successfully!")
+        # Cold start: resolve peers while the IP databases load, all before the first scan
+        warm_ups = [self.connection.warm_up(self.warm_up)]
+        if self.ip_intel.enabled:
+            warm_ups.append(self.ip_intel.ensure_loaded())
+        await asyncio.gather(*warm_ups)
         
-        # Set up event handlers
-        self.setup_handlers()
+        self.log.info("Bot started successfully!")
+        self.notifier.start()
         
-        # Start monitoring
+        # Set up event handlers
+        if not self.handlers_registered:
+            self.setup_handlers()
+            self.handlers_registered = True
+    
+    def start_monitoring(self) -> bool:
+        """Start the monitor task; returns False if it was already running."""
         self.monitoring = True
-        await self.monitor_sessions()
+        return self.supervisor.start()
+    
+    async def stop_monitoring(self):
+        """Stop the monitor task, letting a scan in progress finish first."""
+        self.monitoring = False
+        await self.supervisor.stop()
+    
+    async def start(self):
+        """Start the bot and monitor, reconnecting whenever the connection drops."""
+        await self.connect()
+        self.start_monitoring()
+        try:
+            await self.connection.run()
+        finally:
+            await self.stop_monitoring()
+    
+    def status(self) -> Dict[str, Any]:
+        """Summary of this account's monitor state."""
+        return {
+            'account': self.name,
+            'monitoring': self.monitoring,
+            'sessions': len(self._session_cache),
+            'trusted': len(self.trusted_devices),
+            'interval': round(self.scheduler.effective_interval, 2),
+            'mode': self.scheduler.mode,
+            'scans': self.scheduler.scans,
+            'errors': self.scheduler.errors,
+            'last_scan': self.last_scan_at,
+            'restarts': self.supervisor.restarts,
+            'connection': self.connection.snapshot(),
+            'rpc': self.budget.snapshot(),
+        }
     
     def setup_handlers(self):
         """Set up command handlers."""
         
+        if UpdateNewAuthorization is not None:
+            @self.client.on(events.Raw(UpdateNewAuthorization))
+            async def new_authorization_handler(update):
+                self.request_scan(f"new authorization {update.hash}")
+        
+        @self.client.on(events.NewMessage(from_users=TELEGRAM_SERVICE_USER_ID))
+        async def service_notification_handler(event):
+            self.request_scan("service notification")
+        
         @self.client.on(events.NewMessage(pattern='/start', from_users='me'))
         async def start_handler(event):
-            await event.respond(
+            await self.respond(
+                event,
                 "🔥 **SessionKiller Bot**\n\n"
                 "This bot monitors your login sessions and automatically logs out untrusted devices.\n\n"
                 "**Commands:**\n"
                 "/status - Show monitoring status\n"
-                "/sessions - List all active sessions\n"
+                "/sessions [untrusted] [country=X] [app=Y] [#page] - List active sessions\n"
                 "/trust <hash> - Trust a device\n"
                 "/untrust <hash> - Remove device from trusted list\n"
                 "/trusted - Show trusted devices\n"
+                "/importtrust <hashes> - Trust many devices at once\n"
+                "/exporttrust - Export trusted devices as an /importtrust command\n"
+                "/reloadrules - Reload trust rules from disk\n"
+                "/history [hash|ip] [#page] - Show session history\n"
+                "/perf - Show detection and notification latency\n"
                 "/stop - Stop monitoring\n"
-                "/resume - Resume monitoring"
+                "/resume - Resume monitoring\n"
+                "/accounts - Show every monitored account"
             )
         
         @self.client.on(events.NewMessage(pattern='/status', from_users='me'))
         async def status_handler(event):
             status = "🟢 Active" if self.monitoring else "🔴 Stopped"
-            sessions_count = len(self.known_sessions)
+            try:
+                sessions, age = await self.cached_sessions()
+                sessions_count = f"{len(sessions)} (as of {age:.0f}s ago)"
+            except Exception as e:
+                self.log.error(f"Error getting sessions: {e}")
+                sessions_count = "unknown"
             trusted_count = len(self.trusted_devices)
             
-            await event.respond(
+            if self.detection_mode == 'push':
+                detection = f"⚡ Push (fallback scan every {self.fallback_interval}s)"
+            else:
+                detection = f"🔁 Polling every {self.scan_interval}s"
+            
+            scheduler = self.scheduler
+            rpc_stats = self.budget.snapshot().values()
+            rpc_calls = sum(stats['calls'] for stats in rpc_stats)
+            rpc_throttled = sum(stats['throttled'] for stats in rpc_stats)
+            rpc_flood_waits = sum(stats['flood_waits'] for stats in rpc_stats)
+            
+            if self.last_scan_at:
+                last_scan = (
+                    f"{datetime.fromtimestamp(self.last_scan_at).strftime('%H:%M:%S')} "
+                    f"({time.time() - self.last_scan_at:.0f}s ago)"
+                )
+            else:
+                last_scan = "never"
+            if self.supervisor.restarts:
+                last_scan += f", {self.supervisor.restarts} watchdog restarts ({self.supervisor.last_failure})"
+            await self.respond(
+                event,
                 f"📊 **Monitor Status:** {status}\n"
+                f"🕐 **Last Successful Scan:** {last_scan}\n"
                 f"📱 **Active Sessions:** {sessions_count}\n"
                 f"✅ **Trusted Devices:** {trusted_count}\n"
-                f"⏱️ **Scan Interval:** {self.scan_interval}s"
+                f"📜 **Trust Rules:** {self.trust_policy.rule_count}\n"
+                f"🔍 **Detection:** {detection}\n"
+                f"📨 **Login Signals:** {self.push_signals}\n"
+                f"⏱️ **Effective Interval:** {scheduler.effective_interval:.2f}s ({scheduler.mode})\n"
+                f"💾 **RPCs Saved:** {scheduler.rpcs_saved}\n"
+                f"📬 **Notification Queue:** {self.notifier.depth} pending, "
+                f"{self.notifier.dropped} dropped\n"
+                f"🚦 **RPC Budget:** {rpc_calls} calls, {rpc_throttled} throttled, "
+                f"{rpc_flood_waits} FloodWaits\n"
+                f"🔌 **Connection:** {self.format_connection()}"
             )
         
-        @self.client.on(events.NewMessage(pattern='/sessions', from_users='me'))
+        @self.client.on(events.NewMessage(pattern=r'/sessions(?:\s+(.*))?$', from_users='me'))
         async def sessions_handler(event):
-            sessions = await self.get_current_sessions()
-            if not sessions:
-                await event.respond("No active sessions found.")
+            # /sessions [untrusted] [country=X] [app=Y] [refresh] [#page]
+            args = (event.pattern_match.group(1) or '').split()
+            page = 1
+            filters: Dict[str, str] = {}
+            untrusted_only = force = False
+            for arg in args:
+                if re.fullmatch(r'#\d+', arg):
+                    page = max(1, int(arg[1:]))
+                elif arg == 'untrusted':
+                    untrusted_only = True
+                elif arg == 'refresh':
+                    force = True
+                elif '=' in arg:
+                    key, _, value = arg.partition('=')
+                    filters[key.lower()] = value.lower()
+            
+            try:
+                sessions, age = await self.cached_sessions(force)
+            except Exception as e:
+                self.log.error(f"Error getting sessions: {e}")
+                await self.respond(event, "❌ Could not fetch sessions, try again shortly.")
                 return
             
-            message = "📱 **Active Sessions:**\n\n"
-            for i, (session_hash, auth) in enumerate(sessions.items(), 1):
-                trusted = "✅" if session_hash in self.trusted_devices else "❌"
-                message += f"{i}. {trusted} **Session {session_hash}**\n"
-                message += f"   📱 {auth.device_model} - {auth.app_name}\n"
-                message += f"   🌍 {auth.country} - {auth.ip}\n\n"
+            matching = []
+            for auth in sessions.values():
+                trusted = auth.current or self.evaluate_trust(auth).action == 'trust'
+                if untrusted_only and trusted:
+                    continue
+                if 'country' in filters and filters['country'] not in (auth.country or '').lower():
+                    continue
+                if 'app' in filters and filters['app'] not in (auth.app_name or '').lower():
+                    continue
+                matching.append((auth, trusted))
+            if not matching:
+                await self.respond(event, "No matching sessions found." if sessions else "No active sessions found.")
+                return
             
-            await event.respond(message)
+            page_size = int(self.settings['sessions_page_size'])
+            pages = (len(matching) + page_size - 1) // page_size
+            page = min(page, pages)
+            message = self.format_sessions(matching, page, pages, page_size, age, args)
+            # A page of very long device names could still exceed Telegram's limit
+            for chunk in split_message(message):
+                await self.respond(event, chunk)
         
         @self.client.on(events.NewMessage(pattern=r'/trust (\d+)', from_users='me'))
         async def trust_handler(event):
             session_hash = int(event.pattern_match.group(1))
-            self.trusted_devices.add(session_hash)
-            self.save_trusted_devices()
-            await event.respond(f"✅ Device {session_hash} is now trusted.")
+            await self.trust_devices([session_hash])
+            await self.respond(event, f"✅ Device {session_hash} is now trusted.")
         
         @self.client.on(events.NewMessage(pattern=r'/untrust (\d+)', from_users='me'))
         async def untrust_handler(event):
             session_hash = int(event.pattern_match.group(1))
-            self.trusted_devices.discard(session_hash)
-            self.save_trusted_devices()
-            await event.respond(f"❌ Device {session_hash} is no longer trusted.")
+            await self.untrust_device(session_hash)
+            await self.respond(event, f"❌ Device {session_hash} is no longer trusted.")
+        
+        @self.client.on(events.NewMessage(pattern=r'/importtrust\s+([\d\s,]+)', from_users='me'))
+        async def import_trust_handler(event):
+            hashes = [int(h) for h in re.findall(r'\d+', event.pattern_match.group(1))]
+            added = await self.trust_devices(hashes)
+            await self.respond(event, f"✅ Imported {len(hashes)} hashes ({added} new).")
+        
+        @self.client.on(events.NewMessage(pattern='/exporttrust', from_users='me'))
+        async def export_trust_handler(event):
+            hashes = await self.trust_store.export_hashes(self.name)
+            if not hashes:
+                await self.respond(event, "No trusted devices configured.")
+                return
+            for chunk in split_message("\n".join(str(h) for h in hashes), MAX_MESSAGE_LENGTH - 20):
+                await self.respond(event, f"/importtrust\n{chunk}")
+        
+        @self.client.on(events.NewMessage(pattern='/reloadrules', from_users='me'))
+        async def reload_rules_handler(event):
+            if await self.trust_policy.refresh():
+                await self.respond(event, f"🔄 Reloaded {self.trust_policy.rule_count} trust rules.")
+            else:
+                await self.respond(event, "❌ Could not reload trust rules, keeping the previous ones. Check bot.log.")
         
         @self.client.on(events.NewMessage(pattern='/trusted', from_users='me'))
         async def trusted_handler(event):
             if not self.trusted_devices:
-                await event.respond("No trusted devices configured.")
+                await self.respond(event, "No trusted devices configured.")
                 return
             
             message = "✅ **Trusted Devices:**\n\n"
             for device_hash in self.trusted_devices:
                 message += f"• {device_hash}\n"
             
-            await event.respond(message)
+            await self.respond(event, message)
+        
+        @self.client.on(events.NewMessage(pattern=r'/history(?:\s+([^\s#]+))?(?:\s+#(\d+))?\s*$', from_users='me'))
+        async def history_handler(event):
+            target, page = event.pattern_match.group(1), int(event.pattern_match.group(2) or 1)
+            session_hash, ip = None, None
+            if target and re.fullmatch(r'-?\d+', target):
+                session_hash = int(target)
+            elif target:
+                ip = target
+            
+            page_size = int(self.settings['history_page_size'])
+            history = await self.audit.query(self.name, session_hash, ip, page, page_size)
+            if not history:
+                await self.respond(event, "No matching history." if page == 1 else "No more history.")
+                return
+            
+            title = f"📜 **History{' for ' + target if target else ''}** (page {page}):\n\n"
+            footer = ""
+            if len(history) == page_size:
+                footer = f"\n\nNext page: /history {target + ' ' if target else ''}#{page + 1}"
+            await self.respond(event, title + self.format_history(history) + footer)
+        
+        @self.client.on(events.NewMessage(pattern='/perf', from_users='me'))
+        async def perf_handler(event):
+            await self.respond(event, self.format_perf())
         
         @self.client.on(events.NewMessage(pattern='/stop', from_users='me'))
         async def stop_handler(event):
-            self.monitoring = False
-            await event.respond("🛑 Session monitoring stopped.")
+            await self.stop_monitoring()
+            await self.respond(event, "🛑 Session monitoring stopped.")
         
         @self.client.on(events.NewMessage(pattern='/resume', from_users='me'))
         async def resume_handler(event):
-            if not self.monitoring:
-                self.monitoring = True
-                await event.respond("▶️ Session monitoring resumed.")
-                # Restart monitoring in background
-                asyncio.create_task(self.monitor_sessions())
+            if self.start_monitoring():
+                await self.respond(event, "▶️ Session monitoring resumed.")
             else:
-                await event.respond("ℹ️ Monitoring is already active.")
+                await self.respond(event, "ℹ️ Monitoring is already active.")
+
+def load_accounts(config: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Normalise config.json into a list of account definitions.
+    
+    Accepts the original single-account format as well as an ``accounts``
+    list. Each account gets its own session, trust and snapshot files.
+    """
+    shared_settings = config.get('settings', {})
+    if 'accounts' in config:
+        entries = config['accounts']
+        multi = True
+    else:
+        entries = [dict(config, name='default')]
+        multi = False
+    
+    if not entries:
+        raise ValueError("No accounts configured")
+    
+    accounts = []
+    names: Set[str] = set()
+    required_keys = ['api_id', 'api_hash', 'phone']
+    for index, entry in enumerate(entries):
+        name = str(entry.get('name') or f"account{index + 1}")
+        for key in required_keys:
+            if key not in entry:
+                raise ValueError(f"Missing required configuration for {name}: {key}")
+        if name in names:
+            raise ValueError(f"Duplicate account name: {name}")
+        names.add(name)
+        
+        settings = {**shared_settings, **entry.get('settings', {})}
+        session_name = entry.get('session', f"session_monitor_{name}" if multi else 'session_monitor')
+        if multi:
+            settings.setdefault('trusted_devices_file', f"trusted_devices_{name}.json")
+            settings.setdefault('snapshot_file', f"known_sessions_{name}.json")
+        
+        accounts.append({
+            'name': name,
+            'api_id': entry['api_id'],
+            'api_hash': entry['api_hash'],
+            'phone': entry['phone'],
+            'session': session_name,
+            'settings': settings,
+        })
+    return accounts
+
+class MultiAccountRunner:
+    """Hosts the monitors of several accounts on one event loop.
+    
+    Polling is spread across accounts by a shared PollCoordinator, and each
+    account runs in its own task so one failing account never affects the rest.
+    """
+    
+    def __init__(self, accounts: List[Dict[str, Any]], settings: Optional[Dict[str, Any]] = None):
+        settings = {**DEFAULT_SETTINGS, **(settings or {})}
+        self.coordinator = PollCoordinator(float(settings['poll_spacing']))
+        self.retry_max = float(settings['account_retry_max'])
+        
+        self.bots: Dict[str, SessionMonitorBot] = {}
+        # Definitions the bots were built from, to tell what a reloaded config changed
+        self.accounts: Dict[str, Dict[str, Any]] = {}
+        for account in accounts:
+            self.bots[account['name']] = self.create_bot(account)
+            self.accounts[account['name']] = account
+        
+        self.tasks: Dict[str, asyncio.Task] = {}
+        self.failures: Dict[str, int] = {name: 0 for name in self.bots}
+        self.last_error: Dict[str, str] = {}
+    
+    def create_bot(self, account: Dict[str, Any]) -> SessionMonitorBot:
+        """Build the monitor for one account definition."""
+        return SessionMonitorBot(
+            api_id=account['api_id'],
+            api_hash=account['api_hash'],
+            phone=account['phone'],
+            settings=account['settings'],
+            name=account['name'],
+            session_name=account['session'],
+            coordinator=self.coordinator,
+        )
+    
+    async def run(self):
+        """Log in every account, then monitor them all until they finish."""
+        # Logins may prompt for a code, so they happen one at a time
+        for bot in self.bots.values():
+            try:
+                await self.connect_account(bot)
+            except Exception as e:
+                self.record_failure(bot, e)
+        
+        for index, (name, bot) in enumerate(self.bots.items()):
+            bot.initial_stagger = self.coordinator.stagger(
+                index, len(self.bots), bot.scheduler.effective_interval
+            )
+            self.tasks[name] = asyncio.create_task(self.run_account(bot))
+        
+        # Accounts can be added and removed while running, so wait until every task is done
+        while any(not task.done() for task in self.tasks.values()):
+            await asyncio.gather(*self.tasks.values(), return_exceptions=True)
+    
+    def build_bots(self, accounts: List[Dict[str, Any]]) -> List[SessionMonitorBot]:
+        """Build the monitors for ``accounts`` without touching running ones; all or none."""
+        bots = []
+        try:
+            for account in accounts:
+                bots.append(self.create_bot(account))
+        except Exception:
+            # A monitor registers its metrics under the account name as it is built
+            for account in accounts:
+                running = self.bots.get(account['name'])
+                if running is not None:
+                    register_metrics(running.metrics)
+                else:
+                    close_metrics(account['name'])
+            raise
+        return bots
+    
+    async def add_account(self, account: Dict[str, Any], bot: Optional[SessionMonitorBot] = None):
+        """Start monitoring another account in the running process, with ``bot`` if already built."""
+        name = account['name']
+        if name in self.bots:
+            raise ValueError(f"Account {name} is already monitored")
+        if bot is None:
+            bot = self.create_bot(account)
+        self.bots[name] = bot
+        self.accounts[name] = account
+        self.failures[name] = 0
+        self.tasks[name] = asyncio.create_task(self.run_account(bot))
+        bot.log.info("Account added")
+    
+    async def remove_account(self, name: str):
+        """Stop monitoring an account and disconnect it."""
+        bot = self.bots.pop(name)
+        del self.accounts[name]
+        del self.failures[name]
+        self.last_error.pop(name, None)
+        task = self.tasks.pop(name, None)
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        await bot.stop_monitoring()
+        await bot.notifier.stop()
+        await bot.connection.disconnect()
+        close_metrics(name, bot.metrics)
+        bot.log.info("Account removed")
+    
+    async def replace_account(self, account: Dict[str, Any], bot: SessionMonitorBot):
+        """Swap in ``bot`` for a monitored account whose login changed."""
+        old = self.bots[account['name']]
+        await self.remove_account(account['name'])
+        # Its known sessions belong to the old login, so the new one takes a fresh baseline
+        old.discard_snapshot()
+        await self.add_account(account, bot)
+    
+    async def update_account(self, account: Dict[str, Any]):
+        """Apply a changed definition of a monitored account."""
+        name = account['name']
+        if not same_login(self.accounts[name], account):
+            # Built first, so a bad definition leaves the running account alone
+            bot, = self.build_bots([account])
+            await self.replace_account(account, bot)
+            return
+        self.bots[name].prepare_settings(account['settings'])()
+        self.accounts[name] = account
+    
+    async def apply_accounts(self, accounts: List[Dict[str, Any]]) -> AccountChanges:
+        """Bring the running accounts in line with a reloaded config.
+        
+        Every settings change is checked and every new monitor built before
+        any account is touched, so a bad value anywhere changes nothing.
+        """
+        changes = diff_accounts(self.accounts, accounts, HOT_SETTINGS)
+        updates = [(account, self.bots[account['name']].prepare_settings(account['settings']))
+                   for account in changes.updated]
+        started = changes.replaced + changes.added
+        # Prompting for a code would block every other account's monitor
+        unattended = [{**account, 'settings': {**account['settings'], 'interactive_login': False}}
+                      for account in started]
+        bots = self.build_bots(unattended)
+        
+        for name in changes.removed:
+            await self.remove_account(name)
+        for account, definition, bot in zip(unattended, started, bots):
+            if account['name'] in self.bots:
+                await self.replace_account(account, bot)
+            else:
+                await self.add_account(account, bot)
+            self.accounts[account['name']] = definition
+        for account, apply in updates:
+            apply()
+            self.accounts[account['name']] = account
+        return changes
+    
+    async def connect_account(self, bot: SessionMonitorBot):
+        """Connect one account and add the runner's own commands to it."""
+        first_connect = not bot.handlers_registered
+        try:
+            await bot.connect()
+        except Exception:
+            # Connected but not logged in or set up: the retry must connect from scratch
+            await bot.connection.disconnect()
+            raise
+        if first_connect:
+            self.setup_handlers(bot)
+    
+    async def run_account(self, bot: SessionMonitorBot):
+        """Monitor one account, restarting it with backoff if it fails."""
+        while True:
+            try:
+                if not bot.client.is_connected():
+                    await self.connect_account(bot)
+                bot.start_monitoring()
+                # The supervisor keeps the monitor alive, including across /stop and /resume;
+                # the connection manager keeps the client connected
+                try:
+                    await bot.connection.run()
+                finally:
+                    await bot.stop_monitoring()
+                return
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.record_failure(bot, e)
+                delay = min(self.retry_max, 2 ** min(self.failures[bot.name], 16))
+                bot.log.info(f"Restarting account in {delay}s")
+                await asyncio.sleep(delay)
+    
+    def record_failure(self, bot: SessionMonitorBot, error: Exception):
+        """Remember an account failure for status reporting."""
+        self.failures[bot.name] += 1
+        self.last_error[bot.name] = str(error)
+        bot.log.error(f"Account failed: {error}")
+    
+    def status(self) -> List[Dict[str, Any]]:
+        """Per-account status, including failure counts."""
+        statuses = []
+        for name, bot in self.bots.items():
+            status = bot.status()
+            status['failures'] = self.failures[name]
+            status['last_error'] = self.last_error.get(name)
+            statuses.append(status)
+        return statuses
+    
+    def setup_handlers(self, bot: SessionMonitorBot):
+        """Add the /accounts command, which reports on every account in the process."""
+        
+        @bot.client.on(events.NewMessage(pattern='/accounts', from_users='me'))
+        async def accounts_handler(event):
+            message = "👥 **Accounts:**\n\n"
+            for status in self.status():
+                state = "🟢" if status['monitoring'] else "🔴"
+                message += (
+                    f"{state} **{status['account']}** - {status['sessions']} sessions, "
+                    f"{status['interval']}s ({status['mode']}), {status['failures']} failures\n"
+                )
+                if status['last_error']:
+                    message += f"   ⚠️ {status['last_error']}\n"
+            await bot.respond(event, message)
 
 async def main():
+    # Console only until the settings say where the log file goes
+    setup_logging({**DEFAULT_SETTINGS, 'log_file': ''})
+    
     # Load configuration
     try:
         with open('config.json', 'r') as f:
@@ -286,29 +1484,89 @@ async def main():
         logger.error("Invalid JSON in config.json")
         return
     
+    settings = {**DEFAULT_SETTINGS, **config.get('settings', {})}
+    setup_logging(settings)
+    
     # Validate configuration
-    required_keys = ['api_id', 'api_hash', 'phone']
-    for key in required_keys:
-        if key not in config:
-            logger.error(f"Missing required configuration: {key}")
-            return
+    try:
+        accounts = load_accounts(config)
+    except ValueError as e:
+        logger.error(str(e))
+        return
     
-    # Create and start bot
-    bot = SessionMonitorBot(
-        api_id=config['api_id'],
-        api_hash=config['api_hash'],
-        phone=config['phone']
-    )
+    reload_interval = float(settings['reload_poll_interval'])
+    
+    if int(settings['workers']) > 1:
+        # Imported lazily: only needed when sharding across processes
+        from sharding import ShardCoordinator
+        from control import ShardControlServer
+        coordinator = ShardCoordinator(accounts, config.get('settings', {}), workers=int(settings['workers']))
+        # Metrics and status are merged here from the workers' reports
+        metrics_server = None
+        if int(settings['metrics_port']):
+            metrics_server = await start_metrics_server(
+                settings['metrics_host'], int(settings['metrics_port']), coordinator.render_metrics,
+            )
+        control_server = None
+        if settings['control_socket']:
+            control_server = ShardControlServer(coordinator, settings['control_socket'])
+            await control_server.start()
+        # Workers watch the trust files themselves; account changes are routed from here
+        reloader = None
+        if settings['hot_reload']:
+            reloader = asyncio.create_task(ConfigReloader(
+                'config.json', lambda config: coordinator.apply_accounts(load_accounts(config)), reload_interval,
+            ).run())
+        try:
+            await coordinator.run()
+        except KeyboardInterrupt:
+            logger.info("Bot stopped by user")
+        finally:
+            if metrics_server:
+                metrics_server.close()
+            if control_server:
+                control_server.close()
+            if reloader:
+                reloader.cancel()
+        return
+    
+    # Create and start the monitors
+    runner = MultiAccountRunner(accounts, config.get('settings'))
+    
+    metrics_server = None
+    if int(settings['metrics_port']):
+        metrics_server = await start_metrics_server(settings['metrics_host'], int(settings['metrics_port']))
+    control_server = None
+    if settings['control_socket']:
+        control_server = await start_control_server(runner, settings['control_socket'])
+    reloaders: List[asyncio.Task] = []
+    if settings['hot_reload']:
+        reloaders = [
+            asyncio.create_task(ConfigReloader(
+                'config.json', lambda config: runner.apply_accounts(load_accounts(config)), reload_interval,
+            ).run()),
+            asyncio.create_task(TrustReloader(runner, reload_interval).run()),
+        ]
     
     try:
-        await bot.start()
+        await runner.run()
     except KeyboardInterrupt:
         logger.info("Bot stopped by user")
     except Exception as e:
         logger.error(f"Bot error: {e}")
     finally:
-        if bot.client.is_connected():
-            bot.client.disconnect()
+        if metrics_server:
+            metrics_server.close()
+        if control_server:
+            control_server.close()
+        for task in reloaders:
+            task.cancel()
+        for bot in runner.bots.values():
+            await bot.connection.disconnect()
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    try:
+        asyncio.run(main())
+    finally:
+        close_recorders()
+        shutdown_logging()
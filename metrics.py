@@ -0,0 +1,259 @@
+"""
+SessionKiller - Performance Metrics
+Latency histograms and counters per account, served in Prometheus text format.
+"""
+
+import asyncio
+import bisect
+import functools
+import logging
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds in seconds; a final +Inf bucket is implied
+DEFAULT_BUCKETS: Tuple[float, ...] = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+)
+
+HISTOGRAMS: Dict[str, str] = {
+    'poll_rtt_seconds': 'Round-trip time of GetAuthorizations requests',
+    'diff_seconds': 'Time spent diffing a scan against the known sessions',
+    'logout_seconds': 'Duration of a single logout request',
+    'detection_to_kill_seconds': 'Time from first sighting of an untrusted session to logout completion',
+    'notification_latency_seconds': 'Time from queueing a notification to its delivery',
+    'reconnect_seconds': 'Time from detecting a broken connection to having it back',
+}
+
+COUNTERS: Dict[str, str] = {
+    'scans_total': 'Completed session scans',
+    'scan_errors_total': 'Failed session scans',
+    'sessions_killed_total': 'Untrusted sessions logged out',
+    'logout_failures_total': 'Logout requests that failed',
+    'notifications_sent_total': 'Notifications delivered',
+    'reconnects_total': 'Connections re-established after a drop',
+}
+
+# Per-lane RPC counters, read from the account's RpcBudget at scrape time
+RPC_COUNTERS: Dict[str, Tuple[str, str]] = {
+    'rpc_total': ('calls', 'Outbound Telegram requests'),
+    'rpc_errors_total': ('errors', 'Outbound requests that failed'),
+    'rpc_flood_waits_total': ('flood_waits', 'FloodWaits received'),
+}
+
+PREFIX = 'sessionkiller_'
+
+
+class Histogram:
+    """Fixed-bucket histogram; cheap enough to observe on every request."""
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        """Estimate a quantile by interpolating inside its bucket."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if seen + count >= rank and count:
+                lower = self.buckets[index - 1] if index > 0 else 0.0
+                upper = self.buckets[index] if index < len(self.buckets) else self.max
+                estimate = lower + (upper - lower) * (rank - seen) / count
+                return min(estimate, self.max)
+            seen += count
+        return self.max
+
+
+class AccountMetrics:
+    """Histograms and counters of one account."""
+
+    def __init__(self, account: str, rpc_stats: Optional[Callable[[], Dict[str, Dict[str, Any]]]] = None):
+        self.account = account
+        self.rpc_stats = rpc_stats
+        self.histograms = {name: Histogram() for name in HISTOGRAMS}
+        self.counters = {name: 0 for name in COUNTERS}
+
+    def observe(self, name: str, seconds: float):
+        self.histograms[name].observe(seconds)
+
+    def inc(self, name: str, amount: int = 1):
+        self.counters[name] += amount
+
+    @contextmanager
+    def timer(self, name: str) -> Iterator[None]:
+        """Observe the duration of the block, whether or not it raises."""
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(name, time.monotonic() - started)
+
+    def rpc_totals(self) -> Dict[str, int]:
+        """RPC counters summed over every lane."""
+        lanes = self.rpc_stats() if self.rpc_stats else {}
+        return {
+            name: sum(stats[field] for stats in lanes.values())
+            for name, (field, _) in RPC_COUNTERS.items()
+        }
+
+    def export(self) -> Dict[str, Any]:
+        """Plain-data copy that can be sent to another process (see ``from_export``)."""
+        return {
+            'account': self.account,
+            'histograms': {
+                name: {
+                    'buckets': list(histogram.buckets),
+                    'counts': list(histogram.counts),
+                    'count': histogram.count,
+                    'sum': histogram.sum,
+                    'max': histogram.max,
+                }
+                for name, histogram in self.histograms.items()
+            },
+            'counters': dict(self.counters),
+            'rpc': self.rpc_stats() if self.rpc_stats else {},
+        }
+
+    @classmethod
+    def from_export(cls, data: Dict[str, Any]) -> 'AccountMetrics':
+        """Rebuild the metrics another process exported, e.g. a shard worker's."""
+        rpc = data.get('rpc', {})
+        metrics = cls(data['account'], lambda: rpc)
+        for name, values in data['histograms'].items():
+            if name not in metrics.histograms:
+                continue
+            histogram = Histogram(tuple(values['buckets']))
+            histogram.counts = list(values['counts'])
+            histogram.count = values['count']
+            histogram.sum = values['sum']
+            histogram.max = values['max']
+            metrics.histograms[name] = histogram
+        for name, value in data['counters'].items():
+            if name in metrics.counters:
+                metrics.counters[name] = value
+        return metrics
+
+
+# One set of metrics per account per process
+_accounts: Dict[str, AccountMetrics] = {}
+
+
+def open_metrics(account: str, rpc_stats: Optional[Callable[[], Dict[str, Dict[str, Any]]]] = None) -> AccountMetrics:
+    """Register (or replace) the metrics of an account in this process."""
+    _accounts[account] = AccountMetrics(account, rpc_stats)
+    return _accounts[account]
+
+
+def close_metrics(account: str, metrics: Optional[AccountMetrics] = None):
+    """Stop exporting the metrics of an account that is no longer monitored.
+
+    Given ``metrics``, only if those are still the registered ones, so closing a
+    replaced monitor leaves its replacement's metrics in place.
+    """
+    if metrics is None or _accounts.get(account) is metrics:
+        _accounts.pop(account, None)
+
+
+def register_metrics(metrics: AccountMetrics):
+    """Export existing metrics again, e.g. after a replacement monitor was discarded."""
+    _accounts[metrics.account] = metrics
+
+
+def export_metrics() -> List[Dict[str, Any]]:
+    """Every account's metrics in this process, as plain data."""
+    return [metrics.export() for metrics in _accounts.values()]
+
+
+def _label(account: str, **extra: str) -> str:
+    labels = {'account': account, **extra}
+    pairs = []
+    for key, value in labels.items():
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{key}="{value}"')
+    return '{' + ','.join(pairs) + '}'
+
+
+def render(accounts: Optional[Iterable[AccountMetrics]] = None) -> str:
+    """Metrics in the Prometheus text exposition format; every account in this process by default."""
+    lines: List[str] = []
+    accounts = list(_accounts.values() if accounts is None else accounts)
+
+    for name, help_text in HISTOGRAMS.items():
+        metric = PREFIX + name
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} histogram")
+        for metrics in accounts:
+            histogram = metrics.histograms[name]
+            cumulative = 0
+            for bound, count in zip(histogram.buckets + (float('inf'),), histogram.counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f"{metric}_bucket{_label(metrics.account, le=le)} {cumulative}")
+            lines.append(f"{metric}_sum{_label(metrics.account)} {histogram.sum:.6f}")
+            lines.append(f"{metric}_count{_label(metrics.account)} {histogram.count}")
+
+    for name, help_text in COUNTERS.items():
+        metric = PREFIX + name
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} counter")
+        for metrics in accounts:
+            lines.append(f"{metric}{_label(metrics.account)} {metrics.counters[name]}")
+
+    for name, (field, help_text) in RPC_COUNTERS.items():
+        metric = PREFIX + name
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} counter")
+        for metrics in accounts:
+            lanes = metrics.rpc_stats() if metrics.rpc_stats else {}
+            for lane, stats in lanes.items():
+                lines.append(f"{metric}{_label(metrics.account, lane=lane)} {stats[field]}")
+
+    return "\n".join(lines) + "\n"
+
+
+async def handle_request(reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                         source: Callable[[], str] = render):
+    """Answer a single HTTP request: GET /metrics, anything else is a 404."""
+    try:
+        request_line = await asyncio.wait_for(reader.readline(), 5)
+        # Drain the headers; nothing in them matters here
+        while (await asyncio.wait_for(reader.readline(), 5)) not in (b'\r\n', b'\n', b''):
+            pass
+        parts = request_line.decode('latin-1').split()
+        if len(parts) >= 2 and parts[0] == 'GET' and parts[1].split('?')[0] == '/metrics':
+            status, body = '200 OK', source().encode()
+        else:
+            status, body = '404 Not Found', b'Not found\n'
+        writer.write(
+            f"HTTP/1.1 {status}\r\n"
+            f"Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: close\r\n\r\n".encode() + body
+        )
+        await writer.drain()
+    except (asyncio.TimeoutError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+async def start_metrics_server(host: str, port: int,
+                               source: Callable[[], str] = render) -> asyncio.AbstractServer:
+    """Serve /metrics over plain HTTP on the running event loop, with the text ``source`` renders."""
+    server = await asyncio.start_server(functools.partial(handle_request, source=source), host, port)
+    logger.info(f"Serving metrics on http://{host}:{port}/metrics")
+    return server
@@ -0,0 +1,140 @@
+"""
+SessionKiller - Notification Queue
+Coalesces notifications into digests and sends them in the background.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+from telethon.errors import FloodWaitError
+
+logger = logging.getLogger(__name__)
+
+# Telegram rejects text messages longer than this
+MAX_MESSAGE_LENGTH = 4096
+
+
+def split_message(text: str, limit: int = MAX_MESSAGE_LENGTH) -> List[str]:
+    """Split text into chunks no longer than ``limit``, preferring line breaks."""
+    chunks = []
+    while len(text) > limit:
+        cut = text.rfind('\n', 0, limit)
+        if cut <= 0:
+            cut = limit
+        chunks.append(text[:cut])
+        text = text[cut:].lstrip('\n')
+    if text:
+        chunks.append(text)
+    return chunks
+
+
+class NotificationQueue:
+    """Bounded queue drained by a background sender.
+
+    Messages submitted within ``coalesce_window`` seconds of each other are
+    merged into one digest. FloodWaits are honoured and other failures are
+    retried with exponential backoff, all without blocking the submitter.
+    """
+
+    def __init__(self, send: Callable[[str], Awaitable], coalesce_window: float = 1.0,
+                 max_queue: int = 500, max_retries: int = 5, backoff_base: float = 1.0,
+                 on_delivered: Optional[Callable[[float], None]] = None):
+        self.send = send
+        # Called with each message's submit-to-delivery latency in seconds
+        self.on_delivered = on_delivered
+        self.coalesce_window = coalesce_window
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self.task: Optional[asyncio.Task] = None
+
+        # Counters
+        self.submitted = 0
+        self.sent = 0
+        self.dropped = 0
+        self.digests = 0
+        self.flood_waits = 0
+        self.failures = 0
+
+    @property
+    def depth(self) -> int:
+        """Messages waiting to be sent."""
+        return self.queue.qsize()
+
+    def start(self):
+        """Start the background sender."""
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        """Stop the background sender, dropping anything still queued."""
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    def submit(self, message: str) -> bool:
+        """Queue a message; returns False if it was dropped because the queue is full."""
+        try:
+            self.queue.put_nowait((time.monotonic(), message))
+        except asyncio.QueueFull:
+            self.dropped += 1
+            logger.warning(f"Notification queue full, dropped message ({self.dropped} dropped so far)")
+            return False
+        self.submitted += 1
+        return True
+
+    async def run(self):
+        """Background loop: collect a batch, merge it and send it."""
+        while True:
+            batch: List[Tuple[float, str]] = [await self.queue.get()]
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + self.coalesce_window
+            while True:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            delivered = True
+            for chunk in split_message(self.build_digest([message for _, message in batch])):
+                delivered = await self.deliver(chunk) and delivered
+            if delivered and self.on_delivered:
+                now = time.monotonic()
+                for submitted_at, _ in batch:
+                    self.on_delivered(now - submitted_at)
+
+    def build_digest(self, batch: List[str]) -> str:
+        """Merge a batch of messages into one text."""
+        if len(batch) == 1:
+            return batch[0]
+        self.digests += 1
+        separator = "\n\n" + "─" * 16 + "\n\n"
+        return f"📬 **{len(batch)} events:**\n\n" + separator.join(batch)
+
+    async def deliver(self, text: str) -> bool:
+        """Send one chunk, retrying on FloodWait and transient errors."""
+        for attempt in range(self.max_retries + 1):
+            try:
+                await self.send(text)
+                self.sent += 1
+                return True
+            except FloodWaitError as e:
+                self.flood_waits += 1
+                logger.warning(f"FloodWait while sending notification, waiting {e.seconds}s")
+                await asyncio.sleep(e.seconds)
+            except Exception as e:
+                logger.error(f"Error sending notification (attempt {attempt + 1}): {e}")
+                await asyncio.sleep(self.backoff_base * 2 ** attempt)
+
+        self.failures += 1
+        logger.error("Giving up on notification after repeated failures")
+        return False
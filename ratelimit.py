@@ -0,0 +1,183 @@
+"""
+SessionKiller - RPC Budget
+Token-bucket rate limiting with priority lanes for every outbound Telegram request.
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from telethon.errors import FloodWaitError
+
+logger = logging.getLogger(__name__)
+
+# Lower number = served first when requests compete for the shared budget
+LANE_PRIORITIES: Dict[str, int] = {
+    'logout': 0,
+    'probe': 1,
+    'command': 2,
+    'poll': 3,
+    'notify': 4,
+}
+
+# Requests per second and burst size for each lane
+DEFAULT_LANE_LIMITS: Dict[str, Tuple[float, float]] = {
+    'logout': (10.0, 20.0),
+    'probe': (1.0, 2.0),
+    'command': (2.0, 5.0),
+    'poll': (2.0, 4.0),
+    'notify': (1.0, 3.0),
+}
+
+
+class TokenBucket:
+    """Classic token bucket refilled continuously at ``rate`` tokens per second."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now: float):
+        """Add the tokens accrued since the last refill."""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def time_until_available(self, now: float) -> float:
+        """Seconds until one token is available."""
+        self.refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate if self.rate > 0 else float('inf')
+
+    def take(self):
+        """Consume one token (caller has checked availability)."""
+        self.tokens -= 1
+
+
+class LaneStats:
+    """Counters for one lane."""
+
+    def __init__(self):
+        self.calls = 0
+        self.throttled = 0
+        self.wait_time = 0.0
+        self.flood_waits = 0
+        self.errors = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            'calls': self.calls,
+            'throttled': self.throttled,
+            'wait_time': round(self.wait_time, 3),
+            'flood_waits': self.flood_waits,
+            'errors': self.errors,
+        }
+
+
+class RpcBudget:
+    """Shared rate limiter for all outbound requests of one account.
+
+    Every request belongs to a lane with its own token bucket, and all lanes
+    draw from a global bucket. When lanes compete for the global budget the
+    higher-priority lane wins, so logouts always go ahead of polling and
+    notifications. A FloodWait reported for a lane blocks only that lane.
+    """
+
+    def __init__(self, lane_limits: Optional[Dict[str, Any]] = None,
+                 global_rate: float = 20.0, global_burst: float = 30.0):
+        limits = dict(DEFAULT_LANE_LIMITS)
+        limits.update({lane: tuple(limit) for lane, limit in (lane_limits or {}).items()})
+        self.lanes = {lane: TokenBucket(rate, burst) for lane, (rate, burst) in limits.items()}
+        self.global_bucket = TokenBucket(global_rate, global_burst)
+        self.blocked_until: Dict[str, float] = {lane: 0.0 for lane in self.lanes}
+        self.stats: Dict[str, LaneStats] = {lane: LaneStats() for lane in self.lanes}
+
+        self.waiters: List[Tuple[int, int, str, asyncio.Future]] = []
+        self.sequence = itertools.count()
+        self.timer: Optional[asyncio.TimerHandle] = None
+
+    async def acquire(self, lane: str):
+        """Wait until ``lane`` may send one request."""
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self.waiters, (LANE_PRIORITIES.get(lane, len(LANE_PRIORITIES)),
+                                      next(self.sequence), lane, future))
+        self.dispatch()
+        if future.done():
+            return
+
+        started = time.monotonic()
+        self.stats[lane].throttled += 1
+        try:
+            await future
+        finally:
+            self.stats[lane].wait_time += time.monotonic() - started
+
+    def dispatch(self):
+        """Grant tokens to waiters in priority order and schedule the next wake-up."""
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+
+        now = time.monotonic()
+        next_wake = float('inf')
+        remaining = []
+        global_reserved = False
+
+        for waiter in sorted(self.waiters):
+            _, _, lane, future = waiter
+            if future.done():
+                continue
+            lane_wait = max(self.blocked_until[lane] - now, self.lanes[lane].time_until_available(now))
+            if lane_wait > 0:
+                next_wake = min(next_wake, lane_wait)
+                remaining.append(waiter)
+                continue
+
+            # This lane is ready; lower lanes must not jump ahead for the global token
+            global_wait = self.global_bucket.time_until_available(now)
+            if global_reserved or global_wait > 0:
+                global_reserved = True
+                next_wake = min(next_wake, global_wait)
+                remaining.append(waiter)
+                continue
+
+            self.lanes[lane].take()
+            self.global_bucket.take()
+            future.set_result(None)
+
+        heapq.heapify(remaining)
+        self.waiters = remaining
+        if remaining and next_wake != float('inf'):
+            self.timer = asyncio.get_running_loop().call_later(max(next_wake, 0.001), self.dispatch)
+
+    def blocked_for(self, lane: str) -> float:
+        """Seconds a FloodWait still blocks ``lane``; 0 when it is not blocked."""
+        return max(0.0, self.blocked_until.get(lane, 0.0) - time.monotonic())
+
+    def report_flood_wait(self, lane: str, seconds: float):
+        """Block a lane for the duration Telegram asked for."""
+        self.stats[lane].flood_waits += 1
+        self.blocked_until[lane] = max(self.blocked_until[lane], time.monotonic() + seconds)
+        logger.warning(f"FloodWait of {seconds}s on the {lane} lane")
+
+    async def call(self, lane: str, func: Callable[..., Awaitable], *args, **kwargs) -> Any:
+        """Run one request through the budget, feeding FloodWaits back into it."""
+        await self.acquire(lane)
+        self.stats[lane].calls += 1
+        try:
+            return await func(*args, **kwargs)
+        except FloodWaitError as e:
+            self.report_flood_wait(lane, e.seconds)
+            raise
+        except Exception:
+            self.stats[lane].errors += 1
+            raise
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Counters for every lane."""
+        return {lane: stats.as_dict() for lane, stats in self.stats.items()}
@@ -0,0 +1,309 @@
+"""
+SessionKiller - Hot Reload
+Watches config.json and the trust files and applies changes to the running bots.
+"""
+
+import asyncio
+import ctypes
+import ctypes.util
+import json
+import logging
+import os
+import struct
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Editors write a file in several steps; wait this long after the first event
+DEBOUNCE = 0.1
+
+# With inotify, still compare the files this often in case an event was missed
+INOTIFY_RECHECK = 60.0
+
+# Account fields that identify the login; changing one reconnects the account
+LOGIN_FIELDS = ('api_id', 'api_hash', 'phone', 'session')
+
+
+def signature(path: str) -> Optional[Tuple[int, int, int]]:
+    """What a file looks like on disk: (mtime, size, inode), or None if it is missing."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size, st.st_ino
+
+
+class Inotify:
+    """Minimal inotify binding (Linux) through ctypes, watching whole directories.
+
+    Directories rather than files are watched so that editors which save by
+    writing a new file and renaming it over the old one are noticed too.
+    """
+
+    IN_MODIFY = 0x002
+    IN_CLOSE_WRITE = 0x008
+    IN_MOVED_FROM = 0x040
+    IN_MOVED_TO = 0x080
+    IN_CREATE = 0x100
+    IN_DELETE = 0x200
+    MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+    HEADER = struct.Struct('iIII')
+
+    def __init__(self):
+        self.libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.directories: Dict[int, str] = {}
+
+    @classmethod
+    def create(cls) -> Optional['Inotify']:
+        """An inotify instance, or None where inotify is unavailable."""
+        try:
+            return cls()
+        except (OSError, AttributeError) as e:
+            logger.info(f"inotify unavailable, polling for file changes instead: {e}")
+            return None
+
+    def watch(self, directory: str):
+        if directory in self.directories.values():
+            return
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(directory), self.MASK)
+        if wd < 0:
+            logger.warning(f"Cannot watch {directory}: {os.strerror(ctypes.get_errno())}")
+            return
+        self.directories[wd] = directory
+
+    def read_paths(self) -> Set[str]:
+        """Drain pending events; the paths they were about."""
+        paths = set()
+        while True:
+            try:
+                data = os.read(self.fd, 65536)
+            except BlockingIOError:
+                return paths
+            offset = 0
+            while offset < len(data):
+                wd, _, _, length = self.HEADER.unpack_from(data, offset)
+                offset += self.HEADER.size
+                name = data[offset:offset + length].rstrip(b'\0')
+                offset += length
+                if wd in self.directories and name:
+                    paths.add(os.path.join(self.directories[wd], os.fsdecode(name)))
+
+    async def wait(self, paths: Set[str], timeout: float) -> bool:
+        """Wait up to ``timeout`` seconds for an event on one of ``paths``."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            readable = asyncio.Event()
+            loop.add_reader(self.fd, readable.set)
+            try:
+                await asyncio.wait_for(readable.wait(), max(0.0, deadline - loop.time()))
+            except asyncio.TimeoutError:
+                return False
+            finally:
+                loop.remove_reader(self.fd)
+            # Other files in the same directory (logs, databases) wake us too
+            if self.read_paths() & paths:
+                return True
+
+    def close(self):
+        os.close(self.fd)
+
+
+class FileWatcher:
+    """Waits until one of a set of files changes.
+
+    Uses inotify where available and polls otherwise. Either way a file only
+    counts as changed when its (mtime, size, inode) differs from what was
+    seen last, so touching unrelated files never triggers a reload. The set
+    of paths is re-read on every check, so files can come and go.
+    """
+
+    def __init__(self, paths: Callable[[], Iterable[str]], poll_interval: float = 2.0,
+                 use_inotify: bool = True):
+        self.paths = lambda: {os.path.abspath(path) for path in paths() if path}
+        self.poll_interval = poll_interval
+        self.inotify = Inotify.create() if use_inotify else None
+        self.signatures = {path: signature(path) for path in self.paths()}
+
+    def changed(self) -> Set[str]:
+        """Paths whose signature differs from the last check; new paths only set a baseline."""
+        current = {path: signature(path) for path in self.paths()}
+        changed = {path for path, sig in current.items()
+                   if path in self.signatures and self.signatures[path] != sig}
+        self.signatures = current
+        return changed
+
+    async def wait(self) -> Set[str]:
+        """Block until something changed; returns the changed paths."""
+        while True:
+            if self.inotify is not None:
+                paths = self.paths()
+                for directory in {os.path.dirname(path) for path in paths}:
+                    self.inotify.watch(directory)
+                if await self.inotify.wait(paths, INOTIFY_RECHECK):
+                    await asyncio.sleep(DEBOUNCE)
+                    self.inotify.read_paths()
+            else:
+                await asyncio.sleep(self.poll_interval)
+            changed = self.changed()
+            if changed:
+                return changed
+
+    def close(self):
+        if self.inotify is not None:
+            self.inotify.close()
+            self.inotify = None
+
+
+class AccountChanges(NamedTuple):
+    """How a reloaded account list differs from the running one."""
+    added: List[Dict[str, Any]]
+    removed: List[str]
+    replaced: List[Dict[str, Any]]      # login changed: reconnected under the new credentials
+    updated: List[Dict[str, Any]]       # only settings changed: applied in place
+    restart_needed: List[str]           # changed settings a running bot cannot pick up
+
+    def summary(self) -> str:
+        parts = [f"{len(items)} {label}" for label, items in (
+            ('added', self.added), ('removed', self.removed),
+            ('reconnected', self.replaced), ('updated', self.updated),
+        ) if items]
+        return ", ".join(parts) or "no account changes"
+
+
+def same_login(old: Dict[str, Any], new: Dict[str, Any]) -> bool:
+    return all(old.get(field) == new.get(field) for field in LOGIN_FIELDS)
+
+
+def diff_accounts(old: Dict[str, Dict[str, Any]], new: List[Dict[str, Any]],
+                  hot_settings: Iterable[str]) -> AccountChanges:
+    """Compare running account definitions (by name) with freshly loaded ones."""
+    hot_settings = set(hot_settings)
+    new_by_name = {account['name']: account for account in new}
+    changes = AccountChanges([], [name for name in old if name not in new_by_name], [], [], [])
+    restart_needed: Set[str] = set()
+
+    for name, account in new_by_name.items():
+        previous = old.get(name)
+        if previous is None:
+            changes.added.append(account)
+        elif not same_login(previous, account):
+            changes.replaced.append(account)
+        elif previous['settings'] != account['settings']:
+            changes.updated.append(account)
+            keys = set(previous['settings']) | set(account['settings'])
+            restart_needed.update(
+                key for key in keys - hot_settings
+                if previous['settings'].get(key) != account['settings'].get(key)
+            )
+    changes.restart_needed.extend(sorted(restart_needed))
+    return changes
+
+
+class ConfigReloader:
+    """Re-reads the config file when it changes and hands it to ``apply``.
+
+    ``apply`` gets the parsed config and returns the AccountChanges it made.
+    It must validate everything before changing anything: on any error the
+    running configuration stays as it was.
+    """
+
+    def __init__(self, config_file: str, apply: Callable[[Dict[str, Any]], Awaitable[AccountChanges]],
+                 poll_interval: float = 2.0):
+        self.config_file = config_file
+        self.apply = apply
+        self.watcher = FileWatcher(lambda: [config_file], poll_interval)
+
+    async def run(self):
+        try:
+            while True:
+                await self.watcher.wait()
+                await self.reload()
+        finally:
+            self.watcher.close()
+
+    async def reload(self) -> bool:
+        started = time.monotonic()
+        try:
+            with open(self.config_file, 'r') as f:
+                config = json.load(f)
+            changes = await self.apply(config)
+        except Exception as e:
+            logger.error(f"Could not reload {self.config_file}, keeping the running configuration: {e}")
+            return False
+
+        elapsed = (time.monotonic() - started) * 1000
+        logger.info(f"Reloaded {self.config_file} in {elapsed:.1f}ms: {changes.summary()}")
+        if changes.restart_needed:
+            logger.warning(f"Changed settings that only take effect after a restart: "
+                           f"{', '.join(changes.restart_needed)}")
+        return True
+
+
+class TrustReloader:
+    """Refreshes the in-memory trusted sets and trust rules when their files change.
+
+    Other processes, the sqlite3 shell or a new ``trusted_devices.json`` can
+    change what is trusted; every account reading from the changed file
+    re-reads its set. SQLite commits land in the ``-wal`` file, so that is
+    watched alongside the database. An edited rules file is recompiled off
+    the event loop and swapped in for every account using it.
+    """
+
+    def __init__(self, runner: Any, poll_interval: float = 2.0):
+        self.runner = runner
+        self.watcher = FileWatcher(self.paths, poll_interval)
+
+    @staticmethod
+    def bot_paths(bot: Any) -> Set[str]:
+        store = bot.trust_store.path
+        return {os.path.abspath(path) for path in (store, f"{store}-wal", bot.trusted_devices_file)}
+
+    @staticmethod
+    def rules_path(bot: Any) -> str:
+        return os.path.abspath(bot.trust_policy.rules_file)
+
+    def paths(self) -> Set[str]:
+        paths: Set[str] = set()
+        for bot in list(self.runner.bots.values()):
+            paths |= self.bot_paths(bot)
+            paths.add(self.rules_path(bot))
+        return paths
+
+    async def run(self):
+        try:
+            while True:
+                changed = await self.watcher.wait()
+                await self.reload(changed)
+        finally:
+            self.watcher.close()
+
+    async def reload(self, changed: Set[str]):
+        await self.reload_rules(changed)
+        started = time.monotonic()
+        bots = [bot for bot in list(self.runner.bots.values()) if self.bot_paths(bot) & changed]
+        if not bots:
+            return
+        updated = 0
+        for bot in bots:
+            if await bot.reload_trusted_devices():
+                updated += 1
+        elapsed = (time.monotonic() - started) * 1000
+        # The bot's own /trust writes show up here too; only real differences are worth a line
+        level = logging.INFO if updated else logging.DEBUG
+        logger.log(level, f"Reloaded trusted devices of {len(bots)} accounts in {elapsed:.1f}ms "
+                          f"({updated} changed)")
+
+    async def reload_rules(self, changed: Set[str]):
+        started = time.monotonic()
+        policies = {id(bot.trust_policy): bot.trust_policy for bot in list(self.runner.bots.values())
+                    if self.rules_path(bot) in changed}
+        if not policies:
+            return
+        results = [await policy.refresh() for policy in policies.values()]
+        elapsed = (time.monotonic() - started) * 1000
+        logger.info(f"Reloaded trust rules of {sum(results)} of {len(policies)} accounts in {elapsed:.1f}ms")
@@ -0,0 +1,403 @@
+#!/usr/bin/env python3
+"""
+SessionKiller - Snapshot Recording and Replay
+Records authorization snapshots as they are polled and feeds them back through
+the monitor offline, so a login storm can be re-run against a new build.
+
+    python replay.py recording.jsonl --speed max --json after.json --compare before.json
+
+A recording is JSON lines, one per change in an account's session list:
+``{"t": <unix time>, "a": <account>, "add": [<SessionRecord>...], "del": [<hash>...]}``,
+``{"t": ..., "a": ..., "error": "<message>"}`` for a failed poll and
+``{"t": ..., "a": ..., "kill": [<hash>...]}`` for sessions the bot logged out.
+A file ending in ``.gz`` is gzip-compressed.
+"""
+
+import argparse
+import asyncio
+import gzip
+import json
+import logging
+import os
+import queue
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List, Optional, Set
+
+from telethon.tl import types
+from telethon.tl.functions.account import GetAuthorizationsRequest, ResetAuthorizationRequest
+from telethon.tl.functions.auth import ResetAuthorizationsRequest
+
+from fake_client import FakeTelegramClient, UpdateNewAuthorization, make_authorization
+from sessions import SessionRecord
+
+logger = logging.getLogger(__name__)
+
+
+def _open(path: str, mode: str):
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+
+class SnapshotRecorder:
+    """Streams session snapshots to a file as compact per-account deltas.
+
+    ``record()`` runs on the monitor's hot path, so it only computes the delta
+    against the previous snapshot of that account (ignoring ``date_active``,
+    which changes on every poll) and queues it; a writer thread appends to disk.
+    """
+
+    def __init__(self, path: str, max_pending: int = 10000):
+        self.path = path
+        self.pending: queue.Queue = queue.Queue(maxsize=max_pending)
+        self.last: Dict[str, Dict[int, SessionRecord]] = {}
+        self.dropped = 0
+        self.stopping = threading.Event()
+        self.writer = threading.Thread(target=self.write_loop, name='snapshot-recorder', daemon=True)
+        self.writer.start()
+
+    def record(self, account: str, sessions: Dict[int, SessionRecord]):
+        """Queue the changes since this account's previous snapshot, if any."""
+        current = {h: record._replace(date_active=None) for h, record in sessions.items()}
+        previous = self.last.get(account, {})
+        added = [list(record) for h, record in current.items() if previous.get(h) != record]
+        removed = [h for h in previous if h not in current]
+        if account in self.last and not added and not removed:
+            return
+        self.last[account] = current
+        self.put({'t': round(time.time(), 3), 'a': account, 'add': added, 'del': removed})
+
+    def record_error(self, account: str, error: Exception):
+        """Queue a failed poll."""
+        self.put({'t': round(time.time(), 3), 'a': account, 'error': str(error)})
+
+    def record_kill(self, account: str, session_hashes: List[int]):
+        """Queue sessions the bot logged out, so a replay can tell kills from logouts."""
+        self.put({'t': round(time.time(), 3), 'a': account, 'kill': list(session_hashes)})
+
+    def put(self, entry: Dict[str, Any]):
+        try:
+            self.pending.put_nowait(entry)
+        except queue.Full:
+            self.dropped += 1
+
+    def write_loop(self):
+        """Writer thread: append queued entries until closed."""
+        while not (self.stopping.is_set() and self.pending.empty()):
+            try:
+                batch = [self.pending.get(timeout=0.5)]
+            except queue.Empty:
+                continue
+            while not self.pending.empty():
+                batch.append(self.pending.get_nowait())
+            try:
+                with _open(self.path, 'a') as f:
+                    f.writelines(json.dumps(entry, separators=(',', ':')) + '\n' for entry in batch)
+            except Exception as e:
+                logger.error(f"Error writing snapshot recording: {e}")
+
+    def close(self):
+        """Flush queued entries and stop the writer."""
+        self.stopping.set()
+        self.writer.join(timeout=10)
+
+
+# One recorder (writer thread) per file per process
+_recorders: Dict[str, SnapshotRecorder] = {}
+
+
+def open_recorder(path: str) -> SnapshotRecorder:
+    """Return the process-wide recorder for ``path``, opening it on first use."""
+    key = os.path.abspath(path)
+    if key not in _recorders:
+        _recorders[key] = SnapshotRecorder(path)
+    return _recorders[key]
+
+
+def close_recorders():
+    """Flush every recorder of this process."""
+    for recorder in _recorders.values():
+        recorder.close()
+
+
+def load_recording(path: str) -> Dict[str, List[Dict[str, Any]]]:
+    """Read a recording, grouped by account in file order."""
+    accounts: Dict[str, List[Dict[str, Any]]] = {}
+    with _open(path, 'r') as f:
+        for line in f:
+            if line.strip():
+                entry = json.loads(line)
+                accounts.setdefault(entry['a'], []).append(entry)
+    return accounts
+
+
+def summarise(values: List[float]) -> Dict[str, float]:
+    """p50/p95/max in milliseconds."""
+    if not values:
+        return {'p50_ms': 0.0, 'p95_ms': 0.0, 'max_ms': 0.0}
+    ordered = sorted(values)
+
+    def pick(q: float) -> float:
+        return ordered[min(len(ordered) - 1, max(0, round(q * len(ordered)) - 1))]
+
+    return {
+        'p50_ms': round(pick(0.5) * 1000, 1),
+        'p95_ms': round(pick(0.95) * 1000, 1),
+        'max_ms': round(ordered[-1] * 1000, 1),
+    }
+
+
+class ReplayClient(FakeTelegramClient):
+    """Fake client whose session list follows a recording.
+
+    At ``speed='max'`` every GetAuthorizations advances to the next recorded
+    change, so each change is diffed exactly once, in order. Otherwise the
+    changes are applied on the recorded timeline (divided by ``speed``) and
+    the monitor finds them with its normal push/poll logic. Sessions the
+    monitor kills stay dead for the rest of the replay; sessions the recorded
+    build killed only disappear if this build kills them too.
+    """
+
+    def __init__(self, entries: List[Dict[str, Any]], speed: Any = 'max', **kwargs: Any):
+        super().__init__(**kwargs)
+        self.entries = entries
+        self.speed = speed
+        self.position = 0
+        self.sessions: Dict[int, SessionRecord] = {}
+        self.killed: List[int] = []
+        self.recorded_kills: Set[int] = set()
+        self.pending_error: Optional[str] = None
+        self.finished = asyncio.Event()
+
+    async def apply(self, entry: Dict[str, Any]):
+        """Apply one recorded change; a recorded error makes the next poll fail."""
+        if 'error' in entry:
+            self.pending_error = entry['error']
+            return
+        self.recorded_kills.update(entry.get('kill', []))
+        for session_hash in entry.get('del', []):
+            if session_hash not in self.recorded_kills:
+                self.sessions.pop(session_hash, None)
+        for fields in entry.get('add', []):
+            record = SessionRecord.from_snapshot(fields)
+            if record.hash in self.killed:
+                continue
+            is_new = record.hash not in self.sessions
+            self.sessions[record.hash] = record
+            # Everything in the first change is the baseline the monitor starts from
+            if is_new and self.position > 1:
+                self.created_at[record.hash] = time.monotonic()
+                if self.push_updates and UpdateNewAuthorization is not None:
+                    await self.emit_raw(UpdateNewAuthorization(hash=record.hash))
+
+    async def play(self):
+        """Apply the recording on its own timeline (not used at max speed)."""
+        started = time.monotonic()
+        origin = self.entries[0]['t'] if self.entries else 0.0
+        while self.position < len(self.entries):
+            entry = self.entries[self.position]
+            delay = (entry['t'] - origin) / float(self.speed) - (time.monotonic() - started)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self.position += 1
+            await self.apply(entry)
+        self.finished.set()
+
+    async def __call__(self, request: Any, ordered: bool = False) -> Any:
+        name = type(request).__name__
+        self.calls[name] = self.calls.get(name, 0) + 1
+        await self.simulate_latency()
+
+        if isinstance(request, GetAuthorizationsRequest):
+            if self.speed == 'max':
+                await self.advance()
+            if self.pending_error:
+                error, self.pending_error = self.pending_error, None
+                raise RuntimeError(f"Replayed error: {error}")
+            now = time.monotonic()
+            for session_hash in self.sessions:
+                self.listed_at.setdefault(session_hash, now)
+            return types.account.Authorizations(
+                authorization_ttl_days=180,
+                authorizations=[self.authorization(record) for record in self.sessions.values()],
+            )
+        if isinstance(request, ResetAuthorizationRequest):
+            self.kill(request.hash)
+            return True
+        if isinstance(request, ResetAuthorizationsRequest):
+            for session_hash in [h for h, record in self.sessions.items() if not record.current]:
+                self.kill(session_hash)
+            return True
+        raise NotImplementedError(f"ReplayClient does not handle {name}")
+
+    async def advance(self):
+        """Max speed: apply recorded changes up to and including the next poll's."""
+        while self.position < len(self.entries):
+            entry = self.entries[self.position]
+            self.position += 1
+            await self.apply(entry)
+            if 'kill' not in entry:
+                return
+        self.finished.set()
+
+    def kill(self, session_hash: int):
+        if self.sessions.pop(session_hash, None) is not None:
+            self.killed.append(session_hash)
+            self.killed_at[session_hash] = time.monotonic()
+
+    @staticmethod
+    def authorization(record: SessionRecord) -> Any:
+        return make_authorization(
+            record.hash, record.device_model, record.ip, record.country, bool(record.current),
+            app_name=record.app_name, app_version=record.app_version, platform=record.platform,
+            region=record.region, date_created=record.date_created or 0, date_active=record.date_active or 0,
+        )
+
+
+async def replay_account(account: str, entries: List[Dict[str, Any]], settings: Dict[str, Any],
+                         speed: Any, latency: float) -> Dict[str, Any]:
+    """Run one account's recording through a monitor and collect its decisions."""
+    from main import SessionMonitorBot
+
+    client = ReplayClient(entries, speed=speed, latency=latency,
+                          push_updates=settings.get('detection_mode') == 'push' and speed != 'max')
+    if speed == 'max':
+        # One scan per recorded change, back to back
+        settings = {**settings, 'detection_mode': 'poll', 'scheduler': 'fixed', 'scan_interval': 0.0}
+    bot = SessionMonitorBot(0, '', '', settings=settings, name=account, client=client)
+    await bot.connect()
+    bot.monitoring = True
+
+    if speed != 'max':
+        # The first change is the baseline the monitor starts from
+        client.position = 1
+        await client.apply(entries[0])
+    started = time.monotonic()
+    monitor = asyncio.create_task(bot.monitor_sessions())
+    if speed != 'max':
+        # Play on only once the baseline is taken, or early logins would be absorbed into it
+        while bot.last_scan_at is None and not monitor.done():
+            await asyncio.sleep(0.01)
+        player = asyncio.create_task(client.play())
+    await client.finished.wait()
+    # Give the monitor time to act on the last change
+    await asyncio.sleep(0.0 if speed == 'max' else max(2.0, bot.scheduler.effective_interval + 1.0))
+    elapsed = time.monotonic() - started
+
+    bot.monitoring = False
+    bot.scan_event.set()
+    monitor.cancel()
+    await asyncio.gather(monitor, return_exceptions=True)
+    if speed != 'max':
+        player.cancel()
+    await bot.notifier.stop()
+
+    detection, kill = client.latencies()
+    new_sessions = sorted(client.created_at)
+    kill_path = bot.metrics.histograms['detection_to_kill_seconds']
+    return {
+        'changes': len(entries),
+        'new_sessions': len(new_sessions),
+        'killed': sorted(client.killed),
+        'allowed': [h for h in new_sessions if h not in client.killed],
+        'recorded_killed': sorted(client.recorded_kills),
+        'elapsed_s': round(elapsed, 3),
+        'detection': summarise(detection),
+        'kill': summarise(kill),
+        'in_process_kill_ms': round(kill_path.sum / kill_path.count * 1000, 3) if kill_path.count else 0.0,
+    }
+
+
+def compare(before: Dict[str, Any], after: Dict[str, Any]) -> List[str]:
+    """Human-readable decision and latency differences between two replays."""
+    lines = []
+    for account in sorted(set(before) | set(after)):
+        old, new = before.get(account), after.get(account)
+        if old is None or new is None:
+            lines.append(f"{account}: only in {'after' if old is None else 'before'}")
+            continue
+        newly_killed = sorted(set(new['killed']) - set(old['killed']))
+        newly_allowed = sorted(set(new['allowed']) - set(old['allowed']))
+        if newly_killed:
+            lines.append(f"{account}: now killed {newly_killed}")
+        if newly_allowed:
+            lines.append(f"{account}: now allowed {newly_allowed}")
+        lines.append(
+            f"{account}: kill p95 {old['kill']['p95_ms']}ms -> {new['kill']['p95_ms']}ms, "
+            f"in-process {old['in_process_kill_ms']}ms -> {new['in_process_kill_ms']}ms"
+        )
+    return lines
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Replay a session recording through the monitor, offline")
+    parser.add_argument('recording')
+    parser.add_argument('--speed', default='max', help="'max', or a time factor (1 = real time)")
+    parser.add_argument('--account', action='append', help="only replay these accounts")
+    parser.add_argument('--latency', type=float, default=None,
+                        help="simulated request latency (default 0 at max speed, 0.05 otherwise)")
+    parser.add_argument('--config', default='config.json', help="settings (trust store, rules) to replay with")
+    parser.add_argument('--json', help="write the results to this file")
+    parser.add_argument('--compare', help="results of an earlier replay to compare against")
+    parser.add_argument('--log-level', default='ERROR')
+    args = parser.parse_args()
+
+    from audit import open_audit_log
+    from log_setup import setup_logging, shutdown_logging
+    from main import DEFAULT_SETTINGS
+
+    setup_logging({'log_file': '', 'log_level': args.log_level})
+    speed = args.speed if args.speed == 'max' else float(args.speed)
+    latency = args.latency if args.latency is not None else (0.0 if speed == 'max' else 0.05)
+
+    config_settings: Dict[str, Any] = {}
+    if os.path.exists(args.config):
+        with open(args.config, 'r') as f:
+            config_settings = json.load(f).get('settings', {})
+
+    recording = load_recording(args.recording)
+    results: Dict[str, Any] = {}
+    try:
+        with tempfile.TemporaryDirectory(prefix='sessionkiller-replay-') as workdir:
+            for account, entries in recording.items():
+                if args.account and account not in args.account:
+                    continue
+                # Trust decisions use the real store and rules; everything written goes to a scratch dir
+                settings = {
+                    **DEFAULT_SETTINGS,
+                    **config_settings,
+                    'snapshot_file': os.path.join(workdir, f"known_sessions_{account}.json"),
+                    'trusted_devices_file': os.path.join(workdir, 'trusted_devices.json'),
+                    'audit_db': os.path.join(workdir, 'audit.db'),
+                    'record_file': '',
+                }
+                results[account] = await replay_account(account, entries, settings, speed, latency)
+                result = results[account]
+                print(
+                    f"{account}: {result['changes']} changes, {result['new_sessions']} new sessions, "
+                    f"{len(result['killed'])} killed ({len(result['recorded_killed'])} in the recording), "
+                    f"{len(result['allowed'])} allowed, kill p95 {result['kill']['p95_ms']}ms, "
+                    f"in-process {result['in_process_kill_ms']}ms",
+                    flush=True,
+                )
+                differs = set(result['killed']) ^ set(result['recorded_killed'])
+                if differs:
+                    print(f"{account}: decisions differ from the recording for {sorted(differs)}")
+            # Flush the scratch audit log before its directory goes away
+            open_audit_log(os.path.join(workdir, 'audit.db')).close()
+    finally:
+        shutdown_logging()
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            for line in compare(json.load(f), results):
+                print(line)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
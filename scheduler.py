@@ -0,0 +1,209 @@
+"""
+SessionKiller - Scan Schedulers
+Decide how long the monitor loop waits between session scans.
+"""
+
+import asyncio
+import random
+import time
+from typing import Any, Dict
+
+from telethon.errors import FloodWaitError
+
+
+class ScanScheduler:
+    """Base scheduler: a fixed cadence with no adaptation.
+
+    The monitor loop asks for ``next_interval()`` before every scan and reports
+    the outcome through the ``record_*`` hooks, so schedulers can be swapped
+    without touching the loop itself.
+    """
+
+    def __init__(self, interval: float, baseline_interval: float = 0.5):
+        self.interval = interval
+        # Cadence the RPC savings are measured against (the old fixed poll)
+        self.baseline_interval = baseline_interval
+        self.started_at = time.monotonic()
+        self.scans = 0
+        self.errors = 0
+        self.flood_waits = 0
+        self.flood_wait_until = 0.0
+
+    def next_interval(self) -> float:
+        """Seconds to wait before the next scan."""
+        return self.effective_interval
+
+    @property
+    def effective_interval(self) -> float:
+        """Current delay between scans, before any jitter."""
+        return max(self.interval, self.flood_wait_remaining())
+
+    def flood_wait_remaining(self) -> float:
+        """Seconds left on the last FloodWait imposed by Telegram."""
+        return max(0.0, self.flood_wait_until - time.monotonic())
+
+    def record_scan(self, new_sessions: int = 0):
+        """Called after every successful scan."""
+        self.scans += 1
+
+    def record_error(self, error: Exception):
+        """Called when a scan fails."""
+        self.errors += 1
+        if isinstance(error, FloodWaitError):
+            self.flood_waits += 1
+            self.flood_wait_until = time.monotonic() + error.seconds
+
+    def trigger_burst(self, reason: str = ''):
+        """Ask for a faster cadence for a while (no-op for fixed schedules)."""
+
+    def carry_over(self, previous: 'ScanScheduler'):
+        """Keep the counters and any FloodWait of the scheduler this one replaces."""
+        self.started_at = previous.started_at
+        self.scans = previous.scans
+        self.errors = previous.errors
+        self.flood_waits = previous.flood_waits
+        self.flood_wait_until = previous.flood_wait_until
+
+    @property
+    def rpcs_saved(self) -> int:
+        """Scans avoided compared to polling at the baseline interval."""
+        elapsed = time.monotonic() - self.started_at
+        expected = int(elapsed / self.baseline_interval) if self.baseline_interval > 0 else 0
+        return max(0, expected - self.scans)
+
+    @property
+    def mode(self) -> str:
+        """Short label for the current cadence."""
+        if self.flood_wait_remaining():
+            return 'flood-wait'
+        return 'fixed'
+
+
+class AdaptiveScheduler(ScanScheduler):
+    """Scheduler that bursts after activity, relaxes when idle and backs off on errors."""
+
+    def __init__(self, burst_interval: float = 0.5, idle_interval: float = 5.0,
+                 burst_duration: float = 60.0, relax_factor: float = 1.5,
+                 backoff_base: float = 1.0, backoff_max: float = 60.0,
+                 jitter: float = 0.1, baseline_interval: float = 0.5):
+        super().__init__(idle_interval, baseline_interval)
+        self.burst_interval = burst_interval
+        self.idle_interval = idle_interval
+        self.burst_duration = burst_duration
+        self.relax_factor = relax_factor
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.jitter = jitter
+
+        self.burst_until = 0.0
+        self.consecutive_errors = 0
+        self.current_interval = idle_interval
+
+    def next_interval(self) -> float:
+        """Seconds to wait before the next scan, with jitter applied."""
+        flood_wait = self.flood_wait_remaining()
+        if flood_wait:
+            return flood_wait
+
+        delay = self.effective_interval
+        if self.jitter:
+            delay *= 1 + random.uniform(-self.jitter, self.jitter)
+        return max(0.0, delay)
+
+    @property
+    def effective_interval(self) -> float:
+        """Current delay between scans, before any jitter."""
+        flood_wait = self.flood_wait_remaining()
+        if flood_wait:
+            return flood_wait
+        if self.consecutive_errors:
+            return min(self.backoff_max, self.backoff_base * 2 ** (self.consecutive_errors - 1))
+        if time.monotonic() < self.burst_until:
+            return self.burst_interval
+        return self.current_interval
+
+    def record_scan(self, new_sessions: int = 0):
+        """Reset error backoff, then burst or relax towards the idle cadence."""
+        super().record_scan(new_sessions)
+        self.consecutive_errors = 0
+        if new_sessions:
+            self.trigger_burst('new session')
+        elif time.monotonic() >= self.burst_until:
+            self.current_interval = min(self.idle_interval, self.current_interval * self.relax_factor)
+
+    def record_error(self, error: Exception):
+        """Grow the exponential backoff."""
+        super().record_error(error)
+        self.consecutive_errors += 1
+
+    def trigger_burst(self, reason: str = ''):
+        """Switch to the burst cadence for ``burst_duration`` seconds."""
+        self.burst_until = time.monotonic() + self.burst_duration
+        self.current_interval = self.burst_interval
+
+    def carry_over(self, previous: ScanScheduler):
+        """Also stay in a running burst or backoff."""
+        super().carry_over(previous)
+        if isinstance(previous, AdaptiveScheduler):
+            self.burst_until = previous.burst_until
+            self.consecutive_errors = previous.consecutive_errors
+            self.current_interval = min(self.idle_interval, max(self.burst_interval, previous.current_interval))
+
+    @property
+    def mode(self) -> str:
+        """Short label for the current cadence."""
+        if self.flood_wait_remaining():
+            return 'flood-wait'
+        if self.consecutive_errors:
+            return 'backoff'
+        if time.monotonic() < self.burst_until:
+            return 'burst'
+        return 'idle' if self.current_interval >= self.idle_interval else 'relaxing'
+
+
+def create_scheduler(settings: Dict[str, Any]) -> ScanScheduler:
+    """Build the scheduler selected in the bot settings."""
+    push = settings['detection_mode'] == 'push'
+    idle_interval = float(settings['fallback_interval'] if push else settings['idle_interval'])
+
+    if settings['scheduler'] == 'fixed':
+        interval = idle_interval if push else float(settings['scan_interval'])
+        return ScanScheduler(interval)
+
+    return AdaptiveScheduler(
+        burst_interval=float(settings['scan_interval']),
+        idle_interval=idle_interval,
+        burst_duration=float(settings['burst_duration']),
+        backoff_max=float(settings['backoff_max']),
+        jitter=float(settings['jitter']),
+    )
+
+
+class PollCoordinator:
+    """Spreads GetAuthorizations calls from many accounts across time.
+
+    Every account asks for a slot before polling; slots are handed out at
+    least ``spacing`` seconds apart so accounts never poll in lockstep.
+    """
+
+    def __init__(self, spacing: float = 0.05):
+        self.spacing = spacing
+        self.next_slot = 0.0
+        self.grants: Dict[str, int] = {}
+        self.waited = 0.0
+
+    async def acquire(self, account: str):
+        """Wait for this account's next polling slot."""
+        now = time.monotonic()
+        slot = max(now, self.next_slot)
+        self.next_slot = slot + self.spacing
+        self.grants[account] = self.grants.get(account, 0) + 1
+        if slot > now:
+            self.waited += slot - now
+            await asyncio.sleep(slot - now)
+
+    def stagger(self, index: int, count: int, interval: float) -> float:
+        """Initial offset for account ``index`` of ``count`` so their cadences interleave."""
+        if count <= 1:
+            return 0.0
+        return interval * index / count
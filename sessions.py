@@ -0,0 +1,96 @@
+"""
+SessionKiller - Session Records
+Compact session snapshots and the diff engine used by the monitor loop.
+"""
+
+from datetime import datetime
+from typing import Any, Dict, NamedTuple, Optional, Tuple
+
+
+def _timestamp(value: Any) -> Optional[int]:
+    """Normalise a Telethon date (datetime or int) to a Unix timestamp."""
+    if not value:
+        return None
+    if isinstance(value, datetime):
+        return int(value.timestamp())
+    return int(value)
+
+
+class SessionRecord(NamedTuple):
+    """The fields of an ``Authorization`` the bot actually uses.
+
+    Being a tuple it carries no per-instance ``__dict__``, and it serialises
+    straight to a JSON list for the snapshot file.
+    """
+    hash: int
+    device_model: Optional[str] = None
+    app_name: Optional[str] = None
+    app_version: Optional[str] = None
+    platform: Optional[str] = None
+    ip: Optional[str] = None
+    country: Optional[str] = None
+    region: Optional[str] = None
+    date_created: Optional[int] = None
+    date_active: Optional[int] = None
+    current: bool = False
+
+    @classmethod
+    def from_authorization(cls, auth: Any) -> 'SessionRecord':
+        """Build a record from a Telethon ``Authorization``."""
+        return cls(
+            auth.hash,
+            auth.device_model,
+            auth.app_name,
+            auth.app_version,
+            auth.platform,
+            auth.ip,
+            auth.country,
+            auth.region,
+            _timestamp(auth.date_created),
+            _timestamp(auth.date_active),
+            bool(getattr(auth, 'current', False)),
+        )
+
+    @classmethod
+    def from_snapshot(cls, entry: Any) -> 'SessionRecord':
+        """Rebuild a record from a snapshot entry (a list, or a bare hash in old snapshots)."""
+        if isinstance(entry, int):
+            return cls(entry)
+        return cls(*entry)
+
+    @property
+    def location(self) -> Tuple[Optional[str], Optional[str], Optional[str]]:
+        """Network origin of the session: IP, country and region."""
+        return self.ip, self.country, self.region
+
+
+class SessionDiff(NamedTuple):
+    """Result of comparing two session snapshots."""
+    added: Dict[int, SessionRecord]
+    removed: Dict[int, SessionRecord]
+    changed: Dict[int, Tuple[SessionRecord, SessionRecord]]
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.removed or self.changed)
+
+
+def diff_sessions(old: Dict[int, SessionRecord], new: Dict[int, SessionRecord]) -> SessionDiff:
+    """Compare two snapshots keyed by session hash.
+
+    Sessions present in both are reported as changed when their network origin
+    moved. Records restored from a hash-only snapshot have no IP and are never
+    reported as changed.
+    """
+    old_keys = old.keys()
+    new_keys = new.keys()
+
+    added = {h: new[h] for h in new_keys - old_keys}
+    removed = {h: old[h] for h in old_keys - new_keys}
+    changed = {}
+    for h in new_keys & old_keys:
+        before, after = old[h], new[h]
+        if before.ip is not None and before.location != after.location:
+            changed[h] = (before, after)
+
+    return SessionDiff(added, removed, changed)
+
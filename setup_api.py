@@ -2,21 +2,38 @@
 """
 SessionKiller - Telegram API Credentials Generator
 Automates the process of getting Telegram API credentials and configuring the bot.
+
+    python setup_api.py                                  # one account, interactive
+    python setup_api.py --batch phones.txt --concurrency 4
 """
 
+import argparse
 import json
 import os
 import re
 import time
 import asyncio
+from typing import Any, Dict, List, Optional, Tuple
 from telethon import TelegramClient
 from telethon.errors import PhoneNumberInvalidError, PhoneCodeInvalidError, SessionPasswordNeededError
 
+# Official Telegram Desktop credentials, used only to log in and create the app.
+# These are public and safe to use for this purpose.
+BOOTSTRAP_API_ID = 17349
+BOOTSTRAP_API_HASH = "344583e45741c457fe1862106095a5eb"
+
+# Session file main.py uses for a single-account config
+SINGLE_SESSION = 'session_monitor'
+
+
 class TelegramAPISetup:
-    def __init__(self):
-        self.config_file = 'config.json'
+    def __init__(self, config_file: str = 'config.json'):
+        self.config_file = config_file
         self.example_config_file = 'config.example.json'
-        
+        self.code_requests = 0
+        # Accounts log in concurrently but share one terminal
+        self.prompt_lock: Optional[asyncio.Lock] = None
+    
     def print_banner(self):
         """Print welcome banner."""
         print("🔥" + "=" * 60)
@@ -67,108 +84,106 @@ class TelegramAPISetup:
         
         return phone
     
-    async def create_telegram_app(self, phone: str):
-        """Create Telegram application and get API credentials."""
-        print("\n🔑 STEP 2: Getting API credentials from Telegram")
-        print("   This will create an API application for you automatically...")
+    async def ask(self, prompt: str) -> str:
+        """Read a line from the terminal without stalling other accounts' logins."""
+        if self.prompt_lock is None:
+            self.prompt_lock = asyncio.Lock()
+        async with self.prompt_lock:
+            loop = asyncio.get_running_loop()
+            answer = await loop.run_in_executor(None, input, prompt)
+        return answer.strip()
+    
+    async def login(self, client: TelegramClient, phone: str, tag: str = ''):
+        """Authorise ``client`` unless its session already is; one code request at most."""
+        if await client.is_user_authorized():
+            # The session file is named after the account, not the number it was logged in with
+            me = await client.get_me()
+            logged_in_as = re.sub(r'\D', '', getattr(me, 'phone', None) or '')
+            if logged_in_as != re.sub(r'\D', '', phone):
+                raise ValueError(
+                    f"The existing session is logged in as +{logged_in_as}, not {phone}; "
+                    f"use another account name or remove the session file"
+                )
+            print(f"{tag}✅ Already logged in, reusing the existing session")
+            return
+        
+        print(f"{tag}📨 Sending verification code to {phone}...")
+        await client.send_code_request(phone)
+        self.code_requests += 1
+        
+        while True:
+            try:
+                code = await self.ask(f"{tag}📲 Enter the verification code sent to {phone}: ")
+                if not code:
+                    print(f"{tag}❌ Code cannot be empty!")
+                    continue
+                
+                await client.sign_in(phone, code)
+                break
+            
+            except PhoneCodeInvalidError:
+                print(f"{tag}❌ Invalid code! Please try again.")
+                continue
+            except SessionPasswordNeededError:
+                password = await self.ask(f"{tag}🔒 Two-factor authentication enabled. Enter your password: ")
+                await client.sign_in(password=password)
+                break
         
-        # Use official Telegram app credentials for initial connection
-        # These are public and safe to use for this purpose
-        api_id = 17349  # Official Telegram Desktop API ID
-        api_hash = "344583e45741c457fe1862106095a5eb"  # Official hash
+        print(f"{tag}✅ Successfully authenticated with Telegram!")
+    
+    async def create_telegram_app(self, client: TelegramClient, tag: str = '') -> Tuple[int, str]:
+        """Create Telegram application and get API credentials, using an authorised client."""
+        print(f"\n{tag}🏗️  Creating API application...")
         
-        client = TelegramClient('temp_session', api_id, api_hash)
+        app_title = "SessionKiller Bot"
+        app_short_name = f"sessionkiller_{int(time.time())}"
+        app_url = ""
+        app_platform = "desktop"
+        app_desc = "SessionKiller - Telegram session monitoring and security bot"
         
         try:
-            print("📡 Connecting to Telegram...")
-            await client.connect()
+            # Use Telegram's API to create application; not every Telethon
+            # version has it, in which case the manual steps below apply
+            from telethon.tl.functions.account import CreateApplicationRequest
             
-            if not await client.is_user_authorized():
-                print(f"📨 Sending verification code to {phone}...")
-                await client.send_code_request(phone)
-                
-                while True:
-                    try:
-                        code = input("📲 Enter the verification code you received: ").strip()
-                        if not code:
-                            print("❌ Code cannot be empty!")
-                            continue
-                        
-                        await client.sign_in(phone, code)
-                        break
-                        
-                    except PhoneCodeInvalidError:
-                        print("❌ Invalid code! Please try again.")
-                        continue
-                    except SessionPasswordNeededError:
-                        password = input("🔒 Two-factor authentication enabled. Enter your password: ")
-                        await client.sign_in(password=password)
-                        break
+            result = await client(CreateApplicationRequest(
+                title=app_title,
+                short_name=app_short_name,
+                url=app_url,
+                platform=app_platform,
+                description=app_desc
+            ))
             
-            print("✅ Successfully authenticated with Telegram!")
+            new_api_id = result.api_id
+            new_api_hash = result.api_hash
             
-            # Create API application
-            print("\n🏗️  Creating API application...")
+            print(f"{tag}🎉 API Application created successfully!")
+            print(f"{tag}📋 API ID: {new_api_id}")
+            print(f"{tag}🔑 API Hash: {new_api_hash}")
             
-            app_title = "SessionKiller Bot"
-            app_short_name = f"sessionkiller_{int(time.time())}"
-            app_url = ""
-            app_platform = "desktop"
-            app_desc = "SessionKiller - Telegram session monitoring and security bot"
+            return new_api_id, new_api_hash
+        
+        except Exception as e:
+            print(f"{tag}⚠️  Could not create new API application: {e}")
+            print(f"{tag}📝 Please create manually at https://my.telegram.org")
+            print("\n🔧 Manual setup instructions:")
+            print("1. Go to https://my.telegram.org")
+            print("2. Enter your phone number and verify")
+            print("3. Go to 'API Development Tools'")
+            print("4. Create a new application with these details:")
+            print(f"   - App title: {app_title}")
+            print(f"   - Short name: {app_short_name}")
+            print(f"   - Platform: {app_platform}")
+            print(f"   - Description: {app_desc}")
+            print("5. Copy the API ID and API Hash")
             
-            # Use Telegram's API to create application
-            from telethon.tl.functions.account import CreateApplicationRequest
+            api_id = await self.ask(f"\n{tag}📋 Enter your API ID: ")
+            api_hash = await self.ask(f"{tag}🔑 Enter your API Hash: ")
             
-            try:
-                result = await client(CreateApplicationRequest(
-                    title=app_title,
-                    short_name=app_short_name,
-                    url=app_url,
-                    platform=app_platform,
-                    description=app_desc
-                ))
-                
-                new_api_id = result.api_id
-                new_api_hash = result.api_hash
-                
-                print("🎉 API Application created successfully!")
-                print(f"📋 API ID: {new_api_id}")
-                print(f"🔑 API Hash: {new_api_hash}")
-                
-                return new_api_id, new_api_hash
-                
-            except Exception as e:
-                print(f"⚠️  Could not create new API application: {e}")
-                print("📝 Please create manually at https://my.telegram.org")
-                print("\n🔧 Manual setup instructions:")
-                print("1. Go to https://my.telegram.org")
-                print("2. Enter your phone number and verify")
-                print("3. Go to 'API Development Tools'")
-                print("4. Create a new application with these details:")
-                print(f"   - App title: {app_title}")
-                print(f"   - Short name: {app_short_name}")
-                print(f"   - Platform: {app_platform}")
-                print(f"   - Description: {app_desc}")
-                print("5. Copy the API ID and API Hash")
-                
-                api_id = input("\n📋 Enter your API ID: ").strip()
-                api_hash = input("🔑 Enter your API Hash: ").strip()
-                
-                if not api_id or not api_hash:
-                    raise ValueError("API ID and Hash are required!")
-                
-                return int(api_id), api_hash
-                
-        except PhoneNumberInvalidError:
-            raise ValueError(f"Invalid phone number: {phone}")
-        except Exception as e:
-            raise ValueError(f"Authentication failed: {e}")
-        finally:
-            if client.is_connected():
-                await client.disconnect()
-            # Clean up temporary session
-            if os.path.exists('temp_session.session'):
-                os.remove('temp_session.session')
+            if not api_id or not api_hash:
+                raise ValueError("API ID and Hash are required!")
+            
+            return int(api_id), api_hash
     
     def save_config(self, api_id: int, api_hash: str, phone: str):
         """Save configuration to config.json."""
@@ -183,43 +198,79 @@ class TelegramAPISetup:
         
         print(f"\n💾 Configuration saved to {self.config_file}")
     
-    async def test_connection(self, api_id: int, api_hash: str, phone: str):
-        """Test the API credentials."""
-        print("\n🧪 STEP 3: Testing API credentials...")
+    async def test_connection(self, session: str, api_id: int, api_hash: str, tag: str = '') -> bool:
+        """Test the API credentials on the session the bot will use.
+        
+        The session was authorised while creating the app, so this never asks
+        for another code; an unauthorised session counts as a failure.
+        """
+        print(f"\n{tag}🧪 Testing API credentials...")
         
-        client = TelegramClient('test_session', api_id, api_hash)
+        client = TelegramClient(session, api_id, api_hash)
         
         try:
             await client.connect()
             
             if not await client.is_user_authorized():
-                print("📨 Sending verification code...")
-                await client.send_code_request(phone)
-                
-                code = input("📲 Enter verification code: ").strip()
-                await client.sign_in(phone, code)
+                print(f"{tag}❌ Connection test failed: the session is not authorised")
+                return False
             
             # Test API functionality
             me = await client.get_me()
-            print(f"✅ Connection successful! Logged in as: {me.first_name}")
+            print(f"{tag}✅ Connection successful! Logged in as: {me.first_name}")
             
             # Test session listing (main bot functionality)
             from telethon.tl.functions.account import GetAuthorizationsRequest
             result = await client(GetAuthorizationsRequest())
             session_count = len(getattr(result, 'authorizations', []))
-            print(f"✅ Found {session_count} active sessions")
+            print(f"{tag}✅ Found {session_count} active sessions")
             
             return True
-            
+        
         except Exception as e:
-            print(f"❌ Connection test failed: {e}")
+            print(f"{tag}❌ Connection test failed: {e}")
             return False
         finally:
             if client.is_connected():
                 await client.disconnect()
-            # Clean up test session
-            if os.path.exists('test_session.session'):
-                os.remove('test_session.session')
+    
+    async def provision(self, phone: str, session: str, tag: str = '') -> Tuple[int, str]:
+        """Log ``phone`` in once and create its API app.
+        
+        The authorised session is kept as ``session``: the connection test and
+        the bot reuse it, so neither asks for another code. If provisioning
+        fails it is removed again, but only when this run created it: an
+        existing session may be the one a running bot is using.
+        """
+        session_file = f"{session}.session"
+        created = not os.path.exists(session_file)
+        client = TelegramClient(session, BOOTSTRAP_API_ID, BOOTSTRAP_API_HASH)
+        succeeded = False
+        
+        try:
+            print(f"{tag}📡 Connecting to Telegram...")
+            await client.connect()
+            await self.login(client, phone, tag)
+            api_id, api_hash = await self.create_telegram_app(client, tag)
+            # The session file is only written once the client lets go of it
+            await client.disconnect()
+            
+            if not await self.test_connection(session, api_id, api_hash, tag):
+                raise ValueError("connection test failed")
+            succeeded = True
+            return api_id, api_hash
+        
+        except PhoneNumberInvalidError:
+            raise ValueError(f"Invalid phone number: {phone}")
+        except ValueError:
+            raise
+        except Exception as e:
+            raise ValueError(f"Authentication failed: {e}")
+        finally:
+            if client.is_connected():
+                await client.disconnect()
+            if not succeeded and created and os.path.exists(session_file):
+                os.remove(session_file)
     
     def print_success(self):
         """Print success message."""
@@ -246,35 +297,167 @@ class TelegramAPISetup:
             # Get user input
             phone = self.get_user_input()
             
-            # Get API credentials
-            api_id, api_hash = await self.create_telegram_app(phone)
+            # Log in once, get API credentials and test them on the same session
+            print("\n🔑 STEP 2: Getting API credentials from Telegram")
+            print("   This will create an API application for you automatically...")
+            api_id, api_hash = await self.provision(phone, SINGLE_SESSION)
             
             # Save configuration
             self.save_config(api_id, api_hash, phone)
-            
-            # Test connection
-            if await self.test_connection(api_id, api_hash, phone):
-                self.print_success()
-                return True
-            else:
-                print("\n❌ Setup failed! Please check your credentials and try again.")
-                return False
-                
+            self.print_success()
+            return True
+        
         except KeyboardInterrupt:
             print("\n\n⏹️  Setup cancelled by user.")
             return False
         except Exception as e:
             print(f"\n❌ Setup failed: {e}")
             return False
+    
+    # Batch provisioning
+    
+    def read_phones(self, path: str) -> List[Tuple[Optional[str], str]]:
+        """Read ``phone`` or ``name phone`` lines (``name, phone`` works too).
+        
+        Blank lines and lines starting with ``#`` are skipped.
+        """
+        entries = []
+        with open(path, 'r') as f:
+            for number, line in enumerate(f, 1):
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                # A name never starts with a digit or '+', a phone may contain spaces
+                match = re.match(r'([^\d+\s,][^\s,]*)[\s,]+(.+)$', line)
+                name, phone = match.groups() if match else (None, line)
+                try:
+                    entries.append((name, self.validate_phone(phone)))
+                except ValueError as e:
+                    raise ValueError(f"{path}:{number}: {e}: {phone}")
+        if not entries:
+            raise ValueError(f"No phone numbers in {path}")
+        return entries
+    
+    def load_existing_accounts(self) -> Dict[str, Any]:
+        """The current config as a multi-account config, or an empty one.
+        
+        A configured single account is kept as ``default`` on its existing
+        session file, so switching to batch mode never logs it out.
+        """
+        try:
+            with open(self.config_file, 'r') as f:
+                config = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return {'accounts': []}
+        
+        if 'accounts' in config:
+            return config
+        if config.get('api_id') in (None, 'YOUR_API_ID', 'YOUR_API_ID_HERE'):
+            return {'settings': config.get('settings', {}), 'accounts': []}
+        
+        account = {'name': 'default'}
+        account.update((key, config[key]) for key in ('api_id', 'api_hash', 'phone') if key in config)
+        account['session'] = SINGLE_SESSION
+        return {'settings': config.get('settings', {}), 'accounts': [account]}
+    
+    def save_accounts(self, config: Dict[str, Any]):
+        """Atomically write a multi-account config."""
+        tmp_file = f"{self.config_file}.tmp"
+        with open(tmp_file, 'w') as f:
+            json.dump(config, f, indent=2)
+        os.replace(tmp_file, self.config_file)
+        print(f"\n💾 Configuration for {len(config['accounts'])} account(s) saved to {self.config_file}")
+    
+    async def run_batch(self, phones_file: str, concurrency: int = 3) -> bool:
+        """Provision every phone in ``phones_file``, ``concurrency`` at a time.
+        
+        Each account is logged in exactly once; its session file is the one
+        main.py will use. Successful accounts are merged into the config
+        (replacing entries with the same name or phone); failed ones are
+        listed so they can be retried.
+        """
+        self.print_banner()
+        config = self.load_existing_accounts()
+        accounts = config['accounts']
+        
+        try:
+            phones = self.read_phones(phones_file)
+        except (OSError, ValueError) as e:
+            print(f"❌ {e}")
+            return False
+        
+        taken = {account.get('name') for account in accounts}
+        taken.update(name for name, _ in phones if name)
+        names = []
+        counter = 1
+        for name, phone in phones:
+            if not name:
+                existing = [a.get('name') for a in accounts if a.get('phone') == phone]
+                name = existing[0] if existing else None
+            while not name:
+                candidate = f"account{counter}"
+                counter += 1
+                if candidate not in taken:
+                    name = candidate
+                    taken.add(name)
+            names.append(name)
+        
+        print(f"📦 Provisioning {len(phones)} account(s), {concurrency} at a time")
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+        started = time.monotonic()
+        
+        async def provision_one(name: str, phone: str) -> Dict[str, Any]:
+            async with semaphore:
+                session = f"session_monitor_{name}"
+                api_id, api_hash = await self.provision(phone, session, tag=f"[{name}] ")
+                return {'name': name, 'api_id': api_id, 'api_hash': api_hash,
+                        'phone': phone, 'session': session}
+        
+        results = await asyncio.gather(
+            *(provision_one(name, phone) for name, (_, phone) in zip(names, phones)),
+            return_exceptions=True,
+        )
+        
+        failed = []
+        for name, (_, phone), result in zip(names, phones, results):
+            if isinstance(result, BaseException):
+                failed.append((name, phone, result))
+                continue
+            accounts[:] = [a for a in accounts if a.get('name') != name and a.get('phone') != phone]
+            accounts.append(result)
+        
+        provisioned = len(phones) - len(failed)
+        if provisioned:
+            self.save_accounts(config)
+        
+        print(f"\n📊 {provisioned}/{len(phones)} account(s) provisioned in "
+              f"{time.monotonic() - started:.0f}s with {self.code_requests} code request(s)")
+        for name, phone, error in failed:
+            print(f"❌ {name} ({phone}): {error}")
+        if provisioned:
+            print("\n🚀 Start monitoring every account with: python main.py")
+        return not failed
 
 async def main():
     """Main function."""
+    parser = argparse.ArgumentParser(description="Get Telegram API credentials and configure SessionKiller")
+    parser.add_argument('--batch', metavar='PHONES_FILE',
+                        help="provision every phone in this file (one 'phone' or 'name phone' per line)")
+    parser.add_argument('--concurrency', type=int, default=3, help="accounts provisioned at once in batch mode")
+    parser.add_argument('--config', default='config.json', help="config file to write")
+    args = parser.parse_args()
+    
     print("Starting SessionKiller API Setup...")
+    setup = TelegramAPISetup(args.config)
+    
+    if args.batch:
+        await setup.run_batch(args.batch, args.concurrency)
+        return
     
     # Check if already configured
-    if os.path.exists('config.json'):
+    if os.path.exists(args.config):
         try:
-            with open('config.json', 'r') as f:
+            with open(args.config, 'r') as f:
                 config = json.load(f)
             
             # Check if it's a template or real config
@@ -289,7 +472,6 @@ async def main():
         except:
             pass  # Continue with setup if config is invalid
     
-    setup = TelegramAPISetup()
     success = await setup.run_setup()
     
     if success:
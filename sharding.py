@@ -0,0 +1,354 @@
+"""
+SessionKiller - Process Sharding
+Spreads monitored accounts across worker processes, one event loop each.
+"""
+
+import asyncio
+import hashlib
+import logging
+import multiprocessing
+import os
+import queue
+import time
+from typing import Any, Dict, List, Optional
+
+from metrics import AccountMetrics, render
+from reloader import AccountChanges, TrustReloader, diff_accounts
+
+logger = logging.getLogger(__name__)
+
+# How long the command reader blocks on the queue before checking whether the worker is exiting
+COMMAND_POLL_INTERVAL = 0.5
+
+
+def shard_weight(slot: int, account: str) -> int:
+    """Stable weight of an account on a worker slot (rendezvous hashing)."""
+    digest = hashlib.sha1(f"{slot}:{account}".encode()).digest()
+    return int.from_bytes(digest[:8], 'big')
+
+
+def assign_shards(accounts: List[str], slots: List[int]) -> Dict[int, List[str]]:
+    """Assign every account to exactly one slot.
+
+    Each account goes to the slot with the highest weight, so removing a slot
+    only moves the accounts that lived on it.
+    """
+    assignment: Dict[int, List[str]] = {slot: [] for slot in slots}
+    for account in accounts:
+        best = max(slots, key=lambda slot: shard_weight(slot, account))
+        assignment[best].append(account)
+    return assignment
+
+
+def worker_main(slot: int, accounts: List[Dict[str, Any]], settings: Dict[str, Any],
+                status_queue: Any, command_queue: Any):
+    """Entry point of a worker process."""
+    try:
+        asyncio.run(worker_run(slot, accounts, settings, status_queue, command_queue))
+    except KeyboardInterrupt:
+        pass
+
+
+async def worker_run(slot: int, accounts: List[Dict[str, Any]], settings: Dict[str, Any],
+                     status_queue: Any, command_queue: Any):
+    """Run a MultiAccountRunner and report its status back to the coordinator."""
+    # Imported here so the coordinator process never builds Telegram clients
+    from log_setup import setup_logging
+    from main import DEFAULT_SETTINGS, MultiAccountRunner
+    from control import start_control_server
+    from metrics import export_metrics
+
+    # Each worker writes its own log file; processes must not rotate a shared one
+    worker_settings = {**DEFAULT_SETTINGS, **settings}
+    if worker_settings['log_file']:
+        base, ext = os.path.splitext(worker_settings['log_file'])
+        worker_settings['log_file'] = f"{base}.shard{slot}{ext}"
+    setup_logging(worker_settings)
+
+    def prepare(account: Dict[str, Any]) -> Dict[str, Any]:
+        # Workers cannot prompt for codes, and record to their own file like they log
+        account['settings']['interactive_login'] = False
+        if account['settings'].get('record_file'):
+            base, ext = os.path.splitext(account['settings']['record_file'])
+            account['settings']['record_file'] = f"{base}.shard{slot}{ext}"
+        return account
+
+    for account in accounts:
+        prepare(account)
+    runner = MultiAccountRunner(accounts, settings)
+    interval = float(settings.get('shard_status_interval', 5.0))
+
+    async def report_status():
+        while True:
+            status_queue.put({
+                'slot': slot,
+                'pid': multiprocessing.current_process().pid,
+                'time': time.time(),
+                'accounts': runner.status(),
+                'metrics': export_metrics(),
+            })
+            await asyncio.sleep(interval)
+
+    def next_command() -> Optional[Dict[str, Any]]:
+        # A bounded wait, so the executor thread never keeps an exiting worker alive
+        try:
+            return command_queue.get(timeout=COMMAND_POLL_INTERVAL)
+        except queue.Empty:
+            return None
+
+    async def read_commands():
+        loop = asyncio.get_running_loop()
+        while True:
+            command = await loop.run_in_executor(None, next_command)
+            if command is None:
+                continue
+            try:
+                if command.get('op') == 'add_account':
+                    await runner.add_account(prepare(command['account']))
+                elif command.get('op') == 'update_account':
+                    await runner.update_account(prepare(command['account']))
+                elif command.get('op') == 'remove_account':
+                    await runner.remove_account(command['name'])
+            except Exception as e:
+                logger.error(f"Shard {slot} could not apply {command.get('op')}: {e}")
+
+    # Metrics travel with the status reports and are served by the coordinator. Commands
+    # for these accounts are forwarded by the coordinator's control socket to this one.
+    control_server = None
+    if worker_settings['control_socket']:
+        control_server = await start_control_server(runner, f"{worker_settings['control_socket']}.shard{slot}")
+
+    reporter = asyncio.create_task(report_status())
+    reader = asyncio.create_task(read_commands())
+    # Trusted sets live in this process, so it watches the trust files itself
+    trust_reloader = None
+    if worker_settings['hot_reload']:
+        trust_reloader = asyncio.create_task(
+            TrustReloader(runner, float(worker_settings['reload_poll_interval'])).run()
+        )
+    try:
+        await runner.run()
+    finally:
+        reporter.cancel()
+        reader.cancel()
+        if trust_reloader:
+            trust_reloader.cancel()
+        if control_server:
+            control_server.close()
+
+
+class ShardWorker:
+    """Bookkeeping for one worker slot in the coordinator."""
+
+    def __init__(self, slot: int):
+        self.slot = slot
+        self.accounts: List[str] = []
+        self.process: Optional[multiprocessing.Process] = None
+        self.command_queue: Any = None
+        self.restarts: List[float] = []
+        self.retired = False
+        self.status: Optional[Dict[str, Any]] = None
+
+
+class ShardCoordinator:
+    """Runs accounts across a pool of worker processes.
+
+    Accounts are assigned with rendezvous hashing. A crashed worker is restarted
+    with the same accounts; once it crashes more than ``max_restarts`` times
+    within ``restart_window`` seconds its slot is retired and its accounts move
+    to the surviving workers. An account is only handed out again after the
+    process that owned it has exited, so it is never monitored twice. A worker
+    whose accounts were all removed exits cleanly and is started again once an
+    account is assigned to its slot.
+    """
+
+    def __init__(self, accounts: List[Dict[str, Any]], settings: Dict[str, Any],
+                 workers: int = 2, max_restarts: int = 5, restart_window: float = 300.0):
+        self.accounts = {account['name']: account for account in accounts}
+        self.settings = settings
+        self.max_restarts = max_restarts
+        self.restart_window = restart_window
+        self.context = multiprocessing.get_context('spawn')
+        self.status_queue = self.context.Queue()
+        self.workers = {slot: ShardWorker(slot) for slot in range(max(1, workers))}
+
+        assignment = assign_shards(list(self.accounts), list(self.workers))
+        for slot, names in assignment.items():
+            self.workers[slot].accounts = names
+
+    def live_slots(self) -> List[int]:
+        """Slots that are still in service."""
+        return [slot for slot, worker in self.workers.items() if not worker.retired]
+
+    def spawn(self, worker: ShardWorker):
+        """Start (or restart) the process for a worker slot."""
+        worker.command_queue = self.context.Queue()
+        worker.process = self.context.Process(
+            target=worker_main,
+            args=(worker.slot, [self.accounts[name] for name in worker.accounts],
+                  self.settings, self.status_queue, worker.command_queue),
+            name=f"sessionkiller-shard-{worker.slot}",
+            daemon=True,
+        )
+        worker.process.start()
+        logger.info(f"Shard {worker.slot} started (pid {worker.process.pid}) "
+                    f"with {len(worker.accounts)} accounts")
+
+    async def run(self):
+        """Start all workers and supervise them until cancelled."""
+        for worker in self.workers.values():
+            if worker.accounts:
+                self.spawn(worker)
+
+        last_summary = time.monotonic()
+        try:
+            while True:
+                self.collect_status()
+                self.check_workers()
+                if time.monotonic() - last_summary >= 60:
+                    last_summary = time.monotonic()
+                    self.log_summary()
+                await asyncio.sleep(1)
+        finally:
+            self.shutdown()
+
+    def collect_status(self):
+        """Drain status reports sent by the workers."""
+        while True:
+            try:
+                report = self.status_queue.get_nowait()
+            except queue.Empty:
+                return
+            worker = self.workers.get(report['slot'])
+            if worker is not None:
+                worker.status = report
+
+    def check_workers(self):
+        """Restart crashed workers, retiring slots that keep crashing."""
+        for worker in list(self.workers.values()):
+            if worker.retired or worker.process is None or worker.process.is_alive():
+                continue
+
+            exitcode = worker.process.exitcode
+            if exitcode == 0 and not worker.accounts:
+                # All its accounts were removed; the slot is started again when one is added
+                logger.info(f"Shard {worker.slot} exited with no accounts left")
+                worker.process = None
+                worker.status = None
+                continue
+            now = time.monotonic()
+            worker.restarts = [t for t in worker.restarts if now - t < self.restart_window]
+            worker.restarts.append(now)
+            logger.error(f"Shard {worker.slot} exited with code {exitcode}")
+
+            if len(worker.restarts) <= self.max_restarts or len(self.live_slots()) == 1:
+                self.spawn(worker)
+            else:
+                self.retire(worker)
+
+    def retire(self, worker: ShardWorker):
+        """Take a slot out of service and hand its accounts to the survivors."""
+        worker.retired = True
+        orphans, worker.accounts = worker.accounts, []
+        worker.status = None
+        logger.error(f"Shard {worker.slot} crashed too often, moving {len(orphans)} accounts")
+
+        for slot, names in assign_shards(orphans, self.live_slots()).items():
+            target = self.workers[slot]
+            for name in names:
+                target.accounts.append(name)
+                if target.process is not None and target.process.is_alive():
+                    target.command_queue.put({'op': 'add_account', 'account': self.accounts[name]})
+            if names and (target.process is None or not target.process.is_alive()):
+                self.spawn(target)
+
+    def owner(self, name: str) -> Optional[ShardWorker]:
+        """The worker an account is assigned to."""
+        for worker in self.workers.values():
+            if name in worker.accounts:
+                return worker
+        return None
+
+    def send(self, worker: ShardWorker, command: Dict[str, Any]):
+        """Queue a command for a running worker; a stopped one gets its accounts on restart."""
+        if worker.process is not None and worker.process.is_alive():
+            worker.command_queue.put(command)
+
+    async def apply_accounts(self, accounts: List[Dict[str, Any]]) -> AccountChanges:
+        """Route the changes of a reloaded config to the workers that own the accounts."""
+        from main import HOT_SETTINGS
+
+        changes = diff_accounts(self.accounts, accounts, HOT_SETTINGS)
+        for name in changes.removed:
+            del self.accounts[name]
+            worker = self.owner(name)
+            if worker is not None:
+                worker.accounts.remove(name)
+                self.send(worker, {'op': 'remove_account', 'name': name})
+        for account in changes.replaced + changes.updated:
+            self.accounts[account['name']] = account
+            worker = self.owner(account['name'])
+            if worker is not None:
+                self.send(worker, {'op': 'update_account', 'account': account})
+
+        for account in changes.added:
+            self.accounts[account['name']] = account
+        added = [account['name'] for account in changes.added]
+        for slot, names in assign_shards(added, self.live_slots()).items():
+            target = self.workers[slot]
+            target.accounts.extend(names)
+            if names and target.process is None:
+                self.spawn(target)
+                continue
+            for name in names:
+                self.send(target, {'op': 'add_account', 'account': self.accounts[name]})
+        return changes
+
+    def shutdown(self):
+        """Stop every worker process."""
+        for worker in self.workers.values():
+            if worker.process is not None and worker.process.is_alive():
+                worker.process.terminate()
+        for worker in self.workers.values():
+            if worker.process is not None:
+                worker.process.join(timeout=5)
+
+    def log_summary(self):
+        """Log one line with the aggregated shard status."""
+        status = self.status()
+        alive = sum(1 for worker in status['workers'] if worker['alive'])
+        logger.info(
+            f"Shards: {alive}/{len(status['workers'])} alive, {len(status['accounts'])} accounts "
+            f"reporting, {status['scans']} scans, {status['errors']} errors"
+        )
+
+    def status(self) -> Dict[str, Any]:
+        """Aggregate the latest reports from every worker."""
+        accounts = []
+        workers = []
+        for worker in self.workers.values():
+            alive = worker.process is not None and worker.process.is_alive()
+            workers.append({
+                'slot': worker.slot,
+                'pid': worker.process.pid if worker.process else None,
+                'alive': alive,
+                'retired': worker.retired,
+                'accounts': len(worker.accounts),
+                'restarts': len(worker.restarts),
+            })
+            if worker.status:
+                accounts.extend(worker.status['accounts'])
+        return {
+            'workers': workers,
+            'accounts': accounts,
+            'scans': sum(a['scans'] for a in accounts),
+            'errors': sum(a['errors'] for a in accounts),
+        }
+
+    def render_metrics(self) -> str:
+        """Prometheus text for every account, merged from the workers' latest reports."""
+        return render(
+            AccountMetrics.from_export(data)
+            for worker in self.workers.values() if worker.status
+            for data in worker.status.get('metrics', [])
+        )
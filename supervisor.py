@@ -0,0 +1,167 @@
+"""
+SessionKiller - Monitor Supervisor
+Owns the single monitor task of an account and restarts it when it dies or stalls.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class MonitorSupervisor:
+    """Runs exactly one monitor task and watches over it.
+
+    ``start()`` is a no-op while the task is alive, so repeated resumes can
+    never create a second polling loop. ``stop()`` lets a scan in progress
+    finish (kills are never abandoned half way) and cancels the task outright
+    when it is only waiting for the next scan. A ``start()`` that arrives while
+    a stop is still waiting for the old task only takes effect once that task
+    has exited. A watchdog restarts the task, with backoff, when it exits
+    unexpectedly or stops making progress.
+
+    Every task is started with a generation number, and ``stop()`` moves the
+    generation on: a loop whose generation is no longer ``generation`` must
+    exit, even if its run flag has been switched back on by then.
+
+    The monitor reports progress by pushing ``deadline`` forward: the latest
+    monotonic time by which it expects to report again.
+    """
+
+    def __init__(self, run: Callable[[int], Awaitable[Any]], is_idle: Callable[[], bool],
+                 stall_timeout: float = 120.0, check_interval: float = 5.0,
+                 max_backoff: float = 60.0, log: Any = None):
+        self.run = run
+        self.is_idle = is_idle
+        self.stall_timeout = stall_timeout
+        self.check_interval = check_interval
+        self.max_backoff = max_backoff
+        self.log = log or logger
+
+        self.task: Optional[asyncio.Task] = None
+        self.watchdog: Optional[asyncio.Task] = None
+        self.generation = 0
+        self.stopping = 0    # stop() calls waiting for a task to exit
+        self.restart_pending = False
+        self.deadline = 0.0
+        self.restarts = 0
+        self.consecutive_failures = 0
+        self.last_failure: Optional[str] = None
+
+    @property
+    def running(self) -> bool:
+        return self.task is not None and not self.task.done()
+
+    def heartbeat(self, expected_wait: float = 0.0):
+        """Called by the monitor: it will report again within ``expected_wait`` (+ stall timeout)."""
+        self.deadline = time.monotonic() + expected_wait + self.stall_timeout
+
+    def scan_completed(self):
+        """Called by the monitor after a successful scan; resets the restart backoff."""
+        self.consecutive_failures = 0
+
+    def is_current(self, generation: int) -> bool:
+        """Whether the task started with ``generation`` is still the one that should run."""
+        return generation == self.generation and not self.stopping
+
+    def start(self) -> bool:
+        """Start the monitor task unless it is already running.
+
+        While ``stop()`` is waiting for the old task, the start is deferred
+        until that task has exited.
+        """
+        if self.stopping:
+            started = not self.restart_pending
+            self.restart_pending = True
+            return started
+        if self.watchdog is None or self.watchdog.done():
+            self.watchdog = asyncio.create_task(self.watch())
+        if self.running:
+            return False
+        self.spawn()
+        return True
+
+    def spawn(self):
+        self.heartbeat()
+        self.generation += 1
+        self.task = asyncio.create_task(self.run(self.generation))
+
+    async def stop(self, grace: float = 10.0):
+        """Stop the monitor task and the watchdog.
+
+        The monitor is expected to leave its loop on its own after the current
+        scan (the caller has cleared its run flag); it is cancelled if it is
+        idle, or still running after ``grace`` seconds.
+        """
+        if self.watchdog is not None:
+            self.watchdog.cancel()
+            self.watchdog = None
+        # A stop cancels any start that was waiting on an earlier one
+        self.restart_pending = False
+        self.generation += 1
+        task = self.task
+        if task is None or task.done():
+            self.task = None
+            return
+        # The task stays registered until it has exited, so start() cannot run a second one
+        self.stopping += 1
+        try:
+            await self.wait_stopped(task, grace)
+        finally:
+            if self.task is task:
+                self.task = None
+            self.stopping -= 1
+            if not self.stopping and self.restart_pending:
+                self.restart_pending = False
+                self.start()
+
+    async def wait_stopped(self, task: asyncio.Task, grace: float):
+        """Let a busy task finish within ``grace`` seconds; cancel an idle or overdue one."""
+        if not self.is_idle():
+            try:
+                await asyncio.wait_for(asyncio.shield(task), grace)
+                return
+            except asyncio.TimeoutError:
+                self.log.warning(f"Monitor did not stop within {grace}s, cancelling it")
+            except Exception:
+                return
+        task.cancel()
+        try:
+            await task
+        except (asyncio.CancelledError, Exception):
+            pass
+
+    async def watch(self):
+        """Watchdog loop: restart the monitor if it died or stalled."""
+        while True:
+            await asyncio.sleep(self.check_interval)
+            task = self.task
+            if task is None:
+                continue
+
+            if task.done():
+                error = None if task.cancelled() else task.exception()
+                reason = f"died: {error}" if error else "exited unexpectedly"
+            elif time.monotonic() > self.deadline:
+                reason = f"stalled (no progress for over {self.stall_timeout:g}s)"
+                task.cancel()
+                try:
+                    await task
+                except (asyncio.CancelledError, Exception):
+                    pass
+            else:
+                continue
+
+            if self.task is not task:
+                # Stopped or restarted while we were looking
+                continue
+            self.restarts += 1
+            self.consecutive_failures += 1
+            self.last_failure = reason
+            delay = min(self.max_backoff, 2 ** min(self.consecutive_failures - 1, 16))
+            self.log.error(f"Monitor task {reason}; restarting in {delay}s")
+            await asyncio.sleep(delay)
+            if self.task is task:
+                self.spawn()
@@ -0,0 +1,75 @@
+"""
+Shared fixtures: the bot's modules live at the repository root, and monitor
+tests run a SessionMonitorBot against fake_client.FakeTelegramClient.
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_client import FakeTelegramClient  # noqa: E402
+from main import SessionMonitorBot  # noqa: E402
+
+
+@pytest.fixture
+def make_bot(tmp_path):
+    """Build bots on fake clients, with every file in the test's temporary directory.
+
+    Call it inside the event loop the bot will run on.
+    """
+    bots = []
+
+    def make(client=None, **settings):
+        bot = SessionMonitorBot(
+            api_id=0, api_hash='', phone='', name='test',
+            client=client or FakeTelegramClient(latency=0.001),
+            settings={
+                'snapshot_file': str(tmp_path / 'known_sessions.json'),
+                'trust_store': str(tmp_path / 'trusted_devices.db'),
+                'trusted_devices_file': str(tmp_path / 'trusted_devices.json'),
+                'trust_rules_file': str(tmp_path / 'trust_rules.json'),
+                'audit_db': str(tmp_path / 'audit.db'),
+                'fallback_interval': 0.05,
+                'push_recheck_delay': 0.02,
+                'notify_coalesce_window': 0.01,
+                **settings,
+            },
+        )
+        bots.append(bot)
+        return bot
+
+    yield make
+    for bot in bots:
+        bot.audit.close()
+        bot.trust_store.close()
+
+
+@pytest.fixture
+def audit_events(monkeypatch):
+    """Capture a bot's audit events as (event, hash) pairs instead of writing them."""
+    def capture(bot):
+        events = []
+        monkeypatch.setattr(bot.audit, 'record',
+                            lambda account, event, session=None, detail=None:
+                            events.append((event, getattr(session, 'hash', None))))
+        return events
+    return capture
+
+
+async def wait_until(predicate, timeout: float = 5.0):
+    """Poll ``predicate`` until it holds, failing the test after ``timeout`` seconds."""
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise AssertionError("condition not met in time")
+        await asyncio.sleep(0.01)
+
+
+@pytest.fixture
+def until():
+    return wait_until
@@ -0,0 +1,27 @@
+import asyncio
+import os
+import stat
+
+import control
+from control import ControlServer
+
+
+def test_socket_is_never_reachable_by_other_users(tmp_path, monkeypatch):
+    # Only the bind itself may set the permissions, not a chmod after it
+    monkeypatch.setattr(control.os, 'chmod', lambda path, mode: None)
+    path = str(tmp_path / 'control.sock')
+    umask = os.umask(0o022)
+
+    async def scenario():
+        server = ControlServer(runner=None, path=path)
+        await server.start()
+        mode = stat.S_IMODE(os.stat(path).st_mode)
+        server.close()
+        return mode
+
+    try:
+        mode = asyncio.run(scenario())
+        assert os.umask(0o022) == 0o022
+    finally:
+        os.umask(umask)
+    assert mode == 0o600
@@ -0,0 +1,60 @@
+from ipintel import IntervalIndex
+
+
+def segments(index):
+    return list(zip(index.starts, index.ends, index.values))
+
+
+def test_disjoint_ranges():
+    index = IntervalIndex([(50, 60, 'b'), (10, 20, 'a')])
+
+    assert index.lookup(9) is None
+    assert index.lookup(10) == 'a'
+    assert index.lookup(20) == 'a'
+    assert index.lookup(21) is None
+    assert index.lookup(55) == 'b'
+    assert index.lookup(61) is None
+    assert len(index) == 2
+
+
+def test_innermost_nested_range_wins():
+    index = IntervalIndex([(0, 100, 'hosting'), (10, 20, 'vpn'), (12, 14, 'tor')])
+
+    assert index.lookup(5) == 'hosting'
+    assert index.lookup(10) == 'vpn'
+    assert index.lookup(13) == 'tor'
+    assert index.lookup(15) == 'vpn'
+    assert index.lookup(21) == 'hosting'
+    assert index.lookup(100) == 'hosting'
+    assert index.lookup(101) is None
+    assert segments(index) == [
+        (0, 9, 'hosting'), (10, 11, 'vpn'), (12, 14, 'tor'), (15, 20, 'vpn'), (21, 100, 'hosting'),
+    ]
+
+
+def test_nested_range_sharing_a_boundary():
+    index = IntervalIndex([(0, 100, 'outer'), (0, 10, 'start'), (90, 100, 'end')])
+
+    assert segments(index) == [(0, 10, 'start'), (11, 89, 'outer'), (90, 100, 'end')]
+
+
+def test_partial_overlap_is_cut_where_the_earlier_range_ends():
+    index = IntervalIndex([(0, 50, 'a'), (40, 80, 'b')])
+
+    assert index.lookup(39) == 'a'
+    assert index.lookup(45) == 'b'
+    assert index.lookup(50) == 'b'
+    assert index.lookup(60) is None
+
+
+def test_adjacent_segments_with_the_same_value_merge():
+    index = IntervalIndex([(0, 100, 'outer'), (101, 150, 'outer')])
+
+    assert segments(index) == [(0, 150, 'outer')]
+
+
+def test_empty_index():
+    index = IntervalIndex([])
+
+    assert index.lookup(0) is None
+    assert len(index) == 0
@@ -0,0 +1,37 @@
+import logging
+
+import pytest
+
+import log_setup
+from log_setup import setup_logging, shutdown_logging
+
+
+@pytest.fixture
+def restore_root_logger():
+    root = logging.getLogger()
+    handlers, level = list(root.handlers), root.level
+    yield
+    shutdown_logging()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    for handler in handlers:
+        root.addHandler(handler)
+    root.setLevel(level)
+
+
+def test_replacing_the_pipeline_closes_the_old_one(tmp_path, restore_root_logger):
+    setup_logging({'log_file': str(tmp_path / 'first.log')})
+    first = log_setup._listener
+    logging.getLogger('test').warning("to the first file")
+
+    setup_logging({'log_file': str(tmp_path / 'second.log')})
+    logging.getLogger('test').warning("to the second file")
+    shutdown_logging()
+
+    assert first._thread is None
+    assert all(getattr(handler, 'stream', None) is None for handler in first.handlers
+               if isinstance(handler, logging.FileHandler))
+    assert "to the first file" in (tmp_path / 'first.log').read_text()
+    assert "to the second file" in (tmp_path / 'second.log').read_text()
+    assert "to the second file" not in (tmp_path / 'first.log').read_text()
+
@@ -0,0 +1,207 @@
+"""Monitor loop tests against the fake Telegram client: no network, no credentials."""
+
+import asyncio
+
+from fake_client import CURRENT_SESSION_HASH, FakeTelegramClient
+
+
+def monitor_tasks():
+    return [task for task in asyncio.all_tasks()
+            if task.get_coro().__qualname__ == 'SessionMonitorBot.monitor_sessions' and not task.done()]
+
+
+async def start(bot, until):
+    """Connect, start monitoring and wait for the baseline scan."""
+    await bot.connect()
+    bot.start_monitoring()
+    await until(lambda: bot.known_sessions)
+
+
+async def shut_down(bot):
+    await bot.stop_monitoring()
+    await bot.notifier.stop()
+
+
+def test_untrusted_session_is_killed_and_reported(make_bot, audit_events, until):
+    async def scenario():
+        bot = make_bot()
+        events = audit_events(bot)
+        await start(bot, until)
+
+        intruder = await bot.client.add_session(device_model='Intruder')
+        await until(lambda: intruder in bot.client.killed_at)
+        await until(lambda: any('logged out' in message for message in bot.client.sent))
+        # Later scans must not mistake the kill for a session that ended on its own
+        scans = bot.metrics.counters['scans_total']
+        await until(lambda: bot.metrics.counters['scans_total'] >= scans + 2)
+        await shut_down(bot)
+        return bot, events, intruder
+
+    bot, events, intruder = asyncio.run(scenario())
+    assert events == [('new', intruder), ('killed', intruder)]
+    assert intruder not in bot.known_sessions
+    assert bot.metrics.counters['sessions_killed_total'] == 1
+    assert bot.metrics.histograms['detection_to_kill_seconds'].count == 1
+
+
+def test_trusted_session_is_kept(make_bot, audit_events, until):
+    async def scenario():
+        bot = make_bot()
+        events = audit_events(bot)
+        await start(bot, until)
+
+        await bot.trust_devices([4242])
+        await bot.client.add_session(hash=4242, device_model='My laptop')
+        await until(lambda: 4242 in bot.known_sessions)
+        await shut_down(bot)
+        return bot, events
+
+    bot, events = asyncio.run(scenario())
+    assert 4242 in bot.client.sessions
+    assert events == [('new', 4242), ('trusted', 4242)]
+
+
+def test_failed_logout_is_retried(make_bot, until):
+    async def scenario():
+        client = FakeTelegramClient(latency=0.001)
+        client.inject_flood_wait('ResetAuthorizationRequest', seconds=1)
+        bot = make_bot(client)
+        await start(bot, until)
+
+        intruder = await client.add_session(device_model='Intruder')
+        await until(lambda: intruder in client.killed_at)
+        await shut_down(bot)
+        return client, intruder
+
+    client, intruder = asyncio.run(scenario())
+    assert client.calls['ResetAuthorizationRequest'] == 2
+
+
+def test_bulk_reset_on_mass_intrusion(make_bot, audit_events, until):
+    async def scenario():
+        bot = make_bot(mass_intrusion_threshold=3)
+        events = audit_events(bot)
+        # Without push signals the whole storm lands in one scan
+        bot.client.push_updates = False
+        await start(bot, until)
+
+        intruders = await bot.client.login_storm(4)
+        await until(lambda: all(h in bot.client.killed_at for h in intruders))
+        await shut_down(bot)
+        return bot, events, intruders
+
+    bot, events, intruders = asyncio.run(scenario())
+    assert bot.client.calls.get('ResetAuthorizationsRequest') == 1
+    assert 'ResetAuthorizationRequest' not in bot.client.calls
+    assert sorted(h for event, h in events if event == 'killed') == sorted(intruders)
+    assert list(bot.client.sessions) == [CURRENT_SESSION_HASH]
+
+
+def test_catch_up_scan_vets_sessions_created_while_down(make_bot, until):
+    async def scenario():
+        client = FakeTelegramClient(latency=0.001, push_updates=False)
+        first = make_bot(client)
+        await start(first, until)
+        await shut_down(first)
+
+        # Logged in while no monitor was running
+        intruder = await client.add_session(device_model='Intruder')
+
+        second = make_bot(client)
+        await second.connect()
+        second.start_monitoring()
+        await until(lambda: intruder in client.killed_at)
+        await shut_down(second)
+        return second, intruder
+
+    second, intruder = asyncio.run(scenario())
+    assert set(second.known_sessions) == {CURRENT_SESSION_HASH}
+
+
+def test_snapshot_of_another_login_is_ignored(make_bot, until):
+    async def scenario():
+        first = make_bot(FakeTelegramClient(latency=0.001, push_updates=False))
+        await start(first, until)
+        await shut_down(first)
+
+        # Same account name and snapshot file, but the config now names another phone
+        client = FakeTelegramClient(latency=0.001, push_updates=False)
+        own = await client.add_session(device_model='My laptop')
+        second = make_bot(client)
+        second.phone = '+1 555 0100'
+        await start(second, until)
+        await shut_down(second)
+        return second, client, own
+
+    second, client, own = asyncio.run(scenario())
+    assert own in client.sessions
+    assert set(second.known_sessions) == {CURRENT_SESSION_HASH, own}
+
+
+def test_failed_first_scan_is_not_a_baseline(make_bot, until):
+    async def scenario():
+        client = FakeTelegramClient(latency=0.001, push_updates=False)
+        client.inject_flood_wait('GetAuthorizationsRequest', seconds=1)
+        intruder = await client.add_session(device_model='Intruder')
+        bot = make_bot(client)
+        await start(bot, until)
+        await shut_down(bot)
+        return bot, intruder
+
+    bot, intruder = asyncio.run(scenario())
+    # Without a snapshot the first successful scan is the baseline, never an empty failed one
+    assert set(bot.known_sessions) == {CURRENT_SESSION_HASH, intruder}
+
+
+def test_resume_during_stop_never_runs_two_monitors(make_bot, until):
+    async def scenario():
+        # Slow requests keep a scan in flight while /stop and /resume arrive
+        client = FakeTelegramClient(latency=0.2, latency_jitter=0)
+        bot = make_bot(client, scan_interval=0.01, detection_mode='poll', scheduler='fixed')
+        await start(bot, until)
+        await until(lambda: not bot.idle)
+        old = bot.supervisor.task
+
+        stopping = asyncio.ensure_future(bot.stop_monitoring())
+        await asyncio.sleep(0.05)
+        assert bot.start_monitoring()
+        assert bot.supervisor.task is old
+        assert len(monitor_tasks()) == 1
+        await stopping
+
+        # The old scan finished on its own and exactly one new loop runs
+        assert old.done() and not old.cancelled()
+        assert bot.supervisor.running and bot.supervisor.task is not old
+        assert len(monitor_tasks()) == 1
+
+        client.latency = 0.001
+        intruder = await client.add_session(device_model='Intruder')
+        await until(lambda: intruder in client.killed_at)
+
+        await shut_down(bot)
+        return bot
+
+    bot = asyncio.run(scenario())
+    assert not bot.supervisor.running
+
+
+def test_stop_then_resume(make_bot, until):
+    async def scenario():
+        bot = make_bot()
+        await start(bot, until)
+
+        await bot.stop_monitoring()
+        assert not monitor_tasks()
+        stopped_with = bot.metrics.counters['scans_total']
+        intruder = await bot.client.add_session(device_model='Intruder')
+        await asyncio.sleep(0.2)
+        assert intruder not in bot.client.killed_at
+        assert bot.metrics.counters['scans_total'] == stopped_with
+
+        assert bot.start_monitoring()
+        assert not bot.start_monitoring()
+        await until(lambda: intruder in bot.client.killed_at)
+        assert len(monitor_tasks()) == 1
+        await shut_down(bot)
+
+    asyncio.run(scenario())
@@ -0,0 +1,86 @@
+import asyncio
+
+from notifier import MAX_MESSAGE_LENGTH, NotificationQueue, split_message
+
+
+def test_short_message_is_not_split():
+    assert split_message("hello") == ["hello"]
+    assert split_message("") == []
+
+
+def test_split_prefers_line_breaks():
+    text = "\n".join(f"line {i:03}" for i in range(100))
+
+    chunks = split_message(text, 100)
+
+    assert all(len(chunk) <= 100 for chunk in chunks)
+    assert all(not chunk.startswith("\n") for chunk in chunks)
+    assert "\n".join(chunks) == text
+
+
+def test_split_cuts_long_lines_at_the_limit():
+    chunks = split_message("x" * 250, 100)
+
+    assert [len(chunk) for chunk in chunks] == [100, 100, 50]
+
+
+def test_default_limit_is_telegrams():
+    chunks = split_message("a" * (MAX_MESSAGE_LENGTH + 1))
+
+    assert [len(chunk) for chunk in chunks] == [MAX_MESSAGE_LENGTH, 1]
+
+
+def make_queue(sent, **kwargs):
+    async def send(text):
+        sent.append(text)
+    return NotificationQueue(send, **kwargs)
+
+
+def test_single_message_digest_is_the_message():
+    async def scenario():
+        queue = make_queue([])
+        return queue, queue.build_digest(["only"])
+
+    queue, digest = asyncio.run(scenario())
+    assert digest == "only"
+    assert queue.digests == 0
+
+
+def test_digest_merges_messages_in_order():
+    async def scenario():
+        queue = make_queue([])
+        return queue, queue.build_digest(["first", "second", "third"])
+
+    queue, digest = asyncio.run(scenario())
+    assert digest.startswith("📬 **3 events:**")
+    assert digest.index("first") < digest.index("second") < digest.index("third")
+    assert queue.digests == 1
+
+
+def test_messages_within_the_window_are_sent_as_one_digest():
+    async def scenario():
+        sent = []
+        latencies = []
+        queue = make_queue(sent, coalesce_window=0.05, on_delivered=latencies.append)
+        queue.start()
+        for i in range(3):
+            queue.submit(f"alert {i}")
+        while not sent:
+            await asyncio.sleep(0.01)
+        await queue.stop()
+        return sent, latencies
+
+    sent, latencies = asyncio.run(scenario())
+    assert len(sent) == 1
+    assert "3 events" in sent[0]
+    assert len(latencies) == 3
+
+
+def test_full_queue_drops_new_messages():
+    async def scenario():
+        queue = make_queue([], max_queue=2)
+        return [queue.submit(str(i)) for i in range(3)], queue
+
+    results, queue = asyncio.run(scenario())
+    assert results == [True, True, False]
+    assert queue.dropped == 1
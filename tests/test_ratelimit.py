@@ -0,0 +1,68 @@
+import asyncio
+
+from ratelimit import RpcBudget
+
+
+def test_waiting_lanes_are_served_in_priority_order():
+    async def scenario():
+        # One global token every 20ms, and the first one is used up right away
+        budget = RpcBudget(global_rate=50.0, global_burst=1.0)
+        await budget.acquire('poll')
+
+        order = []
+
+        async def request(lane):
+            await budget.acquire(lane)
+            order.append(lane)
+
+        lanes = ['notify', 'poll', 'command', 'probe', 'logout']
+        await asyncio.gather(*(request(lane) for lane in lanes))
+        return order
+
+    assert asyncio.run(scenario()) == ['logout', 'probe', 'command', 'poll', 'notify']
+
+
+def test_same_lane_is_first_come_first_served():
+    async def scenario():
+        budget = RpcBudget(global_rate=50.0, global_burst=1.0)
+        await budget.acquire('poll')
+        order = []
+
+        async def request(tag):
+            await budget.acquire('poll')
+            order.append(tag)
+
+        await asyncio.gather(*(request(tag) for tag in range(4)))
+        return order
+
+    assert asyncio.run(scenario()) == [0, 1, 2, 3]
+
+
+def test_flood_wait_blocks_only_its_lane():
+    async def scenario():
+        budget = RpcBudget()
+        budget.report_flood_wait('poll', 30)
+
+        await asyncio.wait_for(budget.acquire('command'), 1)
+        await asyncio.wait_for(budget.acquire('probe'), 1)
+        blocked = asyncio.ensure_future(budget.acquire('poll'))
+        await asyncio.sleep(0.05)
+        assert not blocked.done()
+        blocked.cancel()
+        return budget
+
+    budget = asyncio.run(scenario())
+    assert 29 < budget.blocked_for('poll') <= 30
+    assert budget.blocked_for('command') == 0
+    assert budget.snapshot()['poll']['flood_waits'] == 1
+
+
+def test_lane_bucket_throttles_bursts():
+    async def scenario():
+        budget = RpcBudget({'poll': [100.0, 2.0]})
+        for _ in range(3):
+            await budget.acquire('poll')
+        return budget.snapshot()['poll']
+
+    stats = asyncio.run(scenario())
+    assert stats['throttled'] == 1
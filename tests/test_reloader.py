@@ -0,0 +1,81 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+from reloader import TrustReloader, diff_accounts
+from sessions import SessionRecord
+
+HOT = {'scan_interval', 'fallback_interval'}
+
+
+def account(name, phone='+100', **settings):
+    return {'name': name, 'api_id': 1, 'api_hash': 'hash', 'phone': phone,
+            'session': f"session_monitor_{name}", 'settings': settings}
+
+
+RUNNING = {
+    'same': account('same', scan_interval=1),
+    'tuned': account('tuned', scan_interval=1),
+    'moved': account('moved', phone='+200'),
+    'gone': account('gone'),
+}
+
+
+def test_classifies_every_kind_of_change():
+    changes = diff_accounts(RUNNING, [
+        account('same', scan_interval=1),
+        account('tuned', scan_interval=2),
+        account('moved', phone='+201'),
+        account('fresh'),
+    ], HOT)
+
+    assert [a['name'] for a in changes.added] == ['fresh']
+    assert changes.removed == ['gone']
+    assert [a['name'] for a in changes.replaced] == ['moved']
+    assert [a['name'] for a in changes.updated] == ['tuned']
+    assert changes.restart_needed == []
+
+
+def test_unchanged_config_changes_nothing():
+    changes = diff_accounts(RUNNING, list(RUNNING.values()), HOT)
+
+    assert changes == ([], [], [], [], [])
+
+
+def test_cold_settings_are_reported():
+    changes = diff_accounts(RUNNING, [
+        account('same', scan_interval=1, log_file='other.log'),
+        account('tuned', scan_interval=1, metrics_port=9100),
+    ], HOT)
+
+    assert [a['name'] for a in changes.updated] == ['same', 'tuned']
+    assert changes.restart_needed == ['log_file', 'metrics_port']
+
+
+def test_a_login_change_replaces_rather_than_updates():
+    changes = diff_accounts(RUNNING, [dict(account('same', scan_interval=5), session='elsewhere')], HOT)
+
+    assert [a['name'] for a in changes.replaced] == ['same']
+    assert changes.updated == []
+
+
+def test_edited_trust_rules_are_swapped_in_by_the_reloader(make_bot, tmp_path):
+    rules_file = tmp_path / 'trust_rules.json'
+
+    async def scenario():
+        bot = make_bot()
+        reloader = TrustReloader(SimpleNamespace(bots={'test': bot}), poll_interval=0.01)
+        assert str(rules_file) in reloader.paths()
+
+        rules_file.write_text(json.dumps({'rules': [{'action': 'deny', 'country': 'Iran'}]}))
+        # Evaluating never reads the file
+        bot.evaluate_trust(SessionRecord(1, country='Iran'))
+        assert bot.trust_policy.rule_count == 0
+
+        await reloader.reload({str(rules_file)})
+        reloader.watcher.close()
+        return bot
+
+    bot = asyncio.run(scenario())
+    assert bot.trust_policy.rule_count == 1
+    assert bot.evaluate_trust(SessionRecord(1, country='Iran')).action == 'deny'
@@ -0,0 +1,51 @@
+import asyncio
+
+import pytest
+
+from audit import open_audit_log
+from main import DEFAULT_SETTINGS
+from trust_store import open_store
+from replay import replay_account
+
+INTRUDER = 1000000
+
+
+def recording():
+    own = [1, 'Bot host', 'Telegram Desktop', '4.0', 'Linux', '203.0.113.1', 'Germany', 'Berlin', 0, 0, True]
+    intruder = [INTRUDER, 'Intruder', 'Telegram Android', '10.0', 'Android', '198.51.100.7', 'Iran', 'Tehran',
+                0, 0, False]
+    return [
+        {'t': 0.0, 'a': 'main', 'add': [own]},
+        # Logged in a moment after the recording started
+        {'t': 0.02, 'a': 'main', 'add': [intruder]},
+        {'t': 0.05, 'a': 'main', 'kill': [INTRUDER]},
+    ]
+
+
+@pytest.fixture
+def settings(tmp_path):
+    yield {
+        **DEFAULT_SETTINGS,
+        'snapshot_file': str(tmp_path / 'known_sessions.json'),
+        'trust_store': str(tmp_path / 'trusted_devices.db'),
+        'trusted_devices_file': str(tmp_path / 'trusted_devices.json'),
+        'trust_rules_file': str(tmp_path / 'trust_rules.json'),
+        'audit_db': str(tmp_path / 'audit.db'),
+        'record_file': '',
+    }
+    open_audit_log(str(tmp_path / 'audit.db')).close()
+    open_store(str(tmp_path / 'trusted_devices.db')).close()
+
+
+def test_max_speed_matches_the_recording(settings):
+    result = asyncio.run(replay_account('main', recording(), settings, 'max', 0.0))
+
+    assert result['killed'] == result['recorded_killed'] == [INTRUDER]
+    assert result['allowed'] == []
+
+
+def test_real_time_replay_takes_the_baseline_before_playing_on(settings):
+    result = asyncio.run(replay_account('main', recording(), settings, 1.0, 0.05))
+
+    assert result['killed'] == result['recorded_killed'] == [INTRUDER]
+    assert result['allowed'] == []
@@ -0,0 +1,102 @@
+import asyncio
+
+import pytest
+
+import metrics
+from fake_client import FakeTelegramClient
+from main import MultiAccountRunner, load_accounts
+
+
+def config(*accounts):
+    return {'settings': {'log_file': ''}, 'accounts': list(accounts)}
+
+
+def account(name, phone, **settings):
+    return {'name': name, 'api_id': 1, 'api_hash': 'hash', 'phone': phone, 'settings': settings}
+
+
+@pytest.fixture
+def runner_config(tmp_path, monkeypatch):
+    # Session, trust and audit files are created next to the config
+    monkeypatch.chdir(tmp_path)
+    return config(account('home', '+100'), account('work', '+200'))
+
+
+@pytest.mark.parametrize('reloaded', [
+    # A replaced account with a bad value
+    config(account('home', '+100'), account('work', '+201', scan_interval='fast')),
+    # An added account with a bad value, alongside a removal
+    config(account('home', '+100'), account('spare', '+300', logout_concurrency='many')),
+])
+def test_bad_reload_changes_nothing(runner_config, reloaded):
+    async def scenario():
+        runner = MultiAccountRunner(load_accounts(runner_config), runner_config['settings'])
+        bots = dict(runner.bots)
+        with pytest.raises(ValueError):
+            await runner.apply_accounts(load_accounts(reloaded))
+        return runner, bots
+
+    runner, bots = asyncio.run(scenario())
+    assert runner.bots == bots
+    assert runner.accounts['work']['phone'] == '+200'
+    assert metrics._accounts['work'] is bots['work'].metrics
+    assert 'spare' not in metrics._accounts
+
+
+def test_reload_replaces_removes_and_adds(runner_config, tmp_path, monkeypatch):
+    async def idle(self, bot):
+        await asyncio.sleep(3600)
+
+    # Started accounts would connect to Telegram
+    monkeypatch.setattr(MultiAccountRunner, 'run_account', idle)
+
+    async def scenario():
+        runner = MultiAccountRunner(load_accounts(runner_config), runner_config['settings'])
+        old_work = runner.bots['work']
+        changes = await runner.apply_accounts(load_accounts(
+            config(account('work', '+201'), account('spare', '+300'))
+        ))
+        for task in runner.tasks.values():
+            task.cancel()
+        await asyncio.gather(*runner.tasks.values(), return_exceptions=True)
+        return runner, old_work, changes
+
+    (tmp_path / 'known_sessions_work.json').write_text('{"phone": "200", "sessions": [555]}')
+    runner, old_work, changes = asyncio.run(scenario())
+    # The old login's snapshot would make every session of the new one look new
+    assert not (tmp_path / 'known_sessions_work.json').exists()
+    assert changes.removed == ['home']
+    assert sorted(runner.bots) == ['spare', 'work']
+    assert runner.bots['work'] is not old_work
+    assert runner.accounts['work']['phone'] == '+201'
+    assert metrics._accounts['work'] is runner.bots['work'].metrics
+    assert 'home' not in metrics._accounts
+
+
+def test_failed_login_is_retried_from_scratch(runner_config, monkeypatch, until):
+    client = FakeTelegramClient(latency=0.001, authorized=False)
+    create_bot = MultiAccountRunner.create_bot
+
+    def create_fake_bot(self, account):
+        bot = create_bot(self, account)
+        bot.client = bot.connection.client = client
+        return bot
+
+    monkeypatch.setattr(MultiAccountRunner, 'create_bot', create_fake_bot)
+
+    async def scenario():
+        runner = MultiAccountRunner([], {'account_retry_max': 0.05})
+        await runner.add_account(load_accounts(config(account('home', '+100', interactive_login=False)))[0])
+        bot = runner.bots['home']
+        # The socket is up, but the unattended login is refused
+        await until(lambda: runner.failures['home'] == 1)
+        assert client.is_connected() is False
+
+        client.authorized = True
+        await until(lambda: bot.monitoring)
+        handlers_registered, notifier_running = bot.handlers_registered, bot.notifier.task is not None
+        await runner.remove_account('home')
+        return handlers_registered, notifier_running
+
+    handlers_registered, notifier_running = asyncio.run(scenario())
+    assert handlers_registered and notifier_running
@@ -0,0 +1,57 @@
+from sessions import SessionRecord, diff_sessions
+
+
+def record(session_hash, ip='203.0.113.1', country='Germany', region='Berlin', **fields):
+    return SessionRecord(session_hash, ip=ip, country=country, region=region, **fields)
+
+
+def test_added_and_removed():
+    old = {1: record(1), 2: record(2)}
+    new = {2: record(2), 3: record(3)}
+
+    diff = diff_sessions(old, new)
+
+    assert diff.added == {3: new[3]}
+    assert diff.removed == {1: old[1]}
+    assert diff.changed == {}
+    assert diff
+
+
+def test_unchanged_snapshot_is_empty():
+    old = {1: record(1), 2: record(2)}
+
+    diff = diff_sessions(old, dict(old))
+
+    assert not diff
+    assert diff.added == diff.removed == diff.changed == {}
+
+
+def test_new_ip_is_a_change():
+    old = {1: record(1)}
+    new = {1: record(1, ip='198.51.100.7', country='France', region='Paris')}
+
+    diff = diff_sessions(old, new)
+
+    assert diff.changed == {1: (old[1], new[1])}
+    assert not diff.added and not diff.removed
+
+
+def test_activity_alone_is_not_a_change():
+    old = {1: record(1, date_active=100)}
+    new = {1: record(1, date_active=200)}
+
+    assert not diff_sessions(old, new)
+
+
+def test_hash_only_snapshot_records_never_change():
+    # Snapshots of old versions stored bare hashes, without an IP
+    old = {1: SessionRecord.from_snapshot(1)}
+    new = {1: record(1)}
+
+    assert not diff_sessions(old, new)
+
+
+def test_snapshot_round_trip():
+    original = record(5, device_model='Pixel 8', current=True)
+
+    assert SessionRecord.from_snapshot(list(original)) == original
@@ -0,0 +1,30 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from fake_client import FakeTelegramClient
+from setup_api import TelegramAPISetup
+
+
+def logged_in_as(phone):
+    client = FakeTelegramClient(latency=0.001)
+
+    async def get_me():
+        return SimpleNamespace(phone=phone, first_name='Fake')
+
+    client.get_me = get_me
+    return client
+
+
+def test_existing_session_of_the_same_number_is_reused():
+    setup = TelegramAPISetup()
+
+    asyncio.run(setup.login(logged_in_as('15550100'), '+1 555 0100'))
+
+    assert setup.code_requests == 0
+
+
+def test_existing_session_of_another_number_is_refused():
+    with pytest.raises(ValueError, match=r'\+15550199'):
+        asyncio.run(TelegramAPISetup().login(logged_in_as('15550199'), '+15550100'))
@@ -0,0 +1,42 @@
+from sharding import assign_shards
+
+ACCOUNTS = [f"account{i}" for i in range(200)]
+
+
+def owners(assignment):
+    return {name: slot for slot, names in assignment.items() for name in names}
+
+
+def test_every_account_is_assigned_exactly_once():
+    assignment = assign_shards(ACCOUNTS, [0, 1, 2, 3])
+
+    assigned = [name for names in assignment.values() for name in names]
+    assert sorted(assigned) == sorted(ACCOUNTS)
+    assert set(assignment) == {0, 1, 2, 3}
+    # Rendezvous hashing spreads accounts roughly evenly
+    assert all(len(names) > 20 for names in assignment.values())
+
+
+def test_assignment_is_deterministic():
+    assert assign_shards(ACCOUNTS, [0, 1, 2]) == assign_shards(ACCOUNTS, [0, 1, 2])
+    # Independent of the order accounts are listed in
+    assert owners(assign_shards(ACCOUNTS[::-1], [0, 1, 2])) == owners(assign_shards(ACCOUNTS, [0, 1, 2]))
+
+
+def test_removing_a_slot_only_moves_its_accounts():
+    before = owners(assign_shards(ACCOUNTS, [0, 1, 2, 3]))
+    after = owners(assign_shards(ACCOUNTS, [0, 1, 3]))
+
+    moved = {name for name in ACCOUNTS if before[name] != after[name]}
+    assert moved == {name for name in ACCOUNTS if before[name] == 2}
+
+
+def test_adding_accounts_leaves_existing_ones_in_place():
+    before = owners(assign_shards(ACCOUNTS, [0, 1, 2]))
+    after = owners(assign_shards(ACCOUNTS + ["newcomer1", "newcomer2"], [0, 1, 2]))
+
+    assert all(after[name] == before[name] for name in ACCOUNTS)
+
+
+def test_no_accounts():
+    assert assign_shards([], [0, 1]) == {0: [], 1: []}
@@ -0,0 +1,108 @@
+import pytest
+
+from sessions import SessionRecord
+from trust_rules import CidrTrie, CompiledRules, Decision
+
+
+def session(**fields):
+    values = {
+        'device_model': 'iPhone 15', 'app_name': 'Telegram iOS', 'app_version': '10.2.1',
+        'platform': 'iOS', 'ip': '203.0.113.5', 'country': 'Germany',
+    }
+    values.update(fields)
+    return SessionRecord(1, **values)
+
+
+RULES = [
+    {'action': 'trust', 'name': 'home phone', 'device_model': 'iPhone 15', 'app_version': '10.*',
+     'ip': '203.0.113.0/24'},
+    {'action': 'deny', 'name': 'blocked countries', 'country': ['North Korea', 'Iran']},
+    {'action': 'trust', 'name': 'office', 'platform': 'Windows', 'ip': ['198.51.100.0/24', '2001:db8::/32']},
+    {'action': 'trust', 'name': 'exact build', 'app_version': '9.0.0'},
+]
+
+
+@pytest.fixture
+def rules():
+    return CompiledRules(RULES)
+
+
+def test_every_listed_field_must_match(rules):
+    assert rules.evaluate(session()) == Decision('trust', 'home phone')
+    assert rules.evaluate(session(ip='192.0.2.1')) == Decision(None, None)
+    assert rules.evaluate(session(app_version='11.0')) == Decision(None, None)
+
+
+def test_deny_wins_over_trust(rules):
+    assert rules.evaluate(session(country='Iran')) == Decision('deny', 'blocked countries')
+
+
+def test_exact_fields_ignore_case(rules):
+    assert rules.evaluate(session(device_model='IPHONE 15')) == Decision('trust', 'home phone')
+    assert rules.evaluate(session(country='north korea')).action == 'deny'
+
+
+def test_list_values_are_alternatives(rules):
+    office = session(platform='Windows', device_model='Desktop')
+    assert rules.evaluate(office._replace(ip='198.51.100.20')) == Decision('trust', 'office')
+    assert rules.evaluate(office._replace(ip='2001:db8::42')) == Decision('trust', 'office')
+    assert rules.evaluate(office._replace(ip='2001:db9::1')) == Decision(None, None)
+
+
+def test_version_prefix_and_exact_version(rules):
+    assert rules.evaluate(session(app_version='10.14.5')).rule == 'home phone'
+    other = session(device_model='Pixel', ip='192.0.2.1')
+    assert rules.evaluate(other._replace(app_version='9.0.0')) == Decision('trust', 'exact build')
+    assert rules.evaluate(other._replace(app_version='9.0.01')) == Decision(None, None)
+
+
+def test_first_matching_rule_names_the_decision():
+    rules = CompiledRules([
+        {'action': 'trust', 'name': 'first', 'platform': 'iOS'},
+        {'action': 'trust', 'name': 'second', 'platform': 'iOS'},
+    ])
+    assert rules.evaluate(session()).rule == 'first'
+
+
+def test_missing_session_fields_only_match_wildcards(rules):
+    assert rules.evaluate(SessionRecord(1)) == Decision(None, None)
+
+
+def test_no_rules():
+    assert CompiledRules([]).evaluate(session()) == Decision(None, None)
+
+
+@pytest.mark.parametrize('rule', [
+    {'action': 'allow', 'platform': 'iOS'},
+    {'action': 'trust', 'hostname': 'laptop'},
+])
+def test_invalid_rules_are_rejected(rule):
+    with pytest.raises(ValueError):
+        CompiledRules([rule])
+
+
+def test_cidr_trie_ors_every_containing_network():
+    trie = CidrTrie()
+    trie.insert('10.0.0.0/8', 1)
+    trie.insert('10.1.0.0/16', 2)
+    trie.insert('10.1.2.3/32', 4)
+    trie.insert('2001:db8::/32', 8)
+
+    assert trie.lookup('10.1.2.3') == 1 | 2 | 4
+    assert trie.lookup('10.1.9.9') == 1 | 2
+    assert trie.lookup('10.200.0.1') == 1
+    assert trie.lookup('11.0.0.1') == 0
+    assert trie.lookup('2001:db8:1::1') == 8
+    assert trie.lookup('2001:db9::1') == 0
+
+
+def test_cidr_trie_default_route_and_bad_input():
+    trie = CidrTrie()
+    trie.insert('0.0.0.0/0', 1)
+    trie.insert('192.0.2.77/24', 2)    # host bits are ignored
+
+    assert trie.lookup('8.8.8.8') == 1
+    assert trie.lookup('192.0.2.1') == 1 | 2
+    assert trie.lookup('::1') == 0
+    assert trie.lookup('not an ip') == 0
+    assert trie.lookup('') == 0
@@ -0,0 +1,203 @@
+"""
+SessionKiller - Trust Rules
+Declarative trust/deny rules compiled into indexed lookups.
+"""
+
+import asyncio
+import ipaddress
+import json
+import logging
+import os
+from typing import Any, Dict, List, NamedTuple, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+# Session fields a rule can match on, besides the IP
+EXACT_FIELDS = ('device_model', 'app_name', 'platform', 'country')
+RULE_FIELDS = EXACT_FIELDS + ('app_version', 'ip')
+ACTIONS = ('trust', 'deny')
+
+
+class Decision(NamedTuple):
+    """Outcome of evaluating a session against the rules."""
+    action: Optional[str]    # 'trust', 'deny' or None when no rule matched
+    rule: Optional[str]      # name of the deciding rule
+
+
+def _values(raw: Any) -> List[str]:
+    """A rule field may hold one value or a list of alternatives."""
+    if isinstance(raw, (list, tuple)):
+        return [str(v) for v in raw]
+    return [str(raw)]
+
+
+class CidrTrie:
+    """Binary prefix trie mapping IP networks to rule bitmasks.
+
+    A lookup walks at most 32 (IPv4) or 128 (IPv6) nodes and ORs together the
+    masks of every network containing the address.
+    """
+
+    def __init__(self):
+        self.roots: Dict[int, Dict] = {4: {}, 6: {}}
+
+    def insert(self, network: str, mask: int):
+        net = ipaddress.ip_network(network, strict=False)
+        node = self.roots[net.version]
+        bits = int(net.network_address)
+        width = net.max_prefixlen
+        for i in range(net.prefixlen):
+            bit = (bits >> (width - 1 - i)) & 1
+            node = node.setdefault(bit, {})
+        node['mask'] = node.get('mask', 0) | mask
+
+    def lookup(self, address: str) -> int:
+        try:
+            ip = ipaddress.ip_address(address)
+        except ValueError:
+            return 0
+        node = self.roots[ip.version]
+        bits = int(ip)
+        width = ip.max_prefixlen
+        result = node.get('mask', 0)
+        for i in range(width):
+            node = node.get((bits >> (width - 1 - i)) & 1)
+            if node is None:
+                break
+            result |= node.get('mask', 0)
+        return result
+
+
+class CompiledRules:
+    """Rules compiled into per-field indexes of bitmasks (one bit per rule).
+
+    Evaluation ANDs together, for every field, the mask of rules that match the
+    session's value with the mask of rules that don't constrain that field.
+    The cost depends on the number of fields, not the number of rules.
+    """
+
+    def __init__(self, rules: List[Dict[str, Any]]):
+        self.names: List[str] = []
+        self.all_mask = 0
+        self.action_masks = {action: 0 for action in ACTIONS}
+        self.exact: Dict[str, Dict[str, int]] = {field: {} for field in EXACT_FIELDS}
+        self.versions: Dict[str, int] = {}
+        self.version_prefixes: Dict[str, int] = {}
+        self.prefix_lengths: Set[int] = set()
+        self.cidrs = CidrTrie()
+        self.wildcard = {field: 0 for field in RULE_FIELDS}
+
+        for index, rule in enumerate(rules):
+            self.add_rule(index, rule)
+
+    def add_rule(self, index: int, rule: Dict[str, Any]):
+        action = rule.get('action')
+        if action not in ACTIONS:
+            raise ValueError(f"Rule {index + 1}: action must be one of {', '.join(ACTIONS)}")
+        unknown = set(rule) - set(RULE_FIELDS) - {'action', 'name'}
+        if unknown:
+            raise ValueError(f"Rule {index + 1}: unknown fields {', '.join(sorted(unknown))}")
+
+        bit = 1 << index
+        self.names.append(rule.get('name') or f"{action} #{index + 1}")
+        self.all_mask |= bit
+        self.action_masks[action] |= bit
+
+        for field in RULE_FIELDS:
+            if field not in rule:
+                self.wildcard[field] |= bit
+                continue
+            for value in _values(rule[field]):
+                if field == 'ip':
+                    self.cidrs.insert(value, bit)
+                elif field == 'app_version' and value.endswith('*'):
+                    prefix = value[:-1]
+                    self.version_prefixes[prefix] = self.version_prefixes.get(prefix, 0) | bit
+                    self.prefix_lengths.add(len(prefix))
+                elif field == 'app_version':
+                    self.versions[value] = self.versions.get(value, 0) | bit
+                else:
+                    index_map = self.exact[field]
+                    key = value.lower()
+                    index_map[key] = index_map.get(key, 0) | bit
+
+    def version_mask(self, version: str) -> int:
+        mask = self.versions.get(version, 0)
+        for length in self.prefix_lengths:
+            if length <= len(version):
+                mask |= self.version_prefixes.get(version[:length], 0)
+        return mask
+
+    def evaluate(self, session: Any) -> Decision:
+        """Match a session record; deny rules take precedence over trust rules."""
+        mask = self.all_mask
+        for field in EXACT_FIELDS:
+            if not mask:
+                return Decision(None, None)
+            value = (getattr(session, field) or '').lower()
+            mask &= self.exact[field].get(value, 0) | self.wildcard[field]
+        if mask:
+            mask &= self.version_mask(session.app_version or '') | self.wildcard['app_version']
+        if mask:
+            mask &= self.cidrs.lookup(session.ip or '') | self.wildcard['ip']
+
+        for action in ('deny', 'trust'):
+            matched = mask & self.action_masks[action]
+            if matched:
+                # Lowest set bit = first matching rule in file order
+                first = (matched & -matched).bit_length() - 1
+                return Decision(action, self.names[first])
+        return Decision(None, None)
+
+
+class TrustPolicy:
+    """Loads compiled rules from a JSON file.
+
+    Evaluation never touches the disk; the hot reloader (reloader.TrustReloader)
+    or /reloadrules calls ``refresh()`` when the file changes.
+    """
+
+    def __init__(self, rules_file: str):
+        self.rules_file = rules_file
+        self.rules = CompiledRules([])
+        self.reload()
+
+    def compile(self) -> CompiledRules:
+        """Read and compile the rules file; a missing file means no rules."""
+        if not os.path.exists(self.rules_file):
+            return CompiledRules([])
+        with open(self.rules_file, 'r') as f:
+            data = json.load(f)
+        return CompiledRules(data.get('rules', []))
+
+    def swap(self, rules: CompiledRules):
+        # Replaced in whole, so an evaluation never sees half-compiled rules
+        self.rules = rules
+        logger.info(f"Loaded {len(rules.names)} trust rules from {self.rules_file}")
+
+    def reload(self) -> bool:
+        """(Re)compile the rules file; the previous rules stay active on error."""
+        try:
+            self.swap(self.compile())
+            return True
+        except Exception as e:
+            logger.error(f"Error loading trust rules: {e}")
+            return False
+
+    async def refresh(self) -> bool:
+        """Like ``reload()``, but reads and compiles in a thread, off the event loop."""
+        try:
+            loop = asyncio.get_running_loop()
+            self.swap(await loop.run_in_executor(None, self.compile))
+            return True
+        except Exception as e:
+            logger.error(f"Error loading trust rules: {e}")
+            return False
+
+    def evaluate(self, session: Any) -> Decision:
+        """Decide on a session with the current rules."""
+        return self.rules.evaluate(session)
+
+    @property
+    def rule_count(self) -> int:
+        return len(self.rules.names)
@@ -0,0 +1,129 @@
+"""
+SessionKiller - Trusted Device Store
+Crash-safe SQLite storage for trusted device hashes, shared by all accounts.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Set
+
+logger = logging.getLogger(__name__)
+
+
+class TrustStore:
+    """Trusted device hashes keyed by account.
+
+    Every change is its own small transaction (no whole-file rewrites), and
+    all writes run on a single background thread so the event loop never
+    waits on disk.
+    """
+
+    def __init__(self, path: str = 'trusted_devices.db'):
+        self.path = path
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.execute('PRAGMA busy_timeout=5000')
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS trusted_devices ('
+            ' account TEXT NOT NULL,'
+            ' hash INTEGER NOT NULL,'
+            ' added_at INTEGER NOT NULL,'
+            ' PRIMARY KEY (account, hash)'
+            ') WITHOUT ROWID'
+        )
+        self.connection.commit()
+        # One thread keeps writes ordered and off the event loop
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='trust-store')
+
+    def load(self, account: str) -> Set[int]:
+        """Read every trusted hash of an account (at startup; ``refresh`` on reload)."""
+        rows = self.connection.execute(
+            'SELECT hash FROM trusted_devices WHERE account = ?', (account,)
+        )
+        return {row[0] for row in rows}
+
+    def migrate_json(self, account: str, json_file: str) -> int:
+        """Import a legacy trusted_devices.json once, then rename it out of the way."""
+        if not os.path.exists(json_file):
+            return 0
+        with open(json_file, 'r') as f:
+            hashes = json.load(f).get('trusted_devices', [])
+        count = self._insert(account, hashes)
+        os.replace(json_file, f"{json_file}.migrated")
+        logger.info(f"Migrated {count} trusted devices from {json_file}")
+        return count
+
+    def _insert(self, account: str, hashes: Iterable[int]) -> int:
+        now = int(time.time())
+        with self.connection:
+            cursor = self.connection.executemany(
+                'INSERT OR IGNORE INTO trusted_devices (account, hash, added_at) VALUES (?, ?, ?)',
+                ((account, int(h), now) for h in hashes),
+            )
+        return cursor.rowcount
+
+    def _delete(self, account: str, hashes: Iterable[int]) -> int:
+        with self.connection:
+            cursor = self.connection.executemany(
+                'DELETE FROM trusted_devices WHERE account = ? AND hash = ?',
+                ((account, int(h)) for h in hashes),
+            )
+        return cursor.rowcount
+
+    def _export(self, account: str) -> List[int]:
+        rows = self.connection.execute(
+            'SELECT hash FROM trusted_devices WHERE account = ? ORDER BY added_at, hash', (account,)
+        )
+        return [row[0] for row in rows]
+
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, func, *args)
+
+    async def add(self, account: str, session_hash: int):
+        """Trust one hash."""
+        await self._run(self._insert, account, [session_hash])
+
+    async def remove(self, account: str, session_hash: int):
+        """Stop trusting one hash."""
+        await self._run(self._delete, account, [session_hash])
+
+    async def import_hashes(self, account: str, hashes: Iterable[int]) -> int:
+        """Trust many hashes in one transaction; returns how many were new."""
+        return await self._run(self._insert, account, list(hashes))
+
+    async def refresh(self, account: str, json_file: str = '') -> Set[int]:
+        """Re-read an account's hashes once pending writes have landed.
+
+        A legacy JSON file dropped in since startup is imported first.
+        """
+        if json_file:
+            await self._run(self.migrate_json, account, json_file)
+        return await self._run(self.load, account)
+
+    async def export_hashes(self, account: str) -> List[int]:
+        """All trusted hashes of an account, oldest first."""
+        return await self._run(self._export, account)
+
+    def close(self):
+        """Finish pending writes and close the database."""
+        self.executor.shutdown(wait=True)
+        self.connection.close()
+
+
+# One store (connection and writer thread) per database file per process
+_stores: Dict[str, TrustStore] = {}
+
+
+def open_store(path: str) -> TrustStore:
+    """Return the process-wide store for ``path``, opening it on first use."""
+    key = os.path.abspath(path)
+    if key not in _stores:
+        _stores[key] = TrustStore(path)
+    return _stores[key]